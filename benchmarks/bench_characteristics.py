@@ -0,0 +1,165 @@
+"""
+Микробенчмарк разбора характеристик товара: прежние XPath-запросы
+пауков против однопроходных extract_*_characteristics базового паука.
+
+zenon - четыре запроса //td[strong[text()=...]] по всему документу
+против одного обхода строк таблицы div#tab-1 table.tables. fabreex -
+два запроса по подписям sz-text-large против одного. oracal - прежний
+цикл по properties против extract_characteristics. Страницы берутся из
+benchmarks/fixtures и разбираются lxml до замера, поэтому время
+включает только поиск характеристик.
+
+Запуск: python -m benchmarks.bench_characteristics [N]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse
+
+from competitors_parser import parsing
+from competitors_parser.spiders.base import BaseCompetitorSpider
+
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def load_pages(spider: str, prefix: str):
+    manifest = json.loads(
+        (FIXTURES / spider / 'manifest.json').read_text(encoding='utf-8')
+    )
+    responses = []
+    for page in manifest['pages']:
+        if not page['file'].startswith(prefix):
+            continue
+        response = HtmlResponse(
+            url=page['url'],
+            body=(FIXTURES / spider / page['file']).read_bytes(),
+            encoding='utf-8'
+        )
+        # Дерево строится до замера
+        response.selector
+        responses.append(response)
+    return responses
+
+
+def load_properties():
+    properties = []
+    for path in sorted((FIXTURES / 'oracal').glob('offers_*.json')):
+        offers = json.loads(path.read_text(encoding='utf-8'))
+        for product in offers['data']['offers']['data']:
+            properties.append(product.get('properties', []))
+    return properties
+
+
+def legacy_zenon(response):
+    """Копия прежнего разбора в ZenonSpider.parse_product."""
+    charact = response.css('div#tab-1 table.tables')
+    result = {}
+    for field, label in (('weight', 'Вес'), ('length', 'Длина'),
+                         ('width', 'Ширина'), ('height', 'Высота')):
+        value = charact.xpath(
+            f'//td[strong[text()="{label}"]]/following-sibling::td/text()'
+        ).get() or None
+        result[field] = ' '.join(value.split()) if value else None
+    return result
+
+
+def legacy_fabreex(response):
+    """Копия прежнего разбора в FabreexSpider.parse_product."""
+    char_keys = response.xpath(
+        '//*[@class="sz-text-large"]/text()').getall()
+    char_values = response.xpath(
+        '//*[@class="sz-text-large"]/following-sibling::div[1]/text()'
+    ).getall()
+    for key, value in zip(char_keys, char_values):
+        if 'ширина' in key.lower():
+            return value.strip()
+    return None
+
+
+def legacy_oracal(properties):
+    """Копия прежнего разбора в OracalSpider.parse_product."""
+    weight = width = length = None
+    for prop in properties:
+        prop_name = prop.get('name', '').lower()
+        prop_value = prop.get('value', '')
+        if 'вес' in prop_name:
+            weight = prop_value
+        elif 'ширина' in prop_name:
+            width = prop_value
+        elif 'длина' in prop_name:
+            length = prop_value
+    return weight, width, length
+
+
+def timed(func, data, rounds):
+    # Каждый замер начинается с холодного кеша
+    parsing._characteristic_field.cache_clear()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for value in data:
+            func(value)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': round(elapsed, 3),
+        'per_second': round(len(data) * rounds / elapsed),
+    }
+
+
+def compare(legacy, single_pass, data, rounds):
+    result = {
+        'pages': len(data),
+        'legacy': timed(legacy, data, rounds),
+        'single_pass': timed(single_pass, data, rounds),
+    }
+    result['speedup'] = round(
+        result['legacy']['seconds'] / result['single_pass']['seconds'], 2
+    )
+    return result
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    spider = BaseCompetitorSpider(name='bench')
+    zenon = load_pages('zenon', 'product_')
+    fabreex = load_pages('fabreex', 'product_')
+    properties = load_properties()
+
+    results = {
+        'rounds': rounds,
+        'zenon': compare(
+            legacy_zenon,
+            lambda response: spider.extract_table_characteristics(
+                response.css('div#tab-1 table.tables')
+            ),
+            zenon, rounds
+        ),
+        'fabreex': compare(
+            legacy_fabreex,
+            lambda response: spider.extract_label_characteristics(
+                response.xpath('//*[@class="sz-text-large"]')
+            ),
+            fabreex, rounds
+        ),
+        'oracal': compare(
+            legacy_oracal,
+            lambda props: spider.extract_characteristics(
+                ((prop.get('name'), prop.get('value')) for prop in props),
+                last=True
+            ),
+            properties, rounds
+        ),
+        'example': {
+            'legacy': legacy_zenon(zenon[0]),
+            'single_pass': spider.extract_table_characteristics(
+                zenon[0].css('div#tab-1 table.tables')
+            ),
+        },
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Сквозной бенчмарк обхода через локальный сервер записанных ответов.
+
+Запускает ReplayServer в фоновом потоке и полный обход пауком:
+планировщик, middleware, пайплайны и экспортеры, без обращения к
+сайтам конкурентов. Задержка, разброс, ошибки и скорость отдачи
+задаются аргументами, настройки Scrapy - через -s, как у scrapy crawl.
+Экспорт и история пишутся во временный каталог.
+
+Запуск:
+    python -m benchmarks.bench_crawl zenon --latency 0.2 --jitter 0.1 \
+        --error 429=0.02 -s DOWNLOAD_DELAY=0 -s CONCURRENT_REQUESTS=32
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from competitors_parser.replay import FixtureSite, ReplayServer, parse_errors
+
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+REPORTED_STATS = (
+    'item_scraped_count', 'item_dropped_count', 'response_received_count',
+    'downloader/request_count', 'retry/count', 'retry/max_reached',
+    'replay/requests', 'elapsed_time_seconds', 'finish_reason',
+)
+
+
+def build_server(args, sites=None):
+    return ReplayServer(
+        sites or [FixtureSite(args.fixtures)],
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        errors=parse_errors(args.error),
+        bandwidth=args.bandwidth * 1024,
+        seed=args.seed
+    )
+
+
+def crawl(spider_names, settings, server, overrides, log_level, setup=None):
+    """
+    Обход пауками через сервер, возвращает статистику каждого.
+
+    setup(crawler) вызывается для каждого краулера до запуска, например
+    чтобы подключиться к его сигналам.
+    """
+    settings = settings.copy()
+    settings.setdict({
+        'REPLAY_SERVER': server.url,
+        'HTTPCACHE_ENABLED': False,
+        'LOG_FILE': None,
+        'LOG_LEVEL': log_level,
+    }, priority='cmdline')
+    settings.setdict(overrides, priority='cmdline')
+
+    process = CrawlerProcess(settings)
+    crawlers = []
+    for name in spider_names:
+        crawler = process.create_crawler(name)
+        if setup is not None:
+            setup(crawler)
+        process.crawl(crawler)
+        crawlers.append((name, crawler))
+
+    started = time.perf_counter()
+    process.start()
+    wall = time.perf_counter() - started
+
+    results = {}
+    for name, crawler in crawlers:
+        stats = crawler.stats.get_stats()
+        result = {key: stats.get(key) for key in REPORTED_STATS}
+        result['statuses'] = {
+            key.rsplit('/', 1)[-1]: value for key, value in stats.items()
+            if key.startswith('downloader/response_status_count/')
+        }
+        elapsed = stats.get('elapsed_time_seconds') or wall
+        result['items_per_second'] = round(
+            (stats.get('item_scraped_count') or 0) / elapsed, 2
+        )
+        results[name] = result
+    return results, wall
+
+
+def parse_overrides(values):
+    overrides = {}
+    for value in values:
+        key, _, setting = value.partition('=')
+        overrides[key] = setting
+    return overrides
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument(
+        '--error', action='append', default=[], metavar='КОД=ДОЛЯ'
+    )
+    parser.add_argument('--bandwidth', type=int, default=0, help='КБ/с')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument(
+        '-s', dest='settings', action='append', default=[],
+        metavar='НАСТРОЙКА=ЗНАЧЕНИЕ'
+    )
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='файл для результатов JSON')
+
+
+def save_results(results, output, prefix):
+    output = Path(output) if output else RESULTS_DIR / (
+        f'{prefix}_{datetime.now():%Y%m%d_%H%M%S}.json'
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены: {output}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('spiders', nargs='+')
+    parser.add_argument('--fixtures', default=str(FIXTURES_DIR))
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    args.fixtures = os.path.abspath(args.fixtures)
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Настройки проекта ищутся от текущего каталога, до перехода во временный
+    settings = get_project_settings()
+    server = build_server(args).start()
+    workdir = tempfile.mkdtemp(prefix='bench_crawl_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        spiders, wall = crawl(
+            args.spiders,
+            settings,
+            server,
+            parse_overrides(args.settings),
+            args.log_level
+        )
+    finally:
+        os.chdir(cwd)
+        server.stop()
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'server': {
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'errors': parse_errors(args.error),
+            'bandwidth_kb': args.bandwidth,
+            'responses': {str(k): v for k, v in server.stats.items()},
+        },
+        'settings': parse_overrides(args.settings),
+        'wall_seconds': round(wall, 2),
+        'workdir': workdir,
+        'spiders': spiders,
+    }
+    for name, stats in spiders.items():
+        print(
+            f'{name:>8}: {stats["item_scraped_count"]} товаров за '
+            f'{stats["elapsed_time_seconds"]} с '
+            f'({stats["items_per_second"]} товаров/с), '
+            f'повторов {stats["retry/count"] or 0}, '
+            f'статусы {stats["statuses"]}'
+        )
+    save_results(results, output, 'crawl')
+
+
+if __name__ == '__main__':
+    main()
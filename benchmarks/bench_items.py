@@ -0,0 +1,141 @@
+"""
+Сравнение словарей и ProductItem на пути паук -> валидация -> экспорт.
+
+Старый путь: паук отдает словарь, ValidationPipeline собирает новый
+словарь, JSON-экспортер собирает OrderedDict. Новый путь: паук создает
+ProductItem, валидация нормализует его на месте, экспортер сериализует
+напрямую. Замеряются время, число выделений памяти на товар и память,
+занятая буфером из N товаров (как при буферизации JSON).
+
+Запуск: python -m benchmarks.bench_items [N]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from competitors_parser.items import ProductItem, StockItem
+from competitors_parser.pipelines.validation import ValidationPipeline
+
+
+def make_dict(i):
+    return {
+        'category': 'Пленки',
+        'product_code': f'P{i}',
+        'name': f'Товар {i}',
+        'stocks': [
+            {'stock': 'Москва', 'quantity': i % 7, 'price': i * 1.5},
+            {'stock': 'Подольск', 'quantity': i % 3, 'price': i * 1.5},
+        ],
+        'unit': 'шт',
+        'currency': 'RUB',
+        'weight': None,
+        'length': None,
+        'width': '1.26',
+        'height': None,
+        'url': f'https://example.com/p/{i}',
+    }
+
+
+def make_record(i):
+    return ProductItem(
+        category='Пленки',
+        product_code=f'P{i}',
+        name=f'Товар {i}',
+        stocks=[
+            StockItem(stock='Москва', quantity=i % 7, price=i * 1.5),
+            StockItem(stock='Подольск', quantity=i % 3, price=i * 1.5),
+        ],
+        width='1.26',
+        url=f'https://example.com/p/{i}',
+    )
+
+
+def legacy_validate(item):
+    """Копия прежней ValidationPipeline: новый словарь на каждый товар."""
+    return {
+        'category': str(item.get('category', '')).strip(),
+        'product_code': str(item.get('product_code', '')).strip(),
+        'name': str(item.get('name', '')).strip(),
+        'stocks': [
+            {
+                'stock': str(stock.get('stock', 'Основной')).strip(),
+                'quantity': int(float(stock.get('quantity', 0))),
+                'price': float(stock.get('price', 0.0)),
+            }
+            for stock in item.get('stocks', [])
+        ],
+        'unit': str(item.get('unit', 'шт')).strip(),
+        'currency': str(item.get('currency', 'RUB')).strip(),
+        'weight': item.get('weight'),
+        'length': item.get('length'),
+        'width': item.get('width'),
+        'height': item.get('height'),
+        'url': str(item.get('url', '')).strip(),
+    }
+
+
+def legacy_export(item):
+    """Копия прежнего JSONExporter: OrderedDict на каждый товар."""
+    ordered_item = OrderedDict()
+    for field in ProductItem.EXPORT_FIELDS:
+        ordered_item[field] = item.get(field)
+    return ordered_item
+
+
+def run_legacy(n):
+    buffer = []
+    for i in range(n):
+        buffer.append(legacy_export(legacy_validate(make_dict(i))))
+    return buffer
+
+
+def run_record(n):
+    pipeline = ValidationPipeline()
+    buffer = []
+    for i in range(n):
+        buffer.append(pipeline.process_item(make_record(i), None))
+    return buffer
+
+
+def measure(func, n):
+    start = time.perf_counter()
+    func(n)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    buffer = func(n)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    resident = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del buffer
+    return {
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(n / elapsed),
+        'buffer_bytes_per_item': round(resident / n),
+        'live_blocks_per_item': round(blocks / n, 1),
+        'peak_mb': round(peak / 2 ** 20, 1),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    results = {
+        'items': n,
+        'dict': measure(run_legacy, n),
+        'product_item': measure(run_record, n),
+    }
+    dict_bytes = results['dict']['buffer_bytes_per_item']
+    item_bytes = results['product_item']['buffer_bytes_per_item']
+    results['memory_ratio'] = round(item_bytes / dict_bytes, 2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
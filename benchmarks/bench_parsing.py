@@ -0,0 +1,89 @@
+"""
+Микробенчмарк разбора цен: прежний BaseCompetitorSpider.extract_price
+против competitors_parser.parsing (одиночные вызовы и пакетный разбор).
+
+Набор строк повторяет то, что встречается на страницах: цены с
+разрядами через пробел и неразрывный пробел, копейки через запятую,
+"По запросу". Строки повторяются, как на страницах категорий.
+
+Запуск: python -m benchmarks.bench_parsing [N]
+"""
+import json
+import random
+import sys
+import time
+
+from competitors_parser import parsing
+from competitors_parser.parsing import (
+    PRICE_REQUEST_KEYWORDS, parse_price, parse_prices
+)
+
+
+SAMPLES = [
+    '1 234,50 руб.', '1\xa0234,50\xa0₽', '990 р.', '12,5', '15 400 руб.',
+    'Цена по запросу', 'Уточняйте у менеджера', '3\xa0200 ₽/м²',
+    '99.90', 'от 2 500 руб.', 'Нет в наличии', '1 000 ₽',
+]
+
+
+def legacy_extract_price(price_text):
+    """Копия прежней реализации без логирования."""
+    if not price_text:
+        return 0.0
+    price_text_lower = price_text.lower()
+    for keyword in PRICE_REQUEST_KEYWORDS:
+        if keyword in price_text_lower:
+            return 0.0
+    try:
+        clean_price = ''.join(
+            c for c in price_text if c.isdigit() or c in '.,'
+        )
+        clean_price = clean_price.replace(',', '.')
+        if not clean_price:
+            return 0.0
+        return float(clean_price)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def timed(func, data):
+    # Каждый замер начинается с холодного кеша
+    parsing._parse_price.cache_clear()
+    parsing._price_request_matcher.search.cache_clear()
+    start = time.perf_counter()
+    func(data)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': round(elapsed, 3),
+        'per_second': round(len(data) / elapsed),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(42)
+    # Часть строк уникальна, чтобы кеш не покрывал весь набор
+    data = [
+        rng.choice(SAMPLES) if rng.random() < 0.8
+        else f'{rng.randint(1, 99)} {rng.randint(100, 999)},{i % 100:02d} руб.'
+        for i in range(n)
+    ]
+
+    results = {
+        'strings': n,
+        'legacy': timed(lambda d: [legacy_extract_price(t) for t in d], data),
+        'parse_price': timed(lambda d: [parse_price(t) for t in d], data),
+        'parse_prices': timed(parse_prices, data),
+        'examples': {
+            text: {
+                'legacy': legacy_extract_price(text),
+                'parse_price': parse_price(text),
+            }
+            for text in SAMPLES[:4]
+        },
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
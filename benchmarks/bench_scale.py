@@ -0,0 +1,293 @@
+"""
+Бенчмарк масштабирования на синтетическом каталоге.
+
+Паук обходит синтетический каталог (competitors_parser.replay.synthetic)
+заданного размера через локальный сервер. Во время обхода раз в
+секунду снимаются RSS процесса, длина очереди планировщика и число
+отпечатков в dupefilter, а вызовы dupefilter, планировщика и каждого
+пайплайна (ValidationPipeline, история, экспортеры) хронометрируются.
+
+С --sweep один параметр каталога перебирается по списку значений,
+каждая точка запускается отдельным процессом (реактор Twisted нельзя
+перезапустить, а пиковая RSS должна считаться с нуля):
+
+    python -m benchmarks.bench_scale fabreex --categories 10 --depth 2 \
+        --per-page 50 --variants 4 --sweep pages=1,10,100
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+
+from scrapy import signals
+from scrapy.utils.project import get_project_settings
+from twisted.internet import task
+
+from benchmarks.bench_crawl import (add_server_arguments, build_server, crawl,
+                                    parse_overrides, save_results)
+from competitors_parser.replay import SYNTHETIC_SITES
+from competitors_parser.replay.__main__ import add_synthetic_arguments
+
+SWEEP_PARAMS = ('categories', 'depth', 'per_page', 'pages', 'variants')
+
+# Без искусственных пауз: измеряется сам Scrapy, а не вежливость
+DEFAULT_OVERRIDES = {
+    'DOWNLOAD_DELAY': 0,
+    'AUTOTHROTTLE_ENABLED': False,
+    'CONCURRENT_REQUESTS': 32,
+    'CONCURRENT_REQUESTS_PER_DOMAIN': 32,
+}
+
+
+def rss_mb():
+    """Текущий RSS процесса, МБ (пиковый, если /proc недоступен)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает КБ, macOS - байты
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+class ScaleProbe:
+    """Замеры компонентов одного краулера во время обхода."""
+
+    def __init__(self, crawler, interval=1.0):
+        self.crawler = crawler
+        self.interval = interval
+        self.timings = defaultdict(lambda: [0, 0.0])
+        self.samples = []
+        self.peak_queue = 0
+        self.scheduler = None
+        self.dupefilter = None
+        self.started = None
+        self.loop = None
+        crawler.signals.connect(self.spider_opened, signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signals.spider_closed)
+
+    def timed(self, name, func):
+        stat = self.timings[name]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stat[0] += 1
+                stat[1] += time.perf_counter() - start
+        return wrapper
+
+    def spider_opened(self, spider):
+        engine = self.crawler.engine
+        scheduler = engine.slot.scheduler
+        self.scheduler = scheduler
+        scheduler.enqueue_request = self.timed(
+            'scheduler.enqueue_request', scheduler.enqueue_request
+        )
+        scheduler.next_request = self.timed(
+            'scheduler.next_request', scheduler.next_request
+        )
+        dupefilter = getattr(scheduler, 'df', None)
+        self.dupefilter = dupefilter
+        if dupefilter is not None:
+            dupefilter.request_seen = self.timed(
+                'dupefilter.request_seen', dupefilter.request_seen
+            )
+
+        # Менеджер пайплайнов хранит обернутые методы process_item,
+        # имя класса берется из __qualname__ (ValidationPipeline.process_item)
+        itemproc = engine.scraper.itemproc
+        methods = itemproc.methods['process_item']
+        wrapped = [
+            self.timed(
+                f'pipeline.{method.__qualname__.split(".")[0]}', method
+            )
+            for method in methods
+        ]
+        methods.clear()
+        methods.extend(wrapped)
+
+        self.started = time.perf_counter()
+        self.loop = task.LoopingCall(self.sample)
+        self.loop.start(self.interval)
+
+    def sample(self):
+        queue = len(self.scheduler) if self.scheduler is not None else 0
+        self.peak_queue = max(self.peak_queue, queue)
+        fingerprints = getattr(self.dupefilter, 'fingerprints', None)
+        self.samples.append({
+            'seconds': round(time.perf_counter() - self.started, 1),
+            'rss_mb': round(rss_mb(), 1),
+            'queue': queue,
+            'fingerprints': len(fingerprints) if fingerprints is not None else None,
+            'items': self.crawler.stats.get_value('item_scraped_count', 0),
+        })
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.sample()
+            self.loop.stop()
+
+    def report(self):
+        return {
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'peak_queue': self.peak_queue,
+            'fingerprints': self.samples[-1]['fingerprints'] if self.samples else None,
+            'components': {
+                name: {
+                    'calls': calls,
+                    'seconds': round(seconds, 3),
+                    'us_per_call': round(seconds / calls * 1e6, 1) if calls else 0,
+                }
+                for name, (calls, seconds) in sorted(self.timings.items())
+            },
+            'samples': self.samples,
+        }
+
+
+def build_site(args):
+    return SYNTHETIC_SITES[args.spider](
+        categories=args.categories,
+        depth=args.depth,
+        per_page=args.per_page,
+        pages=args.pages,
+        variants=args.variants
+    )
+
+
+def run_point(args):
+    """Один обход одного каталога в текущем процессе."""
+    site = build_site(args)
+    settings = get_project_settings()
+    server = build_server(args, sites=[site]).start()
+    overrides = {**DEFAULT_OVERRIDES, **parse_overrides(args.settings)}
+    probes = {}
+
+    def setup(crawler):
+        probes['probe'] = ScaleProbe(crawler)
+
+    workdir = tempfile.mkdtemp(prefix='bench_scale_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        spiders, wall = crawl(
+            [args.spider], settings, server, overrides, args.log_level, setup
+        )
+    finally:
+        os.chdir(cwd)
+        server.stop()
+
+    return {
+        'catalog': site.describe(),
+        'settings': overrides,
+        'wall_seconds': round(wall, 2),
+        'workdir': workdir,
+        'crawl': spiders[args.spider],
+        **probes['probe'].report(),
+    }
+
+
+def point_arguments(args, param, value):
+    """Аргументы командной строки для одной точки перебора."""
+    argv = [args.spider, '--port', str(args.port), '--seed', str(args.seed),
+            '--log-level', args.log_level]
+    for name in SWEEP_PARAMS:
+        current = value if name == param else getattr(args, name)
+        argv += [f'--{name.replace("_", "-")}', str(current)]
+    for error in args.error:
+        argv += ['--error', error]
+    for setting in args.settings:
+        argv += ['-s', setting]
+    if args.latency:
+        argv += ['--latency', str(args.latency), '--jitter', str(args.jitter)]
+    if args.bandwidth:
+        argv += ['--bandwidth', str(args.bandwidth)]
+    return argv
+
+
+def run_sweep(args):
+    param, _, values = args.sweep.partition('=')
+    param = param.replace('-', '_')
+    if param not in SWEEP_PARAMS:
+        raise SystemExit(f'Нельзя перебирать {param}: {", ".join(SWEEP_PARAMS)}')
+    points = []
+    for value in values.split(','):
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            point_output = f.name
+        command = [
+            sys.executable, '-m', 'benchmarks.bench_scale',
+            *point_arguments(args, param, value), '--output', point_output
+        ]
+        subprocess.run(command, check=True)
+        with open(point_output, encoding='utf-8') as f:
+            points.append(json.load(f))
+        os.unlink(point_output)
+    return param, points
+
+
+def print_point(point):
+    crawl_stats = point['crawl']
+    catalog = point['catalog']
+    components = ', '.join(
+        f'{name} {stat["us_per_call"]} мкс'
+        for name, stat in point['components'].items()
+    )
+    print(
+        f'{catalog["products"]:>9} товаров, '
+        f'{crawl_stats["item_scraped_count"] or 0:>9} собрано '
+        f'(ожидалось {catalog["expected_items"]}) за '
+        f'{point["wall_seconds"]} с, {crawl_stats["items_per_second"]} '
+        f'товаров/с, RSS {point["peak_rss_mb"]} МБ, очередь '
+        f'{point["peak_queue"]}, отпечатков {point["fingerprints"]}'
+    )
+    print(f'{"":>10}{components}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('spider', choices=sorted(SYNTHETIC_SITES))
+    add_synthetic_arguments(parser)
+    parser.add_argument(
+        '--sweep', metavar='ПАРАМЕТР=ЗНАЧЕНИЯ',
+        help='перебор параметра каталога, например pages=1,10,100'
+    )
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.sweep:
+        point = run_point(args)
+        if args.output:
+            save_results(point, os.path.abspath(args.output), 'scale')
+        else:
+            print_point(point)
+            save_results(point, None, f'scale_{args.spider}')
+        return
+
+    param, points = run_sweep(args)
+    for point in points:
+        print(f'{param}={point["catalog"][param]}:')
+        print_point(point)
+    save_results({
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'spider': args.spider,
+        'sweep': param,
+        'points': points,
+    }, args.output, f'scale_{args.spider}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Офлайн-бенчмарк скорости разбора страниц пауками.
+
+Для каждого паука в benchmarks/fixtures/<паук>/ лежат сохраненные
+страницы и ответы API, а manifest.json описывает, по какому URL и каким
+callback'ом (с какими cb_kwargs) разбирается каждая из них. Callback'и
+вызываются напрямую на HtmlResponse/TextResponse без сети, планировщика
+и пайплайнов.
+
+В отчете: страниц и товаров в секунду, p50/p99 задержки callback'ов и
+пиковая память (tracemalloc, отдельным проходом). Результат сохраняется
+в JSON для сравнения между коммитами.
+
+Запуск:
+    python -m benchmarks.bench_spiders [паук ...] [--rounds N]
+        [--output путь.json] [--compare прошлый.json]
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import scrapy
+from scrapy import Request
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+from scrapy.utils.test import get_crawler
+
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+RESULTS_DIR = Path(__file__).parent / 'results'
+
+
+def load_manifest(name):
+    """Чтение manifest.json и тел страниц паука."""
+    spider_dir = FIXTURES_DIR / name
+    with open(spider_dir / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for entry in manifest['pages']:
+        entry['body'] = (spider_dir / entry['file']).read_bytes()
+    return manifest
+
+
+def decode_kwargs(cb_kwargs):
+    """cb_kwargs из манифеста: {"$set": [...]} превращается в set."""
+    result = {}
+    for key, value in cb_kwargs.items():
+        if isinstance(value, dict) and '$set' in value:
+            value = set(value['$set'])
+        result[key] = value
+    return result
+
+
+def build_response(entry):
+    """Новый ответ для каждого вызова, чтобы не переиспользовать селекторы."""
+    cb_kwargs = decode_kwargs(entry['cb_kwargs'])
+    request = Request(entry['url'], cb_kwargs=cb_kwargs)
+    response_cls = (
+        HtmlResponse if 'html' in entry['content_type'] else TextResponse
+    )
+    return response_cls(
+        url=entry['url'],
+        body=entry['body'],
+        encoding='utf-8',
+        headers={'Content-Type': entry['content_type']},
+        request=request
+    ), cb_kwargs
+
+
+async def _collect_async(result):
+    return [output async for output in result]
+
+
+def run_callback(loop, callback, response, cb_kwargs):
+    """Вызов callback'а и сбор всего, что он отдал."""
+    result = callback(response, **cb_kwargs)
+    if result is None:
+        return []
+    if inspect.isasyncgen(result):
+        return loop.run_until_complete(_collect_async(result))
+    return list(result)
+
+
+def create_spider(spidercls, settings):
+    crawler = get_crawler(spidercls, settings)
+    return spidercls.from_crawler(crawler)
+
+
+def run_round(loop, spidercls, settings, manifest, timings=None):
+    """Один проход по всем страницам манифеста новым экземпляром паука."""
+    spider = create_spider(spidercls, settings)
+    items = requests = 0
+    for entry in manifest['pages']:
+        response, cb_kwargs = build_response(entry)
+        callback = getattr(spider, entry['callback'])
+
+        start = time.perf_counter()
+        outputs = run_callback(loop, callback, response, cb_kwargs)
+        elapsed = time.perf_counter() - start
+
+        for output in outputs:
+            if isinstance(output, Request):
+                requests += 1
+            else:
+                items += 1
+        if timings is not None:
+            timings.setdefault(entry['callback'], []).append(elapsed)
+    return items, requests
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def to_ms(value):
+    return round(value * 1000, 3)
+
+
+def bench_spider(loop, spidercls, settings, name, rounds):
+    manifest = load_manifest(name)
+
+    # Прогрев: импорты, компиляция XPath, кеши парсеров
+    run_round(loop, spidercls, settings, manifest)
+
+    timings = {}
+    items = requests = 0
+    for _ in range(rounds):
+        round_items, round_requests = run_round(
+            loop, spidercls, settings, manifest, timings
+        )
+        items += round_items
+        requests += round_requests
+
+    tracemalloc.start()
+    run_round(loop, spidercls, settings, manifest)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    all_timings = [value for values in timings.values() for value in values]
+    total = sum(all_timings)
+    return {
+        'pages': len(all_timings),
+        'items': items,
+        'requests': requests,
+        'callback_seconds': round(total, 4),
+        'pages_per_second': round(len(all_timings) / total, 1),
+        'items_per_second': round(items / total, 1),
+        'latency_ms': {
+            'p50': to_ms(percentile(all_timings, 0.5)),
+            'p99': to_ms(percentile(all_timings, 0.99)),
+            'max': to_ms(max(all_timings)),
+        },
+        'callbacks': {
+            callback: {
+                'calls': len(values),
+                'p50_ms': to_ms(percentile(values, 0.5)),
+                'p99_ms': to_ms(percentile(values, 0.99)),
+            }
+            for callback, values in sorted(timings.items())
+        },
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path):
+    """Печать изменения items/s и p99 относительно прошлого запуска."""
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f'Сравнение с {previous_path} ({previous.get("commit")}):')
+    for name, current in results['spiders'].items():
+        before = previous.get('spiders', {}).get(name)
+        if not before:
+            print(f'  {name}: нет в прошлом запуске')
+            continue
+        speed = current['items_per_second'] / max(before['items_per_second'], 1e-9)
+        p99 = current['latency_ms']['p99'] / max(before['latency_ms']['p99'], 1e-9)
+        print(
+            f'  {name}: items/s x{speed:.2f}, p99 x{p99:.2f}, '
+            f'память {before["peak_memory_kb"]} -> {current["peak_memory_kb"]} КБ'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('spiders', nargs='*', help='пауки (по умолчанию все)')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--output', help='файл для результатов JSON')
+    parser.add_argument('--compare', help='прошлый файл результатов')
+    args = parser.parse_args()
+
+    settings = get_project_settings()
+    install_reactor(settings['TWISTED_REACTOR'])
+    loop = asyncio.get_event_loop()
+    spider_loader = SpiderLoader.from_settings(settings)
+    crawler_settings = {
+        **settings.copy_to_dict(),
+        'LOG_ENABLED': False,
+        'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
+    }
+
+    names = args.spiders or sorted(
+        path.name for path in FIXTURES_DIR.iterdir()
+        if (path / 'manifest.json').exists()
+    )
+    results = {
+        'commit': git_revision(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'scrapy': scrapy.__version__,
+        'rounds': args.rounds,
+        'spiders': {},
+    }
+    for name in names:
+        spidercls = spider_loader.load(name)
+        stats = bench_spider(loop, spidercls, crawler_settings, name, args.rounds)
+        results['spiders'][name] = stats
+        print(
+            f'{name:>8}: {stats["pages_per_second"]:>9.1f} стр/с '
+            f'{stats["items_per_second"]:>9.1f} товаров/с  '
+            f'p50 {stats["latency_ms"]["p50"]:.3f} мс  '
+            f'p99 {stats["latency_ms"]["p99"]:.3f} мс  '
+            f'пик {stats["peak_memory_kb"]} КБ'
+        )
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f'spiders_{datetime.now():%Y%m%d_%H%M%S}_{results["commit"]}.json'
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены: {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
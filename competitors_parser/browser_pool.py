@@ -0,0 +1,191 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page, async_playwright
+
+
+class BrowserPool:
+    """
+    Долгоживущий пул браузеров Playwright для callback'ов Scrapy.
+
+    Запускает несколько процессов Chromium, в каждом по N изолированных
+    контекстов со своей страницей. Callback'и берут страницу через
+    `async with pool.page() as page`, не блокируя reactor, и
+    возвращают ее в пул после использования. Пул запускается лениво при
+    первом обращении и закрывается вызовом close().
+
+    Требует asyncio reactor (TWISTED_REACTOR в settings.py).
+    """
+
+    def __init__(
+            self,
+            browsers: int = 2,
+            pages_per_browser: int = 3,
+            headless: bool = True,
+            launch_options: Optional[Dict[str, Any]] = None
+            ):
+        self.browsers_count = max(int(browsers), 1)
+        self.pages_per_browser = max(int(pages_per_browser), 1)
+        self.headless = headless
+        self.launch_options = launch_options or {}
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._playwright = None
+        self._browsers: List[Browser] = []
+        self._pages: Optional[asyncio.Queue] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._relaunch_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, settings) -> 'BrowserPool':
+        """Создание пула по настройке PLAYWRIGHT_POOL."""
+        config = settings.getdict('PLAYWRIGHT_POOL')
+        return cls(
+            browsers=config.get('BROWSERS', 2),
+            pages_per_browser=config.get('PAGES_PER_BROWSER', 3),
+            headless=config.get('HEADLESS', True),
+            launch_options=config.get('LAUNCH_OPTIONS')
+        )
+
+    @property
+    def size(self) -> int:
+        """Общее количество страниц в пуле."""
+        return self.browsers_count * self.pages_per_browser
+
+    @property
+    def started(self) -> bool:
+        return self._pages is not None
+
+    async def start(self) -> None:
+        """Запуск браузеров и создание страниц."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self.started:
+                return
+            if self._closed:
+                raise RuntimeError('Пул браузеров уже закрыт')
+
+            self.logger.info(
+                f'Запуск пула Playwright: {self.browsers_count} браузер(а) '
+                f'по {self.pages_per_browser} страниц(ы)'
+                )
+            self._playwright = await async_playwright().start()
+            self._relaunch_lock = asyncio.Lock()
+            pages = asyncio.Queue()
+
+            for _ in range(self.browsers_count):
+                browser = await self._launch()
+                self._browsers.append(browser)
+                for _ in range(self.pages_per_browser):
+                    pages.put_nowait(await self._new_page(browser))
+
+            self._pages = pages
+
+    async def _launch(self) -> Browser:
+        return await self._playwright.chromium.launch(
+            headless=self.headless,
+            **self.launch_options
+        )
+
+    async def _live_browser(self, browser: Optional[Browser] = None) -> Browser:
+        """
+        Браузер для новой страницы: тот же, если он работает, иначе
+        вместо упавших браузеров запускаются новые.
+        """
+        if browser is not None and browser.is_connected():
+            return browser
+        async with self._relaunch_lock:
+            if self._closed:
+                raise RuntimeError('Пул браузеров уже закрыт')
+            self._browsers = [
+                candidate for candidate in self._browsers
+                if candidate.is_connected()
+            ]
+            if len(self._browsers) < self.browsers_count:
+                self.logger.warning('Браузер пула завершился, запускаем новый')
+                self._browsers.append(await self._launch())
+            return self._browsers[-1]
+
+    async def _new_page(self, browser: Browser) -> Page:
+        """Новая страница в отдельном контексте без общих cookies."""
+        context: BrowserContext = await browser.new_context()
+        return await context.new_page()
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """
+        Получение свободной страницы из пула.
+
+        Сломанная страница заменяется новой, при необходимости в
+        перезапущенном браузере. Если заменить ее не удалось, в пуле
+        остается пустое место (None): следующий callback пробует создать
+        страницу заново, а при неудаче получает исключение и уходит в
+        errback, вместо того чтобы бесконечно ждать страницу.
+        """
+        if not self.started:
+            await self.start()
+        if self._closed:
+            raise RuntimeError('Пул браузеров уже закрыт')
+
+        page = await self._pages.get()
+        if page is None:
+            try:
+                page = await self._new_page(await self._live_browser())
+            except Exception:
+                self._pages.put_nowait(None)
+                raise
+        try:
+            yield page
+        except Exception:
+            # Страница могла остаться в неизвестном состоянии - заменяем ее
+            page = await self._replace_page(page)
+            raise
+        finally:
+            if page is not None:
+                try:
+                    await page.context.clear_cookies()
+                except Exception as e:
+                    self.logger.warning(f'Не удалось очистить куки: {e}')
+            self._pages.put_nowait(page)
+
+    async def _replace_page(self, page: Page) -> Optional[Page]:
+        """
+        Закрытие сломанной страницы и создание новой в том же браузере
+        или, если он упал, в перезапущенном.
+        """
+        browser = page.context.browser
+        try:
+            await page.context.close()
+        except Exception as e:
+            self.logger.warning(f'Ошибка при закрытии контекста: {e}')
+
+        if self._closed:
+            return None
+        try:
+            return await self._new_page(await self._live_browser(browser))
+        except Exception as e:
+            self.logger.error(f'Не удалось создать новую страницу: {e}')
+            return None
+
+    async def close(self) -> None:
+        """Закрытие всех браузеров пула."""
+        self._closed = True
+        if not self.started:
+            return
+
+        for browser in self._browsers:
+            try:
+                await browser.close()
+            except Exception as e:
+                self.logger.warning(f'Ошибка при закрытии браузера: {e}')
+        self._browsers = []
+
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self.logger.info('Пул браузеров Playwright закрыт')
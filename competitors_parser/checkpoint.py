@@ -0,0 +1,162 @@
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.misc import load_object
+from twisted.internet import task
+
+
+CHECKPOINT_FILE = 'checkpoint.pickle'
+
+# Сигнал после записи контрольной точки: все, что сделано до нее,
+# сохранено, и FrontierScheduler может удалить завершенные запросы
+checkpoint_saved = object()
+
+
+def checkpoint_enabled(settings) -> bool:
+    """Контрольные точки пишутся только при заданном JOBDIR."""
+    return bool(settings.get('JOBDIR')) and settings.getdict(
+        'CHECKPOINT'
+    ).get('ENABLED', True)
+
+
+def checkpoint_path(settings) -> Optional[Path]:
+    jobdir = settings.get('JOBDIR')
+    return Path(jobdir) / CHECKPOINT_FILE if jobdir else None
+
+
+def load_checkpoint(settings) -> Dict[str, Any]:
+    """Последняя контрольная точка из JOBDIR или пустой словарь."""
+    path = checkpoint_path(settings)
+    if path is None or not path.exists():
+        return {}
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_checkpoint(settings, state: Dict[str, Any]) -> None:
+    """Атомарная запись: файл либо старый, либо новый целиком."""
+    path = checkpoint_path(settings)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """
+    Периодические контрольные точки для продолжения обхода после сбоя.
+
+    Раз в INTERVAL секунд в JOBDIR/checkpoint.pickle сохраняются
+    атрибуты паука из checkpoint_attributes (множества уже обработанных
+    URL и т.п.) и состояние экспортеров: файл и позиция, до которой
+    записанные товары сброшены на диск. Пайплайны с буфером (история
+    цен) по checkpoint() записывают его до контрольной точки. После записи отправляется
+    сигнал checkpoint_saved, по которому FrontierScheduler удаляет из
+    очереди завершенные запросы. После сбоя паук, запущенный с тем же
+    JOBDIR, восстанавливает атрибуты, экспортеры обрезают файлы до
+    сохраненной позиции и дописывают их, а запросы, не завершенные до
+    контрольной точки, выполняются заново. После полного обхода
+    контрольная точка удаляется. Настройка CHECKPOINT, работает только
+    с JOBDIR.
+    """
+
+    def __init__(self, crawler, interval: float = 60.0):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.crawler = crawler
+        self.settings = crawler.settings
+        self.stats = crawler.stats
+        self.interval = interval
+        self.spider = None
+        self.loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not checkpoint_enabled(crawler.settings):
+            raise NotConfigured
+        config = crawler.settings.getdict('CHECKPOINT')
+        extension = cls(crawler, float(config.get('INTERVAL', 60)))
+        crawler.signals.connect(
+            extension.spider_opened,
+            signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed,
+            signal=signals.spider_closed
+        )
+        return extension
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        scheduler_cls = load_object(self.settings['SCHEDULER'])
+        if not getattr(scheduler_cls, 'checkpointed', False):
+            self.logger.warning(
+                f'{scheduler_cls.__name__} сохраняет очередь только при '
+                f'штатной остановке, после сбоя обход продолжится не '
+                f'полностью. Для продолжения после сбоя нужен '
+                f'SCHEDULER = competitors_parser.frontier.FrontierScheduler'
+                )
+
+        state = load_checkpoint(self.settings)
+        for name, value in state.get('attributes', {}).items():
+            setattr(spider, name, value)
+        if state:
+            self.logger.info(
+                f'Обход продолжен с контрольной точки '
+                f'{time.ctime(state["saved_at"])}'
+                )
+
+        self.loop = task.LoopingCall(self.save)
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason: str):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        path = checkpoint_path(self.settings)
+        if reason == 'finished' and path.exists():
+            path.unlink()
+            self.logger.info('Обход завершен, контрольная точка удалена')
+
+    def save(self) -> None:
+        """
+        Снимок атрибутов паука и экспортеров (синхронно, в потоке реактора).
+
+        Если checkpoint() какого-либо пайплайна завершился ошибкой,
+        контрольная точка не записывается и запросы не подтверждаются.
+        """
+        spider = self.spider
+        state = {
+            'saved_at': time.time(),
+            'attributes': {
+                name: getattr(spider, name)
+                for name in getattr(spider, 'checkpoint_attributes', ())
+                if hasattr(spider, name)
+            },
+            'exporters': {},
+        }
+        for pipeline in self.crawler.engine.scraper.itemproc.middlewares:
+            checkpoint = getattr(pipeline, 'checkpoint', None)
+            if checkpoint is None:
+                continue
+            try:
+                exporter_state = checkpoint(spider)
+            except Exception as e:
+                # Без сохраненных данных пайплайна запросы нельзя
+                # подтверждать: попробуем на следующем интервале
+                self.logger.error(f'Контрольная точка пропущена: {str(e)}')
+                self.stats.inc_value('checkpoint/skipped', spider=spider)
+                return
+            if exporter_state is not None:
+                state['exporters'][pipeline.__class__.__name__] = exporter_state
+
+        save_checkpoint(self.settings, state)
+        self.stats.inc_value('checkpoint/saved', spider=spider)
+        self.crawler.signals.send_catch_log(checkpoint_saved, spider=spider)
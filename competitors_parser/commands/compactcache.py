@@ -0,0 +1,82 @@
+import os
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.project import data_path
+
+from ..httpcache import TTLRules, cache_path, connect, evict
+
+
+class Command(ScrapyCommand):
+    """
+    Сжатие HTTP-кеша SQLiteCacheStorage.
+
+    Удаляет просроченные по HTTPCACHE_TTL записи, затем самые старые
+    записи сверх --max-size и освобождает место через VACUUM.
+    """
+
+    requires_project = True
+    default_settings = {'LOG_ENABLED': False}
+
+    def syntax(self):
+        return '[options] [паук ...]'
+
+    def short_desc(self):
+        return 'Удалить просроченные записи HTTP-кеша и сжать базы'
+
+    def add_options(self, parser):
+        super().add_options(parser)
+        parser.add_argument(
+            '--max-size', type=int, default=None, metavar='МБ',
+            help='предельный размер кеша паука (по умолчанию '
+                 'HTTPCACHE_SQLITE.MAX_SIZE_MB)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только посчитать, что будет удалено'
+        )
+
+    def run(self, args, opts):
+        cachedir = data_path(self.settings['HTTPCACHE_DIR'])
+        if args:
+            paths = [cache_path(self.settings, name) for name in args]
+        elif os.path.isdir(cachedir):
+            paths = sorted(
+                os.path.join(cachedir, name) for name in os.listdir(cachedir)
+                if name.endswith('.sqlite3')
+            )
+        else:
+            paths = []
+        if not paths:
+            raise UsageError(f'Нет баз HTTP-кеша в {cachedir}', print_help=False)
+
+        config = self.settings.getdict('HTTPCACHE_SQLITE')
+        max_size_mb = (
+            opts.max_size if opts.max_size is not None
+            else int(config.get('MAX_SIZE_MB', 0))
+        )
+        rules = TTLRules.from_settings(self.settings)
+
+        for path in paths:
+            if not os.path.exists(path):
+                print(f'{path}: нет файла')
+                continue
+            before = os.path.getsize(path)
+            conn = connect(path)
+            try:
+                total, = conn.execute('SELECT COUNT(*) FROM responses').fetchone()
+                expired, evicted = evict(
+                    conn, rules, max_size_mb * 1024 * 1024,
+                    dry_run=opts.dry_run
+                )
+                if not opts.dry_run:
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                    conn.execute('VACUUM')
+            finally:
+                conn.close()
+            after = os.path.getsize(path)
+            print(
+                f'{path}: записей {total}, просрочено {expired}, '
+                f'вытеснено по размеру {evicted}, '
+                f'{before / 2 ** 20:.1f} -> {after / 2 ** 20:.1f} МБ'
+            )
@@ -1,4 +1,6 @@
 from .csv_exporter import CSVExporter
+from .delta_exporter import DeltaExporter
 from .json_exporter import JSONExporter
+from .parquet_exporter import ParquetExporter
 
-__all__ = ['CSVExporter', 'JSONExporter']
+__all__ = ['CSVExporter', 'DeltaExporter', 'JSONExporter', 'ParquetExporter']
@@ -1,6 +1,9 @@
 import logging
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..checkpoint import load_checkpoint
 
 
 class BaseExporter:
@@ -11,18 +14,49 @@ class BaseExporter:
         self.files = {}
         self.exporters = {}
 
-    def _create_export_dir(self, spider_name: str) -> Path:
-        """Создание директории для экспорта."""
-        export_dir = Path(f'data/processed/{spider_name}')
+    def _create_export_dir(self, spider) -> Path:
+        """Создание директории для экспорта (EXPORT_DIR/<паук>)."""
+        root = spider.settings.get('EXPORT_DIR') or 'data/processed'
+        export_dir = Path(root) / spider.name
         export_dir.mkdir(parents=True, exist_ok=True)
         return export_dir
 
-    def _get_filename(self, spider_name: str, extension: str) -> Path:
-        """Генерация имени файла с временной меткой."""
+    def _get_filename(
+            self,
+            spider,
+            extension: str,
+            kind: Optional[str] = None
+            ) -> Path:
+        """
+        Генерация имени файла с временной меткой.
+
+        Если обход продолжается с контрольной точки, возвращается файл
+        прошлого запуска.
+        """
+        resume = self._resume_state(spider)
+        if resume is not None:
+            self.logger.info(
+                f'Продолжение записи в {resume["path"]} с контрольной точки'
+                )
+            return Path(resume['path'])
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        prefix = f'{spider.name}_{kind}' if kind else spider.name
         return self._create_export_dir(
-            spider_name
-            ) / f'{spider_name}_{timestamp}.{extension}'
+            spider
+            ) / f'{prefix}_{timestamp}.{extension}'
+
+    def _resume_state(self, spider) -> Optional[Dict[str, Any]]:
+        """Состояние экспортера из контрольной точки JOBDIR (Checkpoint)."""
+        return load_checkpoint(spider.settings).get(
+            'exporters', {}
+        ).get(self.__class__.__name__)
+
+    def checkpoint(self, spider) -> Optional[Dict[str, Any]]:
+        """Сброс записанного на диск и позиция для продолжения после сбоя."""
+        writer = self.exporters.get(spider)
+        if writer is None:
+            return None
+        return writer.checkpoint()
 
     def open_spider(self, spider):
         """Метод, вызываемый при старте паука (должен быть переопределен)."""
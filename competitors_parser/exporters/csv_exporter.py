@@ -1,8 +1,9 @@
-import csv
 import json
 from typing import Any, Dict
 
+from ..items import ProductItem
 from .base import BaseExporter
+from .writers import BufferedCSVWriter
 
 
 class CSVExporter(BaseExporter):
@@ -10,8 +11,8 @@ class CSVExporter(BaseExporter):
 
     def open_spider(self, spider):
         """Инициализация экспортера при старте паука."""
-        filename = self._get_filename(spider.name, 'csv')
-        self.files[spider] = open(filename, 'w', newline='', encoding='utf-8')
+        filename = self._get_filename(spider, 'csv')
+        config = spider.settings.getdict('CSV_EXPORT')
 
         fieldnames = [
             'category',
@@ -27,51 +28,69 @@ class CSVExporter(BaseExporter):
             'url'
         ]
 
-        self.exporters[spider] = csv.DictWriter(
-            self.files[spider],
+        self.exporters[spider] = BufferedCSVWriter(
+            filename,
             fieldnames=fieldnames,
-            delimiter=';'
+            delimiter=config.get('DELIMITER', ';'),
+            encoding=config.get('ENCODING', 'utf-8'),
+            batch_size=config.get('BATCH_SIZE', 500),
+            flush_interval=config.get('FLUSH_INTERVAL', 5),
+            resume=self._resume_state(spider)
         )
-        self.exporters[spider].writeheader()
+        self.log_every = max(int(config.get('LOG_EVERY', 1000)), 1)
         self.logger.info(f'Начало записи в файл CSV: {filename}')
 
-    def process_item(self, item: Dict[str, Any], spider) -> Dict[str, Any]:
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
         """Обработка и запись item в CSV файл."""
         try:
             csv_item = self._format_item(item)
-            self.exporters[spider].writerow(csv_item)
-            self.logger.info(f'Товар {item.get("name", "")} записан в CSV')
+            writer = self.exporters[spider]
+            writer.write(csv_item)
+            if writer.count % self.log_every == 0:
+                self.logger.info(f'Записано в CSV: {writer.count} товаров')
 
         except Exception as e:
             self.logger.error(f'Ошибка при записи в CSV: {str(e)}')
 
         return item
 
-    def _format_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+    def close_spider(self, spider):
+        """Запись оставшихся строк и закрытие CSV файла."""
+        try:
+            writer = self.exporters.pop(spider)
+            filename = writer.close()
+            self.logger.info(
+                f'Файл {filename} успешно сохранен. '
+                f'Всего товаров: {writer.count}'
+                )
+
+        except Exception as e:
+            self.logger.error(f'Ошибка при сохранении CSV: {str(e)}')
+
+    def _format_item(self, item: ProductItem) -> Dict[str, Any]:
         """Форматирование item для CSV с сохранением структуры складов."""
         csv_item = {
-            'category': item.get('category', ''),
-            'product_code': item.get('product_code', ''),
-            'name': item.get('name', ''),
-            'currency': item.get('currency', 'RUB'),
-            'unit': self._format_unit(item.get('unit', 'шт')),
-            'weight': item.get('weight', ''),
-            'length': item.get('length', ''),
-            'width': item.get('width', ''),
-            'height': item.get('height', ''),
-            'url': item.get('url', '')
+            'category': item.category,
+            'product_code': item.product_code,
+            'name': item.name,
+            'currency': item.currency,
+            'unit': self._format_unit(item.unit),
+            'weight': item.weight,
+            'length': item.length,
+            'width': item.width,
+            'height': item.height,
+            'url': item.url
         }
 
-        stocks = item.get('stocks', [])
-        if stocks:
-            csv_item['stocks'] = json.dumps(stocks, ensure_ascii=False)
+        if item.stocks:
+            stocks = item.stocks_as_dicts()
         else:
-            price = item.get('price', 0.0)
-            csv_item['stocks'] = json.dumps([{
+            stocks = [{
                 'stock': 'Основной',
                 'quantity': 0,
-                'price': price
-            }], ensure_ascii=False)
+                'price': item.price or 0.0
+            }]
+        csv_item['stocks'] = json.dumps(stocks, ensure_ascii=False)
 
         return csv_item
 
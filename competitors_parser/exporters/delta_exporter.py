@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ..checkpoint import checkpoint_enabled
+from ..items import ProductItem, product_key
+from .base import BaseExporter
+from .writers import JSONStreamWriter
+
+
+class DeltaExporter(BaseExporter):
+    """
+    Экспорт только изменений относительно предыдущего запуска.
+
+    Для каждого паука хранится индекс `ключ товара -> хеш`
+    нормализованного товара и сжатый полный снимок. Ключ товара -
+    ProductItem.key.
+    В файл `<паук>_delta_<время>.jsonl` попадают только записи с
+    op=added/changed/removed. Удаленные товары
+    определяются только после полностью завершенного обхода (finished),
+    чтобы прерванный запуск не пометил весь каталог удаленным.
+    При DELTA_EXPORT['SNAPSHOT'] рядом сохраняется копия полного снимка.
+    С контрольными точками (JOBDIR) прерванный обход не меняет индекс:
+    он будет продолжен и дописан в тот же файл изменений.
+    """
+
+    FIELDS = (
+        'category', 'product_code', 'name', 'stocks', 'unit', 'currency',
+        'weight', 'length', 'width', 'height', 'url',
+    )
+    STATE_DIR = '.delta'
+
+    def __init__(self, snapshot: bool = False):
+        super().__init__()
+        self.snapshot = snapshot
+        self.state: Dict[Any, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('DELTA_EXPORT')
+        if not config.get('ENABLED', False):
+            raise NotConfigured
+        exporter = cls(snapshot=config.get('SNAPSHOT', False))
+        crawler.signals.connect(
+            exporter.spider_closed,
+            signal=signals.spider_closed
+        )
+        return exporter
+
+    def open_spider(self, spider):
+        """Загрузка индекса прошлого запуска и открытие файла изменений."""
+        state_dir = self._create_export_dir(spider) / self.STATE_DIR
+        state_dir.mkdir(exist_ok=True)
+
+        previous = self._load_index(state_dir)
+
+        filename = self._get_filename(spider, 'jsonl', kind='delta')
+        resume = self._resume_state(spider) or {}
+        self.exporters[spider] = JSONStreamWriter(
+            filename,
+            fmt='jsonl',
+            resume=resume.get('writer')
+        )
+        self.state[spider] = {
+            'dir': state_dir,
+            'previous': previous,
+            'current': resume.get('current', {}),
+            'counts': resume.get('counts') or {
+                'added': 0, 'changed': 0, 'removed': 0, 'same': 0
+            },
+        }
+        self.logger.info(
+            f'Запись изменений в {filename}. '
+            f'Товаров в прошлом снимке: {len(previous)}'
+            )
+
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
+        """Сравнение товара с прошлым запуском и запись изменения."""
+        try:
+            state = self.state[spider]
+            record = self._normalize(item)
+            key = item.key
+            digest = self._hash(record)
+            state['current'][key] = digest
+
+            previous = state['previous'].get(key)
+            if previous == digest:
+                state['counts']['same'] += 1
+                return item
+
+            op = 'added' if previous is None else 'changed'
+            state['counts'][op] += 1
+            self.exporters[spider].write({
+                'op': op,
+                'product_code': item.product_code,
+                'name': item.name,
+                'item': record,
+            })
+
+        except Exception as e:
+            self.logger.error(f'Ошибка при записи изменений: {str(e)}')
+
+        return item
+
+    def checkpoint(self, spider) -> Optional[Dict[str, Any]]:
+        """Позиция в файле изменений и хеши уже полученных товаров."""
+        state = self.state.get(spider)
+        writer = self.exporters.get(spider)
+        if state is None or writer is None:
+            return None
+        return {
+            'path': str(writer.path),
+            'writer': writer.checkpoint(),
+            'current': dict(state['current']),
+            'counts': dict(state['counts']),
+        }
+
+    def close_spider(self, spider):
+        """Файлы закрываются в spider_closed, где известна причина."""
+        pass
+
+    def spider_closed(self, spider, reason: str):
+        """Запись удаленных товаров, индекса и снимка."""
+        state = self.state.pop(spider, None)
+        writer = self.exporters.pop(spider, None)
+        if state is None or writer is None:
+            return
+
+        try:
+            if reason != 'finished' and checkpoint_enabled(spider.settings):
+                delta_path = writer.close()
+                self.logger.info(
+                    f'Обход прерван ({reason}), индекс не изменен: '
+                    f'запись в {delta_path} продолжится с контрольной точки'
+                    )
+                return
+
+            previous, current = state['previous'], state['current']
+            removed = set()
+            if reason == 'finished':
+                removed = previous.keys() - current.keys()
+                for key in removed:
+                    code, _, name = key.partition('\t')
+                    writer.write(
+                        {'op': 'removed', 'product_code': code, 'name': name}
+                    )
+                state['counts']['removed'] = len(removed)
+                index = current
+            else:
+                index = {**previous, **current}
+
+            delta_path = writer.close()
+            self._compact_snapshot(state['dir'], delta_path, removed)
+            self._save_index(state['dir'] / 'index.json', index)
+
+            if self.snapshot:
+                snapshot_path = delta_path.with_name(
+                    delta_path.name.replace('_delta_', '_snapshot_')
+                )
+                shutil.copyfile(state['dir'] / 'snapshot.jsonl', snapshot_path)
+                self.logger.info(f'Полный снимок сохранен: {snapshot_path}')
+
+            counts = state['counts']
+            self.logger.info(
+                f'Файл {delta_path} успешно сохранен. '
+                f'Новых: {counts["added"]}, измененных: {counts["changed"]}, '
+                f'удаленных: {counts["removed"]}, '
+                f'без изменений: {counts["same"]}'
+                )
+
+        except Exception as e:
+            self.logger.error(f'Ошибка при сохранении изменений: {str(e)}')
+
+    def _compact_snapshot(
+            self,
+            state_dir: Path,
+            delta_path: Path,
+            removed: set
+            ) -> None:
+        """Применение изменений к полному снимку прошлого запуска."""
+        snapshot_path = state_dir / 'snapshot.jsonl'
+        updated = {}
+        with open(delta_path, encoding='utf-8') as f:
+            for line in f:
+                change = json.loads(line)
+                if change['op'] != 'removed':
+                    updated[self._record_key(change['item'])] = change['item']
+
+        if not updated and not removed and snapshot_path.exists():
+            return
+
+        tmp_path = snapshot_path.with_name('snapshot.jsonl.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            if snapshot_path.exists():
+                with open(snapshot_path, encoding='utf-8') as f:
+                    for line in f:
+                        key = self._record_key(json.loads(line))
+                        if key in removed or key in updated:
+                            continue
+                        out.write(line)
+            for record in updated.values():
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, snapshot_path)
+
+    def _load_index(self, state_dir: Path) -> Dict[str, str]:
+        """Индекс прошлого запуска, пустой, если его нет или он не читается."""
+        index_path = state_dir / 'index.json'
+        if not index_path.exists():
+            return {}
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(
+                f'Индекс {index_path} не прочитан, '
+                f'все товары будут новыми: {str(e)}'
+                )
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _save_index(self, path: Path, index: Dict[str, str]) -> None:
+        """Атомарная запись индекса хешей."""
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def _normalize(self, item: ProductItem) -> Dict[str, Any]:
+        """Приведение товара к виду, по которому считается хеш."""
+        return item.to_dict(self.FIELDS)
+
+    def _hash(self, record: Dict[str, Any]) -> str:
+        """Короткий хеш нормализованного товара."""
+        data = json.dumps(
+            record,
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(',', ':')
+        ).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    def _record_key(self, record: Dict[str, Any]) -> str:
+        return product_key(record['product_code'], record['name'])
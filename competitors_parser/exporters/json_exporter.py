@@ -1,8 +1,6 @@
-import json
-from collections import OrderedDict
-from typing import Any, Dict
-
+from ..items import ProductItem
 from .base import BaseExporter
+from .writers import JSONStreamWriter
 
 
 class JSONExporter(BaseExporter):
@@ -10,29 +8,27 @@ class JSONExporter(BaseExporter):
 
     def open_spider(self, spider):
         """Инициализация экспортера при старте паука."""
-        self.items = []
-        self.logger.info(f'Инициализация JSON экспортера для {spider.name}')
-
-    def process_item(self, item: Dict[str, Any], spider) -> Dict[str, Any]:
-        """Обработка и сохранение item для последующей записи в JSON."""
+        config = spider.settings.getdict('JSON_EXPORT')
+        fmt = config.get('FORMAT', 'json')
+        filename = self._get_filename(spider, fmt)
+
+        self.exporters[spider] = JSONStreamWriter(
+            filename,
+            fmt=fmt,
+            flush_every=config.get('FLUSH_EVERY', 100),
+            flush_interval=config.get('FLUSH_INTERVAL', 5),
+            resume=self._resume_state(spider)
+        )
+        self.log_every = max(int(config.get('LOG_EVERY', 1000)), 1)
+        self.logger.info(f'Начало потоковой записи в файл JSON: {filename}')
+
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
+        """Обработка и запись item в JSON файл."""
         try:
-            ordered_item = OrderedDict()
-            ordered_item['category'] = item.get('category', '')
-            ordered_item['product_code'] = item.get('product_code', '')
-            ordered_item['name'] = item.get('name', '')
-            ordered_item['stocks'] = item.get('stocks', [])
-            ordered_item['unit'] = item.get('unit', '')
-            ordered_item['currency'] = item.get('currency', 'RUB')
-            ordered_item['weight'] = item.get('weight', None)
-            ordered_item['length'] = item.get('length', None)
-            ordered_item['width'] = item.get('width', None)
-            ordered_item['height'] = item.get('height', None)
-            ordered_item['url'] = item.get('url', '')
-
-            self.items.append(ordered_item)
-            self.logger.info(
-                f'Товар {item.get("name", "")} добавлен в JSON список'
-                )
+            writer = self.exporters[spider]
+            writer.write(item.to_dict())
+            if writer.count % self.log_every == 0:
+                self.logger.info(f'Записано в JSON: {writer.count} товаров')
 
         except Exception as e:
             self.logger.error(f'Ошибка при обработке item для JSON: {str(e)}')
@@ -40,15 +36,13 @@ class JSONExporter(BaseExporter):
         return item
 
     def close_spider(self, spider):
-        """Запись JSON файла при завершении работы паука."""
+        """Завершение записи JSON файла при остановке паука."""
         try:
-            filename = self._get_filename(spider.name, 'json')
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.items, f, ensure_ascii=False, indent=2)
+            writer = self.exporters.pop(spider)
+            filename = writer.close()
             self.logger.info(
-                f'Файл {filename} успешно сохранен. Всего товаров: {
-                    len(self.items)
-                    }'
+                f'Файл {filename} успешно сохранен. '
+                f'Всего товаров: {writer.count}'
                 )
 
         except Exception as e:
@@ -0,0 +1,237 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from scrapy.exceptions import NotConfigured
+
+from ..items import ProductItem
+from ..parsing import MEASURE_UNITS, parse_measure
+from .base import BaseExporter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+STOCK_TYPE = None
+SCHEMA = None
+if pa is not None:
+    STOCK_TYPE = pa.struct([
+        ('stock', pa.string()),
+        ('quantity', pa.int64()),
+        ('price', pa.float64()),
+    ])
+    SCHEMA = pa.schema([
+        ('category', pa.string()),
+        ('product_code', pa.string()),
+        ('name', pa.string()),
+        ('stocks', pa.list_(STOCK_TYPE)),
+        ('unit', pa.string()),
+        ('currency', pa.string()),
+        ('weight', pa.float64()),
+        ('length', pa.float64()),
+        ('width', pa.float64()),
+        ('height', pa.float64()),
+        ('url', pa.string()),
+    ])
+
+
+class ParquetExporter(BaseExporter):
+    """
+    Колоночный экспорт в Parquet с фиксированной схемой.
+
+    Склады сохраняются вложенной колонкой list<struct<stock, quantity,
+    price>>, поэтому при анализе не нужно разбирать JSON-строки.
+    Вес (кг) и размеры (м) записываются числами, см. parse_measure.
+    Item'ы накапливаются по колонкам и записываются группами строк
+    по мере поступления. Футер Parquet пишется только при закрытии,
+    поэтому на каждой контрольной точке текущая часть файла закрывается
+    и запись продолжается в следующую. Части объединяются в конце,
+    строки при этом перегруппировываются по ROW_GROUP_SIZE, чтобы
+    неполные группы контрольных точек не оставались в файле.
+    Требует pyarrow.
+    """
+
+    def __init__(self):
+        if pa is None:
+            raise NotConfigured('Для экспорта в Parquet нужен pyarrow')
+        super().__init__()
+        # Накопленные строки, части файла, счетчик и настройки паука
+        self.state: Dict[Any, Dict[str, Any]] = {}
+
+    def open_spider(self, spider):
+        """Инициализация экспортера при старте паука."""
+        config = spider.settings.getdict('PARQUET_EXPORT')
+        filename = self._get_filename(spider, 'parquet')
+        self.files[spider] = filename
+        state = self.state[spider] = {
+            'row_group_size': max(int(config.get('ROW_GROUP_SIZE', 5000)), 1),
+            'compression': config.get('COMPRESSION', 'zstd'),
+            'columns': self._empty_columns(),
+            'segments': [],
+            'count': 0,
+        }
+        resume = self._resume_state(spider)
+        if resume is not None:
+            state['segments'] = self._resume_segments(
+                filename, resume, state['compression']
+            )
+            if state['segments']:
+                state['count'] = resume['count']
+        self.logger.info(f'Начало записи в файл Parquet: {filename}')
+
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
+        """Добавление item в текущую группу строк."""
+        try:
+            state = self.state[spider]
+            columns = state['columns']
+            for field in SCHEMA.names:
+                columns[field].append(self._format_value(item, field))
+            state['count'] += 1
+
+            if len(columns['product_code']) >= state['row_group_size']:
+                self._write_row_group(spider)
+
+        except Exception as e:
+            self.logger.error(f'Ошибка при записи в Parquet: {str(e)}')
+
+        return item
+
+    def checkpoint(self, spider) -> Optional[Dict[str, Any]]:
+        """Закрытие текущей части файла: записанное уже не потеряется."""
+        if spider not in self.files:
+            return None
+        self._write_row_group(spider)
+        self._close_segment(spider)
+        state = self.state[spider]
+        return {
+            'path': str(self.files[spider]),
+            'segments': [str(path) for path in state['segments']],
+            'count': state['count'],
+        }
+
+    def close_spider(self, spider):
+        """Запись последней группы строк и закрытие файла."""
+        try:
+            self._write_row_group(spider)
+            self._close_segment(spider)
+            filename = self.files.pop(spider)
+            state = self.state.pop(spider)
+            segments = state['segments']
+            tmp_name = filename.with_name(f'{filename.name}.tmp')
+            if len(segments) == 1:
+                os.replace(segments[0], filename)
+            else:
+                self._merge_segments(state, tmp_name)
+                os.replace(tmp_name, filename)
+                for segment in segments:
+                    segment.unlink()
+            self.logger.info(
+                f'Файл {filename} успешно сохранен. '
+                f'Всего товаров: {state["count"]}'
+                )
+
+        except Exception as e:
+            self.logger.error(f'Ошибка при сохранении Parquet: {str(e)}')
+
+    def _write_row_group(self, spider) -> None:
+        """Запись накопленных строк одной группой."""
+        state = self.state[spider]
+        columns = state['columns']
+        if not columns['product_code']:
+            return
+        table = pa.Table.from_pydict(columns, schema=SCHEMA)
+        if spider not in self.exporters:
+            self.exporters[spider] = pq.ParquetWriter(
+                self._segment_path(spider, len(state['segments'])),
+                SCHEMA,
+                compression=state['compression']
+            )
+        self.exporters[spider].write_table(table)
+        state['columns'] = self._empty_columns()
+
+    def _merge_segments(self, state: Dict[str, Any], path: Path) -> None:
+        """
+        Объединение частей с перегруппировкой строк по ROW_GROUP_SIZE.
+
+        Группы строк читаются по одной, в памяти не больше двух групп.
+        """
+        row_group_size = state['row_group_size']
+        pending: List[Any] = []
+        pending_rows = 0
+        with pq.ParquetWriter(
+                path, SCHEMA, compression=state['compression']) as writer:
+            for segment in state['segments']:
+                parquet_file = pq.ParquetFile(segment)
+                for index in range(parquet_file.num_row_groups):
+                    table = parquet_file.read_row_group(index)
+                    pending.append(table)
+                    pending_rows += table.num_rows
+                    if pending_rows < row_group_size:
+                        continue
+                    table = pa.concat_tables(pending)
+                    while table.num_rows >= row_group_size:
+                        writer.write_table(
+                            table.slice(0, row_group_size),
+                            row_group_size=row_group_size
+                        )
+                        table = table.slice(row_group_size)
+                    pending = [table]
+                    pending_rows = table.num_rows
+            if pending_rows:
+                writer.write_table(
+                    pa.concat_tables(pending),
+                    row_group_size=row_group_size
+                )
+
+    def _close_segment(self, spider) -> None:
+        writer = self.exporters.pop(spider, None)
+        if writer is not None:
+            writer.close()
+            segments = self.state[spider]['segments']
+            segments.append(self._segment_path(spider, len(segments)))
+
+    def _segment_path(self, spider, index: int) -> Path:
+        filename = self.files[spider]
+        if index == 0:
+            return filename.with_name(f'{filename.name}.part')
+        return filename.with_name(f'{filename.name}.{index}.part')
+
+    def _resume_segments(
+            self,
+            filename: Path,
+            resume: Dict,
+            compression: str
+            ) -> List[Path]:
+        """Части файла, записанные до контрольной точки."""
+        segments = [Path(path) for path in resume['segments']]
+        if all(path.exists() for path in segments):
+            return segments
+        if not filename.exists():
+            self.logger.warning(
+                f'Части файла {filename} не найдены, запись начата заново'
+                )
+            return []
+        # Прошлый запуск успел объединить части: строки после контрольной
+        # точки отбрасываются, они будут получены заново
+        table = pq.read_table(filename).slice(0, resume['count'])
+        segment = filename.with_name(f'{filename.name}.part')
+        pq.write_table(table, segment, compression=compression)
+        filename.unlink()
+        return [segment]
+
+    def _empty_columns(self) -> Dict[str, List[Any]]:
+        return {field: [] for field in SCHEMA.names}
+
+    def _format_value(self, item: ProductItem, field: str) -> Any:
+        """Приведение значения к типу колонки."""
+        if field == 'stocks':
+            return item.stocks_as_dicts()
+        value = getattr(item, field)
+        if field in MEASURE_UNITS:
+            return parse_measure(value, field)
+        if isinstance(value, list):
+            return '; '.join(str(part) for part in value)
+        return None if value is None else str(value)
@@ -1,8 +1,9 @@
-import csv
 import json
 from typing import Any, Dict
 
+from ..items import ProductItem
 from .base import BaseExporter
+from .writers import BufferedCSVWriter
 
 
 class PlaywrightCSVExporter(BaseExporter):
@@ -10,8 +11,8 @@ class PlaywrightCSVExporter(BaseExporter):
 
     def open_spider(self, spider):
         """Инициализация экспортера при старте паука."""
-        filename = self._get_filename(spider.name, 'csv')
-        self.files[spider] = open(filename, 'w', newline='', encoding='utf-8')
+        filename = self._get_filename(spider, 'csv')
+        config = spider.settings.getdict('CSV_EXPORT')
 
         fieldnames = [
             'category',
@@ -23,45 +24,57 @@ class PlaywrightCSVExporter(BaseExporter):
             'url'
         ]
 
-        self.exporters[spider] = csv.DictWriter(
-            self.files[spider],
+        self.exporters[spider] = BufferedCSVWriter(
+            filename,
             fieldnames=fieldnames,
-            delimiter=';'
+            delimiter=config.get('DELIMITER', ';'),
+            encoding=config.get('ENCODING', 'utf-8'),
+            batch_size=config.get('BATCH_SIZE', 500),
+            flush_interval=config.get('FLUSH_INTERVAL', 5),
+            resume=self._resume_state(spider)
         )
-        self.exporters[spider].writeheader()
+        self.log_every = max(int(config.get('LOG_EVERY', 1000)), 1)
         self.logger.info(f'Начало записи в CSV файл: {filename}')
 
-    def process_item(self, item: Dict[str, Any], spider) -> Dict[str, Any]:
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
         """Обработка и запись item в CSV файл."""
         try:
             csv_item = self._prepare_csv_item(item)
 
-            self.exporters[spider].writerow(csv_item)
-            self.logger.info(f'Товар {item.get("name", "")} записан в CSV')
+            writer = self.exporters[spider]
+            writer.write(csv_item)
+            if writer.count % self.log_every == 0:
+                self.logger.info(f'Записано в CSV: {writer.count} товаров')
 
         except Exception as e:
             self.logger.error(f'Ошибка при записи в CSV: {str(e)}')
 
         return item
 
-    def _prepare_csv_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
-        """Подготовка item для записи в CSV файл."""
-        csv_item = {}
-
-        csv_item['category'] = item.get('category', '')
-        csv_item['product_code'] = item.get('product_code', '')
-        csv_item['name'] = item.get('name', '')
-        csv_item['unit'] = self._format_unit(item.get('unit', 'шт'))
-        csv_item['currency'] = item.get('currency', 'RUB')
-        csv_item['url'] = item.get('url', '')
+    def close_spider(self, spider):
+        """Запись оставшихся строк и закрытие CSV файла."""
+        try:
+            writer = self.exporters.pop(spider)
+            filename = writer.close()
+            self.logger.info(
+                f'Файл {filename} успешно сохранен. '
+                f'Всего товаров: {writer.count}'
+                )
 
-        stocks = item.get('stocks', [])
-        if stocks:
-            csv_item['stocks'] = json.dumps(stocks, ensure_ascii=False)
-        else:
-            csv_item['stocks'] = '[]'
+        except Exception as e:
+            self.logger.error(f'Ошибка при сохранении CSV: {str(e)}')
 
-        return csv_item
+    def _prepare_csv_item(self, item: ProductItem) -> Dict[str, Any]:
+        """Подготовка item для записи в CSV файл."""
+        return {
+            'category': item.category,
+            'product_code': item.product_code,
+            'name': item.name,
+            'stocks': json.dumps(item.stocks_as_dicts(), ensure_ascii=False),
+            'unit': self._format_unit(item.unit),
+            'currency': item.currency,
+            'url': item.url,
+        }
 
     def _format_unit(self, unit):
         """Форматирование единицы измерения."""
@@ -1,37 +1,39 @@
-import json
-from collections import OrderedDict
-from typing import Any, Dict
-
+from ..items import ProductItem
 from .base import BaseExporter
+from .writers import JSONStreamWriter
 
 
 class PlaywrightJSONExporter(BaseExporter):
     """JSON экспортер специально для пауков, использующих Playwright."""
 
+    FIELDS = (
+        'category', 'product_code', 'name', 'stocks', 'unit', 'currency',
+        'url',
+    )
+
     def open_spider(self, spider):
         """Инициализация экспортера при старте паука."""
-        self.items = []
-        self.logger.info(f'Инициализация JSON экспортера для {spider.name}')
-
-    def process_item(self, item: Dict[str, Any], spider) -> Dict[str, Any]:
-        """Обработка и сохранение item для последующей записи в JSON."""
+        config = spider.settings.getdict('JSON_EXPORT')
+        fmt = config.get('FORMAT', 'json')
+        filename = self._get_filename(spider, fmt)
+
+        self.exporters[spider] = JSONStreamWriter(
+            filename,
+            fmt=fmt,
+            flush_every=config.get('FLUSH_EVERY', 100),
+            flush_interval=config.get('FLUSH_INTERVAL', 5),
+            resume=self._resume_state(spider)
+        )
+        self.log_every = max(int(config.get('LOG_EVERY', 1000)), 1)
+        self.logger.info(f'Начало потоковой записи в файл JSON: {filename}')
+
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
+        """Обработка и запись item в JSON файл."""
         try:
-            ordered_item = OrderedDict()
-            ordered_item['category'] = item.get('category', '')
-            ordered_item['product_code'] = item.get('product_code', '')
-            ordered_item['name'] = item.get('name', '')
-
-            stocks = item.get('stocks', [])
-            ordered_item['stocks'] = stocks
-
-            ordered_item['unit'] = item.get('unit', 'шт')
-            ordered_item['currency'] = item.get('currency', 'RUB')
-            ordered_item['url'] = item.get('url', '')
-
-            self.items.append(ordered_item)
-            self.logger.info(
-                f'Товар {item.get("name", "")} добавлен в список для JSON'
-                )
+            writer = self.exporters[spider]
+            writer.write(item.to_dict(self.FIELDS))
+            if writer.count % self.log_every == 0:
+                self.logger.info(f'Записано в JSON: {writer.count} товаров')
 
         except Exception as e:
             self.logger.error(
@@ -41,15 +43,14 @@ class PlaywrightJSONExporter(BaseExporter):
         return item
 
     def close_spider(self, spider):
-        """Запись JSON файла при завершении работы паука."""
+        """Завершение записи JSON файла при остановке паука."""
         try:
-            filename = self._get_filename(spider.name, 'json')
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.items, f, ensure_ascii=False, indent=2)
+            writer = self.exporters.pop(spider)
+            filename = writer.close()
 
             self.logger.info(
                 f'JSON файл {filename} успешно сохранен. '
-                f'Всего товаров: {len(self.items)}'
+                f'Всего товаров: {writer.count}'
                 )
 
         except Exception as e:
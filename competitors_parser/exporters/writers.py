@@ -0,0 +1,193 @@
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+
+class JSONStreamWriter:
+    """
+    Потоковая запись item'ов в JSON или JSON Lines.
+
+    Каждый item записывается в файл сразу при поступлении, поэтому
+    память не растет с размером каталога. Данные пишутся во временный
+    файл `<имя>.part`, который периодически сбрасывается на диск и
+    атомарно переименовывается в итоговый файл при закрытии. После
+    аварийного завершения в `.part` остаются все записанные item'ы,
+    по одному на строку. С resume (состояние из checkpoint()) запись
+    продолжается в тот же файл с сохраненной позиции.
+
+    Форматы:
+        json  - валидный JSON-массив, дописываемый по одному элементу;
+        jsonl - JSON Lines, одна запись на строку.
+    """
+
+    FORMATS = ('json', 'jsonl')
+
+    def __init__(
+            self,
+            path: Union[str, Path],
+            fmt: str = 'json',
+            flush_every: int = 100,
+            flush_interval: float = 5.0,
+            resume: Optional[Dict[str, Any]] = None
+            ):
+        if fmt not in self.FORMATS:
+            raise ValueError(f'Неизвестный формат JSON экспорта: {fmt}')
+
+        self.path = Path(path)
+        self.part_path = self.path.with_name(f'{self.path.name}.part')
+        self.fmt = fmt
+        self.flush_every = max(int(flush_every), 1)
+        self.flush_interval = float(flush_interval)
+        self.count = 0
+
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        if resume:
+            self._file = self._reopen(resume)
+        else:
+            self._file = open(self.part_path, 'wb')
+            if self.fmt == 'json':
+                self._file.write(b'[\n')
+
+    def _reopen(self, resume: Dict[str, Any]):
+        """Открытие файла на позиции контрольной точки."""
+        if not self.part_path.exists() and self.path.exists():
+            # Прошлый запуск закрыл файл штатно
+            os.replace(self.path, self.part_path)
+        f = open(self.part_path, 'r+b')
+        f.truncate(resume['offset'])
+        f.seek(0, os.SEEK_END)
+        self.count = resume['count']
+        if self.fmt == 'json' and self.count:
+            # После закрытия файла у последней записи нет запятой,
+            # а за ней идет ']': возвращаем окончание ',\n'
+            while f.tell() > 2:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) not in b'\n],':
+                    break
+                f.seek(-1, os.SEEK_END)
+                f.truncate()
+            f.write(b',\n')
+        return f
+
+    def write(self, item: Any) -> None:
+        """Запись одного item'а."""
+        line = json.dumps(item, ensure_ascii=False).encode('utf-8')
+        # В режиме массива каждая запись заканчивается ',\n',
+        # последняя запятая убирается при закрытии файла
+        self._file.write(line + (b',\n' if self.fmt == 'json' else b'\n'))
+        self.count += 1
+        self._pending += 1
+
+        if (self._pending >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Сброс буфера на диск."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Сброс на диск и позиция для продолжения записи."""
+        self.flush()
+        return {
+            'path': str(self.path),
+            'offset': self._file.tell(),
+            'count': self.count,
+        }
+
+    def close(self) -> Path:
+        """Завершение записи и атомарное переименование файла."""
+        if self.fmt == 'json':
+            if self.count:
+                # Убираем запятую после последнего элемента
+                self._file.seek(-2, os.SEEK_END)
+                self._file.truncate()
+                self._file.write(b'\n')
+            self._file.write(b']\n')
+
+        self.flush()
+        self._file.close()
+        os.replace(self.part_path, self.path)
+        return self.path
+
+
+class BufferedCSVWriter:
+    """
+    Запись строк CSV пакетами.
+
+    Строки накапливаются в памяти и записываются в файл, когда размер
+    пакета достигает batch_size или с момента прошлой записи прошло
+    flush_interval секунд. С resume файл обрезается до позиции
+    контрольной точки и дописывается без повторного заголовка.
+    """
+
+    def __init__(
+            self,
+            path: Union[str, Path],
+            fieldnames: List[str],
+            delimiter: str = ';',
+            encoding: str = 'utf-8',
+            batch_size: int = 500,
+            flush_interval: float = 5.0,
+            resume: Optional[Dict[str, Any]] = None
+            ):
+        self.path = Path(path)
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.count = 0
+
+        self._batch: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        if resume:
+            os.truncate(self.path, resume['offset'])
+            self.count = resume['count']
+            self._file = open(self.path, 'a', newline='', encoding=encoding)
+        else:
+            self._file = open(self.path, 'w', newline='', encoding=encoding)
+        self._writer = csv.DictWriter(
+            self._file,
+            fieldnames=fieldnames,
+            delimiter=delimiter
+        )
+        if not resume:
+            self._writer.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Добавление строки в текущий пакет."""
+        self._batch.append(row)
+        self.count += 1
+
+        if (len(self._batch) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Запись накопленного пакета в файл."""
+        if self._batch:
+            self._writer.writerows(self._batch)
+            self._batch = []
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Запись пакета на диск и позиция для продолжения записи."""
+        self.flush()
+        os.fsync(self._file.fileno())
+        return {
+            'path': str(self.path),
+            'offset': os.fstat(self._file.fileno()).st_size,
+            'count': self.count,
+        }
+
+    def close(self) -> Path:
+        """Запись остатка пакета и закрытие файла."""
+        self.flush()
+        self._file.close()
+        return self.path
@@ -0,0 +1,326 @@
+import logging
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Optional
+from weakref import WeakSet
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.extensions.throttle import AutoThrottle
+from twisted.internet import task
+
+
+ERROR_STATUSES = frozenset({500, 502, 503, 504, 522, 524, 408})
+THROTTLE_STATUSES = frozenset({429})
+
+
+def parse_retry_after(value: Optional[bytes]) -> Optional[float]:
+    """Retry-After в секундах: число или HTTP-дата."""
+    if not value:
+        return None
+    value = value.decode('latin-1').strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(moment.timestamp() - time.time(), 0.0)
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class HostState:
+    """Наблюдения и текущее решение контроллера для одного хоста."""
+
+    def __init__(self, concurrency: float, delay: float, window: int):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.responses = 0
+        self.errors = 0
+        self.throttled = 0
+        self.saturated = 0
+        self.retry_after = 0.0
+        self.cooldown_until = 0.0
+        self.paused_until = 0.0
+        self.min_p50: Optional[float] = None
+        self.increases = 0
+        self.decreases = 0
+
+    def reset_window(self) -> None:
+        self.responses = self.errors = self.throttled = self.saturated = 0
+        self.retry_after = 0.0
+
+
+class AdaptiveConcurrency:
+    """
+    Подбор параллельности и задержки отдельно для каждого хоста (AIMD).
+
+    Для каждого слота загрузчика (по умолчанию слот - это хост, например
+    api.oracal-online.ru и www.oracal-online.ru) собираются задержки
+    ответов, доля ошибок и ответов 429. Раз в INTERVAL секунд решение
+    пересматривается:
+
+    - 429, Retry-After, доля ошибок выше MAX_ERROR_RATE или p90
+      задержки выше TARGET_LATENCY и LATENCY_FACTOR x минимальной p50 -
+      мультипликативное снижение: параллельность умножается на BACKOFF,
+      задержка удваивается, а до истечения Retry-After слот ждет его;
+    - иначе аддитивный рост: сначала темп слота (1 / задержка) растет
+      на RATE_STEP запросов в секунду, пока задержка не дойдет до
+      MIN_DELAY, затем, если слот был загружен полностью,
+      параллельность растет на 1 до MAX_CONCURRENCY.
+
+    Текущие решения публикуются в статистике adaptive/<хост>/...
+    Заменяет AutoThrottle: если тот включен, его обработчик ответов
+    отключается. Настройка ADAPTIVE_CONCURRENCY.
+    """
+
+    def __init__(self, crawler, config: Dict):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.start_concurrency = config.get('START_CONCURRENCY')
+        self.min_concurrency = max(int(config.get('MIN_CONCURRENCY', 1)), 1)
+        self.max_concurrency = max(
+            int(config.get('MAX_CONCURRENCY', 16)),
+            self.min_concurrency
+        )
+        self.min_delay = float(config.get('MIN_DELAY', 0.0))
+        self.max_delay = float(config.get('MAX_DELAY', 60.0))
+        self.rate_step = float(config.get('RATE_STEP', 1.0))
+        self.backoff = float(config.get('BACKOFF', 0.5))
+        self.target_latency = float(config.get('TARGET_LATENCY', 2.0))
+        self.latency_factor = float(config.get('LATENCY_FACTOR', 3.0))
+        self.max_error_rate = float(config.get('MAX_ERROR_RATE', 0.05))
+        self.window = int(config.get('WINDOW', 50))
+        self.min_samples = int(config.get('MIN_SAMPLES', 3))
+        self.interval = float(config.get('INTERVAL', 2.0))
+        self.hosts: Dict[str, HostState] = {}
+        self.responded: WeakSet = WeakSet()
+        self.loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('ADAPTIVE_CONCURRENCY')
+        if not config.get('ENABLED', False):
+            raise NotConfigured
+        extension = cls(crawler, config)
+        crawler.signals.connect(
+            extension.spider_opened,
+            signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed,
+            signal=signals.spider_closed
+        )
+        crawler.signals.connect(
+            extension.response_downloaded,
+            signal=signals.response_downloaded
+        )
+        crawler.signals.connect(
+            extension.request_left_downloader,
+            signal=signals.request_left_downloader
+        )
+        return extension
+
+    def spider_opened(self, spider):
+        self._disable_autothrottle()
+        self.loop = task.LoopingCall(self.adjust_all)
+        self.loop.start(self.interval, now=False)
+        self.logger.info(
+            f'Адаптивная параллельность: {self.min_concurrency}-'
+            f'{self.max_concurrency} запросов на хост, задержка '
+            f'{self.min_delay}-{self.max_delay} с'
+            )
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.adjust_all()
+
+    def _disable_autothrottle(self) -> None:
+        """Отключение AutoThrottle, чтобы он не менял задержку слотов."""
+        for extension in self.crawler.extensions.middlewares:
+            if isinstance(extension, AutoThrottle):
+                self.crawler.signals.disconnect(
+                    extension._response_downloaded,
+                    signal=signals.response_downloaded
+                )
+                self.logger.info(
+                    'AutoThrottle отключен: задержку и параллельность '
+                    'задает AdaptiveConcurrency'
+                    )
+
+    def _slot(self, request):
+        key = request.meta.get('download_slot')
+        if key is None:
+            return None, None
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _state(self, key: str, slot) -> HostState:
+        state = self.hosts.get(key)
+        if state is None:
+            concurrency = self.start_concurrency or slot.concurrency
+            state = HostState(
+                concurrency=self._clamp_concurrency(concurrency),
+                delay=self._clamp_delay(slot.delay),
+                window=self.window
+            )
+            self.hosts[key] = state
+            self._apply(key, slot, state)
+        elif slot.concurrency != int(state.concurrency):
+            # Загрузчик пересоздал слот после простоя
+            self._apply(key, slot, state)
+        return state
+
+    def response_downloaded(self, response, request, spider):
+        key, slot = self._slot(request)
+        if slot is None:
+            return
+        self.responded.add(request)
+        state = self._state(key, slot)
+        state.responses += 1
+        if len(slot.transferring) >= slot.concurrency:
+            state.saturated += 1
+
+        latency = request.meta.get('download_latency')
+        if latency is not None and response.status not in THROTTLE_STATUSES:
+            state.latencies.append(latency)
+
+        if response.status in THROTTLE_STATUSES or (
+                response.status == 503 and b'Retry-After' in response.headers):
+            state.throttled += 1
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after:
+                state.retry_after = max(state.retry_after, retry_after)
+            # Ограничение сайта применяется сразу, не дожидаясь пересмотра
+            self._decrease(key, slot, state, 'throttled')
+        elif response.status in ERROR_STATUSES:
+            state.errors += 1
+
+    def request_left_downloader(self, request, spider):
+        """Запрос без ответа (таймаут, обрыв) считается ошибкой."""
+        if request in self.responded:
+            self.responded.discard(request)
+            return
+        key, slot = self._slot(request)
+        if slot is not None:
+            state = self._state(key, slot)
+            state.responses += 1
+            state.errors += 1
+
+    def adjust_all(self) -> None:
+        slots = self.crawler.engine.downloader.slots
+        for key, state in self.hosts.items():
+            slot = slots.get(key)
+            if slot is not None:
+                self.adjust(key, slot, state)
+            self._publish(key, state)
+
+    def adjust(self, key: str, slot, state: HostState) -> None:
+        """Пересмотр решения по итогам окна наблюдений."""
+        if state.paused_until and time.monotonic() >= state.paused_until:
+            state.paused_until = 0.0
+            self._apply(key, slot, state)
+        if state.responses < self.min_samples:
+            return
+
+        error_rate = state.errors / state.responses
+        p50 = p90 = None
+        if state.latencies:
+            p50 = percentile(state.latencies, 0.5)
+            p90 = percentile(state.latencies, 0.9)
+            state.min_p50 = p50 if state.min_p50 is None else min(
+                state.min_p50, p50
+            )
+
+        if state.throttled:
+            reason = 'throttled'
+        elif error_rate > self.max_error_rate:
+            reason = f'ошибок {error_rate:.0%}'
+        elif p90 is not None and p90 > max(
+                self.target_latency, state.min_p50 * self.latency_factor):
+            reason = f'p90 {p90:.2f} с'
+        else:
+            reason = None
+
+        if reason is not None:
+            if reason != 'throttled':
+                self._decrease(key, slot, state, reason)
+        elif state.delay > self.min_delay:
+            state.delay = self._next_delay(state.delay)
+            state.increases += 1
+            self._apply(key, slot, state)
+        elif state.saturated and state.concurrency < self.max_concurrency:
+            state.concurrency = self._clamp_concurrency(state.concurrency + 1)
+            state.increases += 1
+            self._apply(key, slot, state)
+        state.reset_window()
+
+    def _decrease(self, key: str, slot, state: HostState, reason: str) -> None:
+        now = time.monotonic()
+        # Одно снижение на окно: серия 429 подряд - это одно событие
+        if now >= state.cooldown_until:
+            state.concurrency = self._clamp_concurrency(
+                state.concurrency * self.backoff
+            )
+            state.delay = self._clamp_delay(
+                max(state.delay * 2, 1 / max(self.rate_step * 4, 1e-9))
+            )
+            state.cooldown_until = now + self.interval
+            state.decreases += 1
+            self.logger.info(
+                f'{key}: {reason}, параллельность {int(state.concurrency)}, '
+                f'задержка {state.delay:.2f} с'
+                )
+        if state.retry_after:
+            # Пауза по Retry-After действует до его истечения и не
+            # становится постоянной задержкой
+            state.paused_until = max(
+                state.paused_until, now + state.retry_after
+            )
+            state.retry_after = 0.0
+        self._apply(key, slot, state)
+
+    def _apply(self, key: str, slot, state: HostState) -> None:
+        slot.concurrency = int(state.concurrency)
+        slot.delay = state.delay
+        pause = state.paused_until - time.monotonic()
+        if pause > 0:
+            slot.delay = min(max(state.delay, pause), self.max_delay)
+
+    def _publish(self, key: str, state: HostState) -> None:
+        prefix = f'adaptive/{key}'
+        self.stats.set_value(f'{prefix}/concurrency', int(state.concurrency))
+        self.stats.set_value(f'{prefix}/delay_ms', int(state.delay * 1000))
+        self.stats.set_value(f'{prefix}/increases', state.increases)
+        self.stats.set_value(f'{prefix}/decreases', state.decreases)
+        if state.latencies:
+            self.stats.set_value(
+                f'{prefix}/p50_ms',
+                int(percentile(state.latencies, 0.5) * 1000)
+            )
+            self.stats.set_value(
+                f'{prefix}/p90_ms',
+                int(percentile(state.latencies, 0.9) * 1000)
+            )
+
+    def _next_delay(self, delay: float) -> float:
+        """Аддитивный рост темпа: +RATE_STEP запросов в секунду."""
+        delay = 1 / (1 / delay + self.rate_step)
+        # Задержка меньше 50 мс уже не ограничивает темп
+        if delay < 0.05:
+            return self.min_delay
+        return self._clamp_delay(delay)
+
+    def _clamp_concurrency(self, value: float) -> float:
+        return min(max(value, self.min_concurrency), self.max_concurrency)
+
+    def _clamp_delay(self, value: float) -> float:
+        return min(max(value, self.min_delay), self.max_delay)
@@ -0,0 +1,666 @@
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Iterable, List, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.misc import load_object
+from scrapy.utils.request import request_from_dict
+from twisted.internet import task
+
+from .checkpoint import checkpoint_enabled, checkpoint_saved
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS crawls (
+    crawl TEXT PRIMARY KEY,
+    seeded_by TEXT NOT NULL,
+    started_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS seen (
+    crawl TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (crawl, fingerprint)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY,
+    crawl TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    worker TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_queue_order
+    ON queue (crawl, worker, priority DESC, id);
+
+CREATE TABLE IF NOT EXISTS workers (
+    crawl TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    state TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (crawl, worker)
+) WITHOUT ROWID;
+'''
+
+# Атомарное извлечение: запрос закрепляется за воркером тем же
+# оператором, которым выбирается, второй процесс его уже не увидит
+# (SQLite 3.35+). Из очереди запрос удаляется только подтверждением (ack)
+POP_REQUEST = '''
+UPDATE queue SET worker = ? WHERE id = (
+    SELECT id FROM queue WHERE crawl = ? AND worker IS NULL
+    ORDER BY priority DESC, id LIMIT 1
+) RETURNING id, data
+'''
+
+# Пакетное извлечение: до LIMIT запросов закрепляются за воркером разом
+POP_REQUESTS = '''
+UPDATE queue SET worker = ? WHERE id IN (
+    SELECT id FROM queue WHERE crawl = ? AND worker IS NULL
+    ORDER BY priority DESC, id LIMIT ?
+) RETURNING id, priority, data
+'''
+
+# Запросы воркеров, давно не отправлявших heartbeat, возвращаются в очередь
+REQUEUE_DEAD = '''
+UPDATE queue SET worker = NULL WHERE crawl = ? AND worker IN (
+    SELECT worker FROM workers WHERE crawl = ? AND seen_at <= ?
+)
+'''
+
+_stores: 'WeakKeyDictionary[Any, FrontierStore]' = WeakKeyDictionary()
+
+
+def worker_name(settings) -> Optional[str]:
+    """
+    Имя воркера из FRONTIER['WORKER'].
+
+    С JOBDIR имя постоянное (по каталогу задания): перезапущенный после
+    сбоя воркер получает обратно свои неподтвержденные запросы сразу,
+    не дожидаясь WORKER_TIMEOUT. Иначе имя задает FrontierStore.
+    """
+    worker = settings.getdict('FRONTIER').get('WORKER')
+    jobdir = settings.get('JOBDIR')
+    if worker is None and jobdir:
+        worker = f'{socket.gethostname()}-{Path(jobdir).resolve().name}'
+    return worker
+
+
+def frontier_store(crawler) -> 'FrontierStore':
+    """Общее хранилище фронтира для планировщика, dupefilter и middleware."""
+    store = _stores.get(crawler)
+    if store is None:
+        config = crawler.settings.getdict('FRONTIER')
+        store_cls = load_object(
+            config.get('STORE', 'competitors_parser.frontier.SQLiteFrontierStore')
+        )
+        store = store_cls.from_settings(crawler.settings)
+        _stores[crawler] = store
+    return store
+
+
+class FrontierStore(ABC):
+    """
+    Общее состояние обхода, которое делят процессы-воркеры.
+
+    Обход (crawl) - это очередь запросов, отпечатки уже виденных
+    запросов и список воркеров. Выданный воркеру запрос остается в
+    очереди за ним, пока воркер не подтвердит его обработку (ack);
+    запросы упавшего воркера возвращаются в очередь. Все операции
+    должны быть атомарными относительно других воркеров:
+    SQLiteFrontierStore делает это транзакциями SQLite, сетевая
+    реализация (Redis, PostgreSQL) должна обеспечить то же самое,
+    реализовать все абстрактные методы и подключается через
+    FRONTIER['STORE'].
+    """
+
+    def __init__(
+            self,
+            crawl: Optional[str] = None,
+            worker_timeout: float = 60,
+            worker: Optional[str] = None
+            ):
+        self.crawl = crawl
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        self.worker_timeout = worker_timeout
+
+    @classmethod
+    @abstractmethod
+    def from_settings(cls, settings) -> 'FrontierStore':
+        """Хранилище по настройке FRONTIER."""
+
+    @abstractmethod
+    def open(self, spider_name: str) -> None:
+        """
+        Подключение и регистрация воркера (повторный вызов не нужен).
+
+        Запросы, оставшиеся за воркером с тем же именем от прошлого
+        запуска, возвращаются в очередь.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Отключение, воркер отмечается завершившим работу."""
+
+    @abstractmethod
+    def claim_seed(self) -> bool:
+        """True, если этот воркер первым начал обход и отдает стартовые запросы."""
+
+    @abstractmethod
+    def mark_seen(self, fingerprint: str) -> bool:
+        """Запоминает отпечаток, True - если его еще не было."""
+
+    @abstractmethod
+    def push(self, data: bytes, priority: int = 0) -> None:
+        """Постановка запроса в очередь."""
+
+    @abstractmethod
+    def pop(self) -> Optional[Tuple[int, bytes]]:
+        """Следующий запрос и его id; воркер при этом считается занятым."""
+
+    def push_many(
+            self,
+            entries: Iterable[Tuple[Optional[str], bytes, int]]
+            ) -> List[bool]:
+        """
+        Запись пакета запросов (отпечаток, данные, приоритет) разом.
+
+        Запрос с уже виденным отпечатком не ставится в очередь,
+        запросы без отпечатка (dont_filter) ставятся всегда. Для
+        каждого запроса возвращается, поставлен ли он.
+        """
+        added = []
+        for fingerprint, data, priority in entries:
+            if fingerprint is not None and not self.mark_seen(fingerprint):
+                added.append(False)
+                continue
+            self.push(data, priority)
+            added.append(True)
+        return added
+
+    def pop_many(self, limit: int) -> List[Tuple[int, bytes]]:
+        """До limit следующих запросов в порядке приоритета."""
+        rows = []
+        while len(rows) < limit:
+            row = self.pop()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    @abstractmethod
+    def ack(self, ids: Iterable[int]) -> None:
+        """Удаление обработанных запросов из очереди."""
+
+    @abstractmethod
+    def release(self) -> None:
+        """Возврат в очередь всех неподтвержденных запросов воркера."""
+
+    @abstractmethod
+    def pending(self) -> int:
+        """Число запросов, еще не выданных ни одному воркеру."""
+
+    @abstractmethod
+    def heartbeat(self) -> None:
+        """Отметка, что воркер жив; возврат запросов упавших воркеров."""
+
+    @abstractmethod
+    def finish(self) -> bool:
+        """
+        Попытка завершить работу простаивающего воркера.
+
+        False, пока в очереди есть запросы или другие живые воркеры
+        заняты (их запросы еще могут породить новые). Последний
+        завершившийся воркер очищает состояние обхода.
+        """
+
+
+class SQLiteFrontierStore(FrontierStore):
+    """
+    Фронтир в файле SQLite для нескольких процессов одной машины.
+
+    Файл можно положить и на общий диск, но SQLite по сетевым файловым
+    системам медленный и не везде надежно блокируется: для нескольких
+    машин лучше сетевая реализация FrontierStore. PATH может содержать
+    {spider}. Процессы ждут блокировку записи до BUSY_TIMEOUT секунд.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            crawl: Optional[str] = None,
+            worker_timeout: float = 60,
+            busy_timeout: float = 30,
+            worker: Optional[str] = None
+            ):
+        super().__init__(crawl, worker_timeout, worker)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path_template = path
+        self.busy_timeout = busy_timeout
+        self.path: Optional[Path] = None
+        self.conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_settings(cls, settings) -> 'SQLiteFrontierStore':
+        config = settings.getdict('FRONTIER')
+        return cls(
+            path=config.get('PATH', 'data/frontier/{spider}.sqlite3'),
+            crawl=config.get('CRAWL'),
+            worker_timeout=float(config.get('WORKER_TIMEOUT', 60)),
+            busy_timeout=float(config.get('BUSY_TIMEOUT', 30)),
+            worker=worker_name(settings)
+        )
+
+    def open(self, spider_name: str) -> None:
+        if self.conn is not None:
+            return
+        self.crawl = self.crawl or spider_name
+        self.path = Path(self.path_template.format(spider=spider_name))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO workers (crawl, worker, state, seen_at) '
+                "VALUES (?, ?, 'busy', ?)",
+                (self.crawl, self.worker, time.time())
+            )
+        self.release()
+        self.logger.info(
+            f'Фронтир {self.path}: обход {self.crawl}, воркер {self.worker}'
+            )
+
+    def close(self) -> None:
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute(
+                "UPDATE workers SET state = 'done' "
+                'WHERE crawl = ? AND worker = ?',
+                (self.crawl, self.worker)
+            )
+        self.conn.close()
+        self.conn = None
+
+    def claim_seed(self) -> bool:
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO crawls (crawl, seeded_by, started_at) '
+                'VALUES (?, ?, ?)',
+                (self.crawl, self.worker, time.time())
+            )
+        return cursor.rowcount == 1
+
+    def mark_seen(self, fingerprint: str) -> bool:
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO seen (crawl, fingerprint) VALUES (?, ?)',
+                (self.crawl, fingerprint)
+            )
+        return cursor.rowcount == 1
+
+    def push(self, data: bytes, priority: int = 0) -> None:
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO queue (crawl, priority, data) VALUES (?, ?, ?)',
+                (self.crawl, priority, data)
+            )
+
+    def pop(self) -> Optional[Tuple[int, bytes]]:
+        with self.conn:
+            row = self.conn.execute(
+                POP_REQUEST, (self.worker, self.crawl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._set_state('busy')
+        return row[0], row[1]
+
+    def push_many(
+            self,
+            entries: Iterable[Tuple[Optional[str], bytes, int]]
+            ) -> List[bool]:
+        added = []
+        with self.conn:
+            for fingerprint, data, priority in entries:
+                if fingerprint is not None:
+                    cursor = self.conn.execute(
+                        'INSERT OR IGNORE INTO seen (crawl, fingerprint) '
+                        'VALUES (?, ?)',
+                        (self.crawl, fingerprint)
+                    )
+                    if cursor.rowcount != 1:
+                        added.append(False)
+                        continue
+                self.conn.execute(
+                    'INSERT INTO queue (crawl, priority, data) VALUES (?, ?, ?)',
+                    (self.crawl, priority, data)
+                )
+                added.append(True)
+        return added
+
+    def pop_many(self, limit: int) -> List[Tuple[int, bytes]]:
+        with self.conn:
+            rows = self.conn.execute(
+                POP_REQUESTS, (self.worker, self.crawl, limit)
+            ).fetchall()
+            if not rows:
+                return []
+            self._set_state('busy')
+        # RETURNING не сохраняет порядок подзапроса
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return [(id_, data) for id_, _, data in rows]
+
+    def ack(self, ids: Iterable[int]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                'DELETE FROM queue WHERE id = ? AND worker = ?',
+                [(id_, self.worker) for id_ in ids]
+            )
+
+    def release(self) -> None:
+        with self.conn:
+            self.conn.execute(
+                'UPDATE queue SET worker = NULL WHERE crawl = ? AND worker = ?',
+                (self.crawl, self.worker)
+            )
+
+    def pending(self) -> int:
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM queue WHERE crawl = ? AND worker IS NULL',
+            (self.crawl,)
+        ).fetchone()[0]
+
+    def heartbeat(self) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                'UPDATE workers SET seen_at = ? WHERE crawl = ? AND worker = ?',
+                (now, self.crawl, self.worker)
+            )
+            cursor = self.conn.execute(
+                REQUEUE_DEAD,
+                (self.crawl, self.crawl, now - self.worker_timeout)
+            )
+        if cursor.rowcount > 0:
+            self.logger.warning(
+                f'В очередь возвращено {cursor.rowcount} запросов '
+                f'остановившихся воркеров'
+                )
+
+    def finish(self) -> bool:
+        live_since = time.time() - self.worker_timeout
+        with self.conn:
+            # Первой идет запись: проверки ниже выполняются под
+            # блокировкой записи и не пересекаются с pop других воркеров
+            self._set_state('idle')
+            # Свои неподтвержденные запросы уже обработаны, а чужие
+            # либо в работе, либо вернутся в очередь по heartbeat
+            queued = self.conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM queue WHERE crawl = ? '
+                'AND (worker IS NULL OR worker != ?))',
+                (self.crawl, self.worker)
+            ).fetchone()[0]
+            busy = self.conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE crawl = ? AND worker != ? "
+                "AND state = 'busy' AND seen_at > ?",
+                (self.crawl, self.worker, live_since)
+            ).fetchone()[0]
+            if queued or busy:
+                return False
+
+            self._set_state('done')
+            remaining = self.conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE crawl = ? "
+                "AND state != 'done' AND seen_at > ?",
+                (self.crawl, live_since)
+            ).fetchone()[0]
+            if not remaining:
+                for table in ('queue', 'seen', 'workers', 'crawls'):
+                    self.conn.execute(
+                        f'DELETE FROM {table} WHERE crawl = ?', (self.crawl,)
+                    )
+                self.logger.info(f'Обход {self.crawl} завершен всеми воркерами')
+        return True
+
+    def _set_state(self, state: str) -> None:
+        self.conn.execute(
+            'UPDATE workers SET state = ?, seen_at = ? '
+            'WHERE crawl = ? AND worker = ?',
+            (state, time.time(), self.crawl, self.worker)
+        )
+
+
+class FrontierDupeFilter(RFPDupeFilter):
+    """
+    Отпечатки запросов в общем хранилище фронтира.
+
+    Запрос, который уже поставил в очередь любой воркер обхода,
+    отбрасывается. Работает и со стандартным планировщиком через
+    DUPEFILTER_CLASS, тогда общими будут только отпечатки.
+    """
+
+    def __init__(self, store: FrontierStore, crawler, debug: bool = False):
+        super().__init__(
+            debug=debug, fingerprinter=crawler.request_fingerprinter
+        )
+        self.store = store
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            frontier_store(crawler),
+            crawler,
+            debug=crawler.settings.getbool('DUPEFILTER_DEBUG')
+        )
+
+    def open(self):
+        self.store.open(self.crawler.spider.name)
+
+    def request_seen(self, request) -> bool:
+        return not self.store.mark_seen(
+            self.fingerprinter.fingerprint(request).hex()
+        )
+
+
+class FrontierScheduler(BaseScheduler):
+    """
+    Планировщик с общей для нескольких процессов очередью запросов.
+
+    Запросы сериализуются (request_to_dict, callback по имени) и
+    кладутся в FrontierStore, каждый воркер забирает следующий запрос
+    атомарно, поэтому один запрос обрабатывает ровно один воркер.
+    Товары идут в пайплайны того воркера, который разобрал страницу.
+    Стартовые запросы отдает только первый воркер обхода
+    (FrontierSeedMiddleware). Пустая очередь еще не конец обхода: пока
+    другие воркеры заняты, паук не закрывается (DontCloseSpider) и
+    раз в несколько секунд проверяет очередь снова. Обход, прерванный
+    до конца, продолжается при следующем запуске воркеров.
+
+    Каждая операция с хранилищем - транзакция, которая на время
+    ожидания блокировки записи (до BUSY_TIMEOUT) останавливает
+    реактор. Поэтому новые запросы копятся в памяти и записываются
+    одной транзакцией перед следующей выдачей, то есть одним пакетом
+    на выход callback'а, а из очереди запросы забираются пакетами по
+    BATCH_SIZE. Забранные, но еще не выданные запросы закреплены за
+    воркером и после сбоя возвращаются в очередь, как и выданные.
+
+    Запрос удаляется из очереди только после обработки ответа
+    (включая пайплайны), поэтому после сбоя процесса он выполняется
+    заново. С контрольными точками (Checkpoint) обработанные запросы
+    подтверждаются только на сигнал checkpoint_saved: все, что
+    не попало в контрольную точку, будет выполнено повторно.
+    Настройка FRONTIER, включается через
+    SCHEDULER = 'competitors_parser.frontier.FrontierScheduler'.
+    """
+
+    # Очередь переживает сбой процесса (см. Checkpoint)
+    checkpointed = True
+
+    def __init__(
+            self,
+            crawler,
+            store: FrontierStore,
+            dupefilter: FrontierDupeFilter,
+            heartbeat: float = 5.0,
+            ack_on_checkpoint: bool = False,
+            batch_size: int = 50
+            ):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.store = store
+        self.df = dupefilter
+        self.heartbeat_interval = heartbeat
+        self.ack_on_checkpoint = ack_on_checkpoint
+        self.batch_size = max(int(batch_size), 1)
+        self.leased: Set[int] = set()
+        # Новые запросы до записи и забранные из очереди до выдачи
+        self.outbox: List[Tuple[Optional[str], bytes, int, Any]] = []
+        self.outbox_seen: Set[str] = set()
+        self.inbox: Deque[Tuple[int, bytes]] = deque()
+        self.spider = None
+        self.loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('FRONTIER')
+        scheduler = cls(
+            crawler,
+            frontier_store(crawler),
+            FrontierDupeFilter.from_crawler(crawler),
+            heartbeat=float(config.get('HEARTBEAT', 5)),
+            ack_on_checkpoint=checkpoint_enabled(crawler.settings),
+            batch_size=int(config.get('BATCH_SIZE', 50))
+        )
+        crawler.signals.connect(
+            scheduler.spider_idle,
+            signal=signals.spider_idle
+        )
+        crawler.signals.connect(
+            scheduler.ack_checkpointed,
+            signal=checkpoint_saved
+        )
+        return scheduler
+
+    def open(self, spider):
+        self.spider = spider
+        self.store.open(spider.name)
+        self.loop = task.LoopingCall(self.heartbeat)
+        self.loop.start(self.heartbeat_interval, now=False)
+
+    def close(self, reason):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.flush()
+        if not self.ack_on_checkpoint or reason == 'finished':
+            self._ack(self.leased)
+        # Обработанное после контрольной точки будет выполнено заново
+        self.store.release()
+        self.store.close()
+
+    def heartbeat(self) -> None:
+        self.flush()
+        if not self.ack_on_checkpoint:
+            self._ack_finished()
+        self.store.heartbeat()
+
+    def ack_checkpointed(self, spider):
+        # Запросы, порожденные подтверждаемыми, должны быть уже в очереди
+        self.flush()
+        self._ack_finished()
+
+    def _ack_finished(self) -> None:
+        """Подтверждение запросов, ответы на которые уже обработаны."""
+        in_progress = {
+            request.meta.get('frontier_id')
+            for request in self.crawler.engine.slot.inprogress
+        }
+        self._ack(self.leased - in_progress)
+
+    def _ack(self, ids: Set[int]) -> None:
+        if ids:
+            # ids может быть самим self.leased
+            count = len(ids)
+            self.store.ack(ids)
+            self.leased -= ids
+            self.stats.inc_value('frontier/acked', count, spider=self.spider)
+
+    def has_pending_requests(self) -> bool:
+        return bool(self.outbox or self.inbox) or self.store.pending() > 0
+
+    def enqueue_request(self, request) -> bool:
+        fingerprint = None
+        if not request.dont_filter:
+            fingerprint = self.df.request_fingerprint(request)
+            if fingerprint in self.outbox_seen:
+                self.df.log(request, self.spider)
+                return False
+            self.outbox_seen.add(fingerprint)
+        data = pickle.dumps(
+            request.to_dict(spider=self.spider), pickle.HIGHEST_PROTOCOL
+        )
+        # Повтор, уже виденный другими воркерами, отсеется при записи
+        self.outbox.append((fingerprint, data, request.priority, request))
+        if len(self.outbox) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        """Запись накопленных запросов одной транзакцией."""
+        if not self.outbox:
+            return
+        outbox, self.outbox = self.outbox, []
+        self.outbox_seen = set()
+        added = self.store.push_many(
+            (fingerprint, data, priority)
+            for fingerprint, data, priority, _ in outbox
+        )
+        enqueued = 0
+        for entry, is_added in zip(outbox, added):
+            if is_added:
+                enqueued += 1
+            else:
+                self.df.log(entry[3], self.spider)
+        if enqueued:
+            self.stats.inc_value(
+                'frontier/enqueued', enqueued, spider=self.spider
+            )
+
+    def next_request(self):
+        # Свои новые запросы попадают в общую очередь до выдачи
+        self.flush()
+        if not self.inbox:
+            self.inbox.extend(self.store.pop_many(self.batch_size))
+            if not self.inbox:
+                return None
+        id_, data = self.inbox.popleft()
+        self.leased.add(id_)
+        self.stats.inc_value('frontier/dequeued', spider=self.spider)
+        request = request_from_dict(pickle.loads(data), spider=self.spider)
+        request.meta['frontier_id'] = id_
+        return request
+
+    def spider_idle(self, spider):
+        self.flush()
+        if not self.ack_on_checkpoint:
+            self._ack_finished()
+        if not self.store.finish():
+            self.stats.inc_value('frontier/idle_waits', spider=spider)
+            raise DontCloseSpider
+
+    def __len__(self) -> int:
+        return len(self.outbox) + len(self.inbox) + self.store.pending()
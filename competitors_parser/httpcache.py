@@ -0,0 +1,277 @@
+import gzip
+import json
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    fingerprint TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers BLOB NOT NULL,
+    body BLOB NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_responses_stored_at
+    ON responses (stored_at);
+'''
+
+UPSERT_RESPONSE = '''
+INSERT INTO responses (
+    fingerprint, url, status, headers, body, codec, size, stored_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (fingerprint) DO UPDATE SET
+    url = excluded.url,
+    status = excluded.status,
+    headers = excluded.headers,
+    body = excluded.body,
+    codec = excluded.codec,
+    size = excluded.size,
+    stored_at = excluded.stored_at
+'''
+
+
+class Codec:
+    """Сжатие тел ответов: zstd, если установлен zstandard, иначе gzip."""
+
+    def __init__(self, name: str = 'zstd', level: int = 3):
+        if name == 'zstd' and zstandard is None:
+            name = 'gzip'
+        if name not in ('zstd', 'gzip', 'raw'):
+            raise ValueError(f'Неизвестное сжатие кеша: {name}')
+        self.name = name
+        self.level = level
+        self._compressor = None
+        self._decompressor = None
+        if name == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == 'zstd':
+            return self._compressor.compress(data)
+        if self.name == 'gzip':
+            return gzip.compress(data, compresslevel=min(self.level, 9))
+        return data
+
+    def decompress(self, data: bytes, name: str) -> bytes:
+        """Распаковка с кодеком, которым запись была сжата."""
+        if name == 'zstd':
+            if zstandard is None:
+                raise ValueError('Запись сжата zstd, а zstandard не установлен')
+            if self._decompressor is None:
+                self._decompressor = zstandard.ZstdDecompressor()
+            return self._decompressor.decompress(data)
+        if name == 'gzip':
+            return gzip.decompress(data)
+        return data
+
+
+class TTLRules:
+    """
+    Время жизни записи по URL.
+
+    rules - пары (регулярное выражение, секунды), побеждает первое
+    совпадение (re.search). Без совпадения действует default.
+    0 означает бессрочное хранение.
+    """
+
+    def __init__(self, rules: Iterable = (), default: int = 0):
+        self.rules: List[Tuple[Pattern, int]] = [
+            (re.compile(pattern), int(seconds)) for pattern, seconds in rules
+        ]
+        self.default = int(default)
+
+    @classmethod
+    def from_settings(cls, settings) -> 'TTLRules':
+        # Из командной строки правила приходят строкой JSON:
+        # -s 'HTTPCACHE_TTL={"get_offers": 600}'
+        rules = settings.get('HTTPCACHE_TTL') or []
+        if isinstance(rules, str):
+            rules = json.loads(rules)
+        if isinstance(rules, dict):
+            rules = rules.items()
+        return cls(rules, settings.getint('HTTPCACHE_EXPIRATION_SECS'))
+
+    def ttl(self, url: str) -> int:
+        for pattern, seconds in self.rules:
+            if pattern.search(url):
+                return seconds
+        return self.default
+
+    def is_expired(self, url: str, stored_at: float, now: float) -> bool:
+        ttl = self.ttl(url)
+        return bool(ttl) and now - stored_at > ttl
+
+
+def cache_path(settings, spider_name: str) -> Path:
+    """Файл базы кеша паука в HTTPCACHE_DIR."""
+    cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+    return Path(cachedir) / f'{spider_name}.sqlite3'
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def evict(
+        conn: sqlite3.Connection,
+        rules: TTLRules,
+        max_size: int = 0,
+        now: Optional[float] = None,
+        dry_run: bool = False
+        ) -> Tuple[int, int]:
+    """
+    Удаление просроченных записей, затем самых старых сверх max_size байт.
+
+    Возвращает (просрочено, вытеснено по размеру).
+    """
+    now = time.time() if now is None else now
+    expired = [
+        (fingerprint,)
+        for fingerprint, url, stored_at in conn.execute(
+            'SELECT fingerprint, url, stored_at FROM responses'
+        )
+        if rules.is_expired(url, stored_at, now)
+    ]
+
+    evicted = []
+    if max_size:
+        expired_set = {fingerprint for fingerprint, in expired}
+        total = sum(
+            size for fingerprint, size in conn.execute(
+                'SELECT fingerprint, size FROM responses'
+            )
+            if fingerprint not in expired_set
+        )
+        if total > max_size:
+            for fingerprint, size in conn.execute(
+                'SELECT fingerprint, size FROM responses ORDER BY stored_at'
+            ):
+                if total <= max_size:
+                    break
+                if fingerprint in expired_set:
+                    continue
+                evicted.append((fingerprint,))
+                total -= size
+
+    if not dry_run:
+        with conn:
+            conn.executemany(
+                'DELETE FROM responses WHERE fingerprint = ?',
+                expired + evicted
+            )
+    return len(expired), len(evicted)
+
+
+class SQLiteCacheStorage:
+    """
+    Хранилище HTTP-кеша в одном файле SQLite на паука.
+
+    Вместо каталога с несколькими файлами на каждый ответ (как у
+    FilesystemCacheStorage) ответы лежат в таблице responses файла
+    HTTPCACHE_DIR/<паук>.sqlite3, тела сжаты zstd или gzip. Время жизни
+    задается по классам URL в HTTPCACHE_TTL и проверяется при чтении,
+    поэтому изменение правил действует и на уже сохраненные ответы.
+    Запись идет пакетами по COMMIT_EVERY ответов. Просроченные записи
+    удаляются при закрытии паука и командой scrapy compactcache.
+    Настройки HTTPCACHE_SQLITE и HTTPCACHE_TTL.
+    """
+
+    def __init__(self, settings):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.settings = settings
+        config = settings.getdict('HTTPCACHE_SQLITE')
+        self.codec = Codec(
+            config.get('COMPRESSION', 'zstd'),
+            int(config.get('LEVEL', 3))
+        )
+        self.commit_every = max(int(config.get('COMMIT_EVERY', 100)), 1)
+        self.evict_on_close = bool(config.get('EVICT_ON_CLOSE', True))
+        self.max_size = int(config.get('MAX_SIZE_MB', 0)) * 1024 * 1024
+        self.rules = TTLRules.from_settings(settings)
+        self.conn: Optional[sqlite3.Connection] = None
+        self.path: Optional[Path] = None
+        self.pending = 0
+        self._fingerprinter = None
+
+    def open_spider(self, spider):
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.path = cache_path(self.settings, spider.name)
+        self.conn = connect(self.path)
+        self.logger.info(
+            f'HTTP-кеш: {self.path}, сжатие {self.codec.name}'
+            )
+
+    def close_spider(self, spider):
+        if self.conn is None:
+            return
+        self.conn.commit()
+        if self.evict_on_close:
+            expired, evicted = evict(self.conn, self.rules, self.max_size)
+            if expired or evicted:
+                self.logger.info(
+                    f'HTTP-кеш: удалено просроченных {expired}, '
+                    f'вытеснено по размеру {evicted}'
+                    )
+        self.conn.close()
+        self.conn = None
+
+    def retrieve_response(self, spider, request):
+        """Ответ из кеша или None, если его нет или он просрочен."""
+        row = self.conn.execute(
+            'SELECT url, status, headers, body, codec, stored_at '
+            'FROM responses WHERE fingerprint = ?',
+            (self._fingerprint(request),)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, codec, stored_at = row
+        if self.rules.is_expired(request.url, stored_at, time.time()):
+            return None
+
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        body = self.codec.decompress(body, codec)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        body = self.codec.compress(response.body)
+        self.conn.execute(UPSERT_RESPONSE, (
+            self._fingerprint(request),
+            response.url,
+            response.status,
+            headers_dict_to_raw(response.headers),
+            body,
+            self.codec.name,
+            len(body),
+            time.time(),
+        ))
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def _fingerprint(self, request) -> str:
+        return self._fingerprinter.fingerprint(request).hex()
@@ -1,14 +1,107 @@
-import scrapy
-
-
-class CompetitorsParserItem(scrapy.Item):
-    id = scrapy.Field()
-    category = scrapy.Field()
-    product_code = scrapy.Field()
-    name = scrapy.Field()
-    unit = scrapy.Field()
-    price = scrapy.Field()
-    currency = scrapy.Field()
-    url = scrapy.Field()
-    char = scrapy.Field()
-    stocks = scrapy.Field()
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+
+def product_key(product_code: str, name: str) -> str:
+    """Идентичность товара между запусками и шардами, см. ProductItem.key."""
+    return f'{product_code}\t{name}'
+
+
+@dataclass(slots=True)
+class StockItem:
+    """Остаток товара на одном складе."""
+    stock: str = 'Основной'
+    quantity: int = 0
+    price: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'stock': self.stock,
+            'quantity': self.quantity,
+            'price': self.price,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StockItem':
+        return cls(
+            stock=data.get('stock', 'Основной'),
+            quantity=data.get('quantity', 0),
+            price=data.get('price')
+        )
+
+
+@dataclass(slots=True)
+class ProductItem:
+    """
+    Компактная запись о товаре, общая для пауков, пайплайнов и экспортеров.
+
+    Пауки создают запись один раз, ValidationPipeline нормализует ее на
+    месте, экспортеры сериализуют напрямую. Поле price используется
+    только для валидации, если у товара нет складов, и не экспортируется.
+    """
+    category: str = ''
+    product_code: str = ''
+    name: str = ''
+    stocks: List[StockItem] = field(default_factory=list)
+    unit: Union[str, List[str]] = 'шт'
+    currency: str = 'RUB'
+    weight: Optional[str] = None
+    length: Optional[str] = None
+    width: Optional[str] = None
+    height: Optional[str] = None
+    url: str = ''
+    price: Optional[float] = None
+
+    # Поля, попадающие в экспорт, в порядке колонок
+    EXPORT_FIELDS = (
+        'category', 'product_code', 'name', 'stocks', 'unit', 'currency',
+        'weight', 'length', 'width', 'height', 'url',
+    )
+
+    @property
+    def key(self) -> str:
+        """
+        Идентичность товара: product_code и название.
+
+        product_code недостаточно: у вариантов forda он общий, а
+        различаются они названием.
+        """
+        return product_key(self.product_code, self.name)
+
+    def stocks_as_dicts(self) -> List[Dict[str, Any]]:
+        return [stock.to_dict() for stock in self.stocks]
+
+    def to_dict(
+            self,
+            fields: Optional[Iterable[str]] = None
+            ) -> Dict[str, Any]:
+        """Словарь для сериализации в JSON."""
+        result = {}
+        for name in fields or self.EXPORT_FIELDS:
+            if name == 'stocks':
+                result[name] = self.stocks_as_dicts()
+            else:
+                result[name] = getattr(self, name)
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ProductItem':
+        """Создание записи из словаря (например, из сохраненного JSON)."""
+        return cls(
+            category=data.get('category', ''),
+            product_code=data.get('product_code', ''),
+            name=data.get('name', ''),
+            stocks=[
+                stock if isinstance(stock, StockItem)
+                else StockItem.from_dict(stock)
+                for stock in data.get('stocks') or []
+            ],
+            unit=data.get('unit', 'шт'),
+            currency=data.get('currency', 'RUB'),
+            weight=data.get('weight'),
+            length=data.get('length'),
+            width=data.get('width'),
+            height=data.get('height'),
+            url=data.get('url', ''),
+            price=data.get('price')
+        )
@@ -0,0 +1,442 @@
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import task
+from twisted.internet.error import CannotListenError
+from twisted.web import resource, server
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм в секундах: от быстрого разбора страницы до
+# медленного ответа сайта
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Длинные причины отбраковки обрезаются, чтобы не плодить метки
+MAX_REASON_LENGTH = 120
+
+PROMETHEUS_CONTENT_TYPE = b'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами, как в Prometheus."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Последняя ячейка - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Оценка квантиля сверху: граница ячейки, где он находится."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        for bound, total in zip(self.buckets, self.cumulative()):
+            if total >= rank:
+                return bound
+        return self.buckets[-1] if self.buckets else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000, 3)
+            if self.count else None,
+            'p50_ms': self._ms(self.quantile(0.5)),
+            'p90_ms': self._ms(self.quantile(0.9)),
+            'p99_ms': self._ms(self.quantile(0.99)),
+        }
+
+    @staticmethod
+    def _ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 3)
+
+
+class SpiderMetrics:
+    """
+    Метрики одного паука.
+
+    Callback'и: число вызовов, время выполнения, отданные товары и
+    запросы, объем разобранных ответов. Хосты: задержка загрузки и
+    ответы по статусам. Пайплайны: отбракованные товары по причинам.
+    """
+
+    def __init__(self, spider: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.spider = spider
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.callback_calls: Counter = Counter()
+        self.callback_errors: Counter = Counter()
+        self.callback_seconds: Dict[str, Histogram] = {}
+        self.items: Counter = Counter()
+        self.requests: Counter = Counter()
+        self.response_bytes: Counter = Counter()
+        self.download_seconds: Dict[str, Histogram] = {}
+        self.responses: Counter = Counter()
+        self.dropped: Counter = Counter()
+
+    def observe_callback(
+            self,
+            callback: str,
+            seconds: float,
+            items: int,
+            requests: int,
+            response_bytes: int,
+            failed: bool = False
+            ) -> None:
+        histogram = self.callback_seconds.get(callback)
+        if histogram is None:
+            histogram = self.callback_seconds[callback] = Histogram(
+                self.buckets
+            )
+        histogram.observe(seconds)
+        self.callback_calls[callback] += 1
+        self.items[callback] += items
+        self.requests[callback] += requests
+        self.response_bytes[callback] += response_bytes
+        if failed:
+            self.callback_errors[callback] += 1
+
+    def observe_download(
+            self,
+            host: str,
+            status: int,
+            seconds: Optional[float]
+            ) -> None:
+        self.responses[(host, str(status))] += 1
+        if seconds is None:
+            return
+        histogram = self.download_seconds.get(host)
+        if histogram is None:
+            histogram = self.download_seconds[host] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def observe_drop(self, reason: str) -> None:
+        self.dropped[reason[:MAX_REASON_LENGTH]] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Снимок для JSON: сводка по callback'ам, хостам и отбраковке."""
+        uptime = max(time.time() - self.started_at, 1e-9)
+        items = sum(self.items.values())
+        hosts: Dict[str, Dict[str, Any]] = {}
+        for (host, status), count in self.responses.items():
+            hosts.setdefault(host, {'responses': {}})['responses'][status] = count
+        for host, histogram in self.download_seconds.items():
+            hosts.setdefault(host, {'responses': {}})[
+                'download'
+            ] = histogram.summary()
+        return {
+            'spider': self.spider,
+            'updated_at': time.time(),
+            'uptime_seconds': round(uptime, 1),
+            'items': items,
+            'items_per_second': round(items / uptime, 2),
+            'callbacks': {
+                name: {
+                    'calls': self.callback_calls[name],
+                    'errors': self.callback_errors[name],
+                    'items': self.items[name],
+                    'requests': self.requests[name],
+                    'response_bytes': self.response_bytes[name],
+                    'time': histogram.summary(),
+                    'total_seconds': round(histogram.sum, 3),
+                }
+                for name, histogram in sorted(self.callback_seconds.items())
+            },
+            'hosts': hosts,
+            'dropped': dict(self.dropped),
+        }
+
+
+_metrics: 'WeakKeyDictionary[Any, SpiderMetrics]' = WeakKeyDictionary()
+
+
+def crawler_metrics(crawler) -> SpiderMetrics:
+    """Общие метрики краулера для MetricsMiddleware и расширения Metrics."""
+    metrics = _metrics.get(crawler)
+    if metrics is None:
+        buckets = crawler.settings.getdict('METRICS').get('BUCKETS')
+        metrics = SpiderMetrics(
+            crawler.spidercls.name,
+            sorted(buckets) if buckets else DEFAULT_BUCKETS
+        )
+        _metrics[crawler] = metrics
+    return metrics
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(**labels: str) -> str:
+    return '{' + ','.join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    ) + '}'
+
+
+def _format_bound(value: float) -> str:
+    return repr(float(value))
+
+
+def render_prometheus(registries: Iterable[SpiderMetrics]) -> str:
+    """Текстовый формат Prometheus 0.0.4 для всех пауков процесса."""
+    registries = list(registries)
+    lines: List[str] = []
+
+    def counter(name: str, help_text: str, attribute: str, label: str):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for metrics in registries:
+            for key, value in sorted(getattr(metrics, attribute).items()):
+                lines.append(
+                    f'{name}'
+                    f'{_labels(spider=metrics.spider, **{label: key})} {value}'
+                )
+
+    def histogram(name: str, help_text: str, attribute: str, label: str):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for metrics in registries:
+            for key, hist in sorted(getattr(metrics, attribute).items()):
+                labels = {'spider': metrics.spider, label: key}
+                bounds = [_format_bound(b) for b in hist.buckets] + ['+Inf']
+                for bound, total in zip(bounds, hist.cumulative()):
+                    lines.append(
+                        f'{name}_bucket{_labels(**labels, le=bound)} {total}'
+                    )
+                lines.append(f'{name}_sum{_labels(**labels)} {hist.sum}')
+                lines.append(f'{name}_count{_labels(**labels)} {hist.count}')
+
+    counter(
+        'parser_callback_calls_total',
+        'Вызовы callback\'ов паука', 'callback_calls', 'callback'
+    )
+    counter(
+        'parser_callback_errors_total',
+        'Callback\'и, завершившиеся исключением', 'callback_errors', 'callback'
+    )
+    histogram(
+        'parser_callback_seconds',
+        'Время выполнения callback\'а', 'callback_seconds', 'callback'
+    )
+    counter(
+        'parser_items_total',
+        'Товары, отданные callback\'ом', 'items', 'callback'
+    )
+    counter(
+        'parser_requests_total',
+        'Запросы, отданные callback\'ом', 'requests', 'callback'
+    )
+    counter(
+        'parser_response_bytes_total',
+        'Объем ответов, разобранных callback\'ом', 'response_bytes', 'callback'
+    )
+    histogram(
+        'parser_download_seconds',
+        'Задержка загрузки по хостам', 'download_seconds', 'host'
+    )
+
+    name = 'parser_responses_total'
+    lines.append(f'# HELP {name} Ответы по хостам и статусам')
+    lines.append(f'# TYPE {name} counter')
+    for metrics in registries:
+        for (host, status), value in sorted(metrics.responses.items()):
+            lines.append(
+                f'{name}'
+                f'{_labels(spider=metrics.spider, host=host, status=status)} '
+                f'{value}'
+            )
+
+    counter(
+        'parser_dropped_items_total',
+        'Отбракованные пайплайнами товары', 'dropped', 'reason'
+    )
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsResource(resource.Resource):
+    """/metrics - формат Prometheus, /metrics.json - сводка по паукам."""
+
+    isLeaf = True
+
+    def render_GET(self, request) -> bytes:
+        registries = list(_metrics.values())
+        if request.path == b'/metrics':
+            request.setHeader(b'Content-Type', PROMETHEUS_CONTENT_TYPE)
+            return render_prometheus(registries).encode('utf-8')
+        if request.path == b'/metrics.json':
+            request.setHeader(b'Content-Type', b'application/json')
+            return json.dumps(
+                [metrics.to_dict() for metrics in registries],
+                ensure_ascii=False
+            ).encode('utf-8')
+        request.setResponseCode(404)
+        return b''
+
+
+class MetricsServer:
+    """Один HTTP-эндпоинт на процесс, общий для всех пауков."""
+
+    port = None
+    users = 0
+
+    @classmethod
+    def acquire(cls, host: str, port: int, tries: int = 1) -> None:
+        """
+        Запуск эндпоинта на первом свободном порту из port, port + 1, ...
+
+        Так воркеры общей очереди, запущенные вручную на одной машине,
+        получают каждый свой порт.
+        """
+        from twisted.internet import reactor
+
+        cls.users += 1
+        if cls.port is not None:
+            return
+        for candidate in range(port, port + max(tries, 1)):
+            try:
+                cls.port = reactor.listenTCP(
+                    candidate, server.Site(MetricsResource()), interface=host
+                )
+            except CannotListenError as e:
+                error = e
+                continue
+            logger.info(f'Метрики: http://{host}:{candidate}/metrics')
+            return
+        logger.warning(f'Эндпоинт метрик не запущен: {error}')
+
+    @classmethod
+    def release(cls) -> None:
+        cls.users = max(cls.users - 1, 0)
+        if cls.users == 0 and cls.port is not None:
+            cls.port.stopListening()
+            cls.port = None
+
+
+class Metrics:
+    """
+    Метрики обхода во время работы паука.
+
+    По callback'ам (их замеряет MetricsMiddleware): вызовы, гистограмма
+    времени выполнения, отданные товары и запросы, объем ответов.
+    По хостам: гистограмма задержки загрузки и ответы по статусам.
+    По пайплайнам: отбракованные товары по причинам (DropItem из
+    ValidationPipeline и других). Метрики всех пауков процесса отдаются
+    в формате Prometheus на http://HOST:PORT/metrics, а раз в
+    SNAPSHOT_INTERVAL секунд и при закрытии паука сводка пишется в
+    JSON-файл SNAPSHOT. Настройка METRICS.
+    """
+
+    def __init__(
+            self,
+            crawler,
+            host: str = '127.0.0.1',
+            port: Optional[int] = None,
+            snapshot: Optional[str] = None,
+            snapshot_interval: float = 30.0,
+            port_tries: int = 1
+            ):
+        self.crawler = crawler
+        self.metrics = crawler_metrics(crawler)
+        self.host = host
+        self.port = port
+        self.port_tries = port_tries
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path: Optional[Path] = None
+        self.loop: Optional[task.LoopingCall] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('METRICS')
+        if not config.get('ENABLED', False):
+            raise NotConfigured
+        port = config.get('PORT')
+        extension = cls(
+            crawler,
+            host=config.get('HOST', '127.0.0.1'),
+            port=int(port) if port is not None else None,
+            snapshot=config.get('SNAPSHOT'),
+            snapshot_interval=float(config.get('SNAPSHOT_INTERVAL', 30)),
+            port_tries=int(config.get('PORT_TRIES', 10))
+        )
+        crawler.signals.connect(
+            extension.spider_opened,
+            signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed,
+            signal=signals.spider_closed
+        )
+        crawler.signals.connect(
+            extension.response_received,
+            signal=signals.response_received
+        )
+        crawler.signals.connect(
+            extension.item_dropped,
+            signal=signals.item_dropped
+        )
+        return extension
+
+    def spider_opened(self, spider):
+        if self.port is not None:
+            MetricsServer.acquire(self.host, self.port, self.port_tries)
+        if self.snapshot:
+            self.snapshot_path = Path(self.snapshot.format(spider=spider.name))
+            self.loop = task.LoopingCall(self.write_snapshot)
+            self.loop.start(self.snapshot_interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        if self.snapshot_path is not None:
+            self.write_snapshot()
+        if self.port is not None:
+            MetricsServer.release()
+
+    def response_received(self, response, request, spider):
+        self.metrics.observe_download(
+            urlparse_cached(request).hostname or '',
+            response.status,
+            request.meta.get('download_latency')
+        )
+
+    def item_dropped(self, item, response, exception, spider):
+        self.metrics.observe_drop(str(exception) or type(exception).__name__)
+
+    def write_snapshot(self) -> None:
+        """Атомарная запись JSON-сводки."""
+        path = self.snapshot_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metrics.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
@@ -1,3 +1,25 @@
+import logging
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.misc import load_object
+from twisted.internet.task import deferLater
+
+from .frontier import FrontierScheduler, frontier_store
+from .metrics import crawler_metrics
+from .profiling import crawler_profiler, profiling_configured
+from .pagestore import (BodyFingerprint, PageStore, StoredPage, dump_output,
+                        load_outputs)
+from .replay.server import replay_path
+
+logger = logging.getLogger(__name__)
+
+
 class ErrorHandlerMiddleware:
     """Middleware для обработки и логирования ошибок"""
 
@@ -33,3 +55,657 @@ class ErrorHandlerMiddleware:
             f'headers={request.headers}, meta={request.meta}'
         )
         return None
+
+
+class TokenBucket:
+    """Корзина токенов: rate запросов в секунду с запасом burst."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError('rate должен быть больше нуля')
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Резервирует токен и возвращает задержку в секундах,
+        через которую запрос можно отправлять.
+
+        Токены могут уходить в минус: это очередь уже выданных
+        резервов, поэтому каждый следующий запрос ждет дольше
+        предыдущего.
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class EndpointRateLimitMiddleware:
+    """
+    Ограничение частоты запросов к отдельным эндпоинтам.
+
+    Настраивается через RATE_LIMITS: ключ - подстрока URL, значение -
+    словарь с RATE (запросов в секунду) и BURST. Темп задается до
+    загрузчика: запрос из вывода callback'а, для которого нет
+    свободного токена, уходит в планировщик только в свою очередь, а
+    товары и запросы к другим эндпоинтам проходят сразу. Ожидающие
+    запросы не занимают слоты загрузчика, и остальные эндпоинты
+    загружаются полной параллельностью. Пока запросы ждут, породивший
+    их ответ считается необработанным: паук не закрывается раньше
+    времени, а FrontierScheduler не подтверждает ответ, пока его
+    запросы не попали в очередь. Стартовые запросы паука не
+    ограничиваются.
+
+    Стоит ближе всех к движку, чтобы запросы, отброшенные другими
+    middleware, не занимали токены.
+    """
+
+    def __init__(self, crawler, limits: Dict[str, Dict[str, float]]):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.buckets: List[Tuple[str, TokenBucket]] = [
+            (
+                pattern,
+                TokenBucket(
+                    rate=config['RATE'],
+                    burst=config.get('BURST', 1)
+                )
+            )
+            for pattern, config in limits.items()
+        ]
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        limits = crawler.settings.getdict('RATE_LIMITS')
+        if not limits:
+            raise NotConfigured
+        middleware = cls(crawler, limits)
+        crawler.signals.connect(
+            middleware.spider_opened,
+            signal=signals.spider_opened
+        )
+        return middleware
+
+    def spider_opened(self, spider):
+        for pattern, bucket in self.buckets:
+            spider.logger.info(
+                f'Лимит запросов для {pattern}: {bucket.rate}/с, '
+                f'запас {bucket.capacity:g}'
+            )
+
+    def _match(self, url: str) -> Optional[Tuple[str, TokenBucket]]:
+        """Поиск первой подходящей корзины по URL."""
+        for pattern, bucket in self.buckets:
+            if pattern in url:
+                return pattern, bucket
+        return None
+
+    async def process_spider_output(self, response, result, spider):
+        """Отдает запросы к ограниченным эндпоинтам в их очередь."""
+        from twisted.internet import reactor
+        limited = []
+        async for output in result:
+            matched = (
+                self._match(output.url) if isinstance(output, Request)
+                else None
+            )
+            if matched is None:
+                yield output
+            else:
+                limited.append((output, *matched))
+
+        for request, pattern, bucket in limited:
+            delay = bucket.reserve()
+            if delay > 0:
+                self.stats.inc_value(
+                    f'ratelimit/{pattern}/delayed', spider=spider
+                )
+                self.stats.inc_value(
+                    f'ratelimit/{pattern}/delay_ms',
+                    int(delay * 1000),
+                    spider=spider
+                )
+                await maybe_deferred_to_future(
+                    deferLater(reactor, delay, lambda: None)
+                )
+            yield request
+
+
+class ReplayMiddleware:
+    """
+    Перенаправление запросов на локальный сервер записанных ответов.
+
+    Перед загрузкой URL https://host/path?query заменяется на
+    REPLAY_SERVER/host/path?query, а после загрузки исходный адрес
+    возвращается запросу и ответу. Пауки, фильтр доменов и остальные
+    middleware видят настоящие URL. Настройка REPLAY_SERVER, например
+    http://127.0.0.1:8800 (см. python -m competitors_parser.replay).
+    """
+
+    def __init__(self, crawler, server: str):
+        self.stats = crawler.stats
+        self.server = server.rstrip('/')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        server = crawler.settings.get('REPLAY_SERVER')
+        if not server:
+            raise NotConfigured
+        middleware = cls(crawler, server)
+        if crawler.settings.getbool('HTTPCACHE_ENABLED'):
+            logger.warning(
+                'Включен HTTPCACHE: ответы из кеша не доходят до сервера '
+                'записанных ответов, используйте -s HTTPCACHE_ENABLED=False'
+            )
+        logger.info(f'Запросы перенаправляются на {middleware.server}')
+        return middleware
+
+    def process_request(self, request, spider):
+        if 'replay_original_url' in request.meta:
+            return None
+        request.meta['replay_original_url'] = request.url
+        # Слот загрузчика - исходный хост, а не адрес сервера, чтобы
+        # задержки и параллельность считались по хостам, как без него
+        request.meta.setdefault('download_slot', urlparse_cached(request).hostname)
+        request._set_url(f'{self.server}{replay_path(request.url)}')
+        self.stats.inc_value('replay/requests', spider=spider)
+        return None
+
+    def process_response(self, request, response, spider):
+        original_url = self._restore(request)
+        if original_url is None:
+            return response
+        return response.replace(url=original_url)
+
+    def process_exception(self, request, exception, spider):
+        self._restore(request)
+        return None
+
+    def _restore(self, request) -> Optional[str]:
+        """Возвращает запросу исходный URL."""
+        original_url = request.meta.pop('replay_original_url', None)
+        if original_url is not None:
+            request._set_url(original_url)
+        return original_url
+
+
+class ConditionalRequestMiddleware:
+    """
+    Условные запросы для страниц, разобранных в прошлых запусках.
+
+    Если для URL в PageStore есть ETag или Last-Modified, запрос уходит
+    с If-None-Match/If-Modified-Since, а 304 пропускается до паука
+    (handle_httpstatus_list). Товары по 304 отдает PageReplayMiddleware
+    из сохраненного результата, без загрузки и разбора страницы.
+    Включается настройкой CONDITIONAL_REQUESTS_ENABLED, страницы
+    выбираются по callback'ам из PAGE_STORE['CALLBACKS'].
+    """
+
+    def __init__(self, crawler, store: PageStore):
+        self.stats = crawler.stats
+        self.store = store
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('CONDITIONAL_REQUESTS_ENABLED'):
+            raise NotConfigured
+        return cls(crawler, PageStore.from_crawler(crawler))
+
+    def process_request(self, request, spider):
+        if 'conditional' in request.meta or not self.store.tracks(request):
+            return None
+        page = self.store.get(request.url)
+        if page is None or not (page.etag or page.last_modified):
+            return None
+
+        if page.etag:
+            request.headers['If-None-Match'] = page.etag
+        if page.last_modified:
+            request.headers['If-Modified-Since'] = page.last_modified
+        request.meta['conditional'] = True
+        request.meta['handle_httpstatus_list'] = [
+            *request.meta.get('handle_httpstatus_list', []), 304
+        ]
+        self.stats.inc_value('conditional/requests', spider=spider)
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get('conditional') or 'cached' in response.flags:
+            return response
+        if response.status == 304:
+            self.stats.inc_value('conditional/not_modified', spider=spider)
+        else:
+            self.stats.inc_value('conditional/modified', spider=spider)
+        return response
+
+
+class PageReplayMiddleware:
+    """
+    Сохранение и повтор результатов разбора страниц.
+
+    Стоит ближе всех к пауку (после MetricsMiddleware и
+    ProfilingMiddleware, которые выход паука не меняют) и записывает
+    в PageStore все, что отдал
+    callback из PAGE_STORE['CALLBACKS'], вместе с валидаторами ответа
+    и хешем тела. Страница считается неизмененной, если на условный
+    запрос пришел 304 (CONDITIONAL_REQUESTS_ENABLED) или хеш тела без
+    изменчивых фрагментов совпал с прошлым (BODY_FINGERPRINT_ENABLED,
+    фрагменты задаются в BODY_FINGERPRINT_IGNORE). Тогда вместо
+    callback'а отдается сохраненный результат: генератор callback'а
+    не запускается, поэтому разбора страницы не происходит. Если на 304
+    сохраненного результата нет или он не читается, страница
+    запрашивается заново без условных заголовков.
+    """
+
+    def __init__(
+            self,
+            crawler,
+            store: PageStore,
+            fingerprint: Optional[BodyFingerprint] = None
+            ):
+        self.stats = crawler.stats
+        self.store = store
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        fingerprint = None
+        if settings.getbool('BODY_FINGERPRINT_ENABLED'):
+            fingerprint = BodyFingerprint(
+                settings.getlist('BODY_FINGERPRINT_IGNORE')
+            )
+        if fingerprint is None and not settings.getbool(
+                'CONDITIONAL_REQUESTS_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler, PageStore.from_crawler(crawler), fingerprint)
+        if fingerprint is not None:
+            crawler.signals.connect(
+                middleware.spider_closed,
+                signal=signals.spider_closed
+            )
+        return middleware
+
+    def spider_closed(self, spider):
+        hits = self.stats.get_value('body_fingerprint/hit', 0, spider=spider)
+        misses = self.stats.get_value('body_fingerprint/miss', 0, spider=spider)
+        if hits or misses:
+            self.stats.set_value(
+                'body_fingerprint/hit_ratio',
+                round(hits / (hits + misses), 3),
+                spider=spider
+            )
+
+    def process_spider_output(self, response, result, spider):
+        if not self.store.tracks(response.request):
+            yield from result
+            return
+        body_hash = self._body_hash(response)
+        stored = self._stored_outputs(response, body_hash, spider)
+        if stored is not None:
+            yield from stored
+            return
+
+        outputs = []
+        for output in result:
+            outputs.append(dump_output(output, spider))
+            yield output
+        self._save(response, outputs, body_hash)
+
+    async def process_spider_output_async(self, response, result, spider):
+        if not self.store.tracks(response.request):
+            async for output in result:
+                yield output
+            return
+        body_hash = self._body_hash(response)
+        stored = self._stored_outputs(response, body_hash, spider)
+        if stored is not None:
+            for output in stored:
+                yield output
+            return
+
+        outputs = []
+        async for output in result:
+            outputs.append(dump_output(output, spider))
+            yield output
+        self._save(response, outputs, body_hash)
+
+    def _body_hash(self, response) -> Optional[str]:
+        if self.fingerprint is None or response.status != 200:
+            return None
+        return self.fingerprint.hash(response.body)
+
+    def _stored_outputs(
+            self,
+            response,
+            body_hash: Optional[str],
+            spider
+            ) -> Optional[List]:
+        """Сохраненный результат, если страница не изменилась, иначе None."""
+        request = response.request
+        if response.status == 304 and request.meta.get('conditional', False):
+            page = self.store.get(request.url)
+            outputs = self._replay(page, spider) if page is not None else None
+            if outputs is None:
+                # Тела нет, разбирать нечего: страница загружается заново
+                spider.logger.warning(
+                    f'Нет сохраненного результата для {request.url}, '
+                    f'повторный запрос без условий'
+                    )
+                self.stats.inc_value('page_store/missing', spider=spider)
+                return [self._unconditional(request)]
+            return outputs
+
+        if body_hash is None:
+            return None
+        page = self.store.get(request.url)
+        if page is None or page.body_hash != body_hash:
+            self.stats.inc_value('body_fingerprint/miss', spider=spider)
+            return None
+        outputs = self._replay(page, spider)
+        if outputs is None:
+            self.stats.inc_value('body_fingerprint/miss', spider=spider)
+            return None
+        self.stats.inc_value('body_fingerprint/hit', spider=spider)
+        return outputs
+
+    def _replay(self, page: StoredPage, spider) -> Optional[List]:
+        """Товары и запросы из сохраненной страницы, None если не читается."""
+        try:
+            outputs = load_outputs(page.outputs, spider)
+        except Exception as e:
+            spider.logger.warning(
+                f'Не удалось прочитать сохраненный результат {page.url}: '
+                f'{str(e)}'
+                )
+            self.stats.inc_value('page_store/unreadable', spider=spider)
+            return None
+        self.store.touch(page.url)
+        self.stats.inc_value('page_store/replayed_pages', spider=spider)
+        self.stats.inc_value(
+            'page_store/replayed_outputs', len(outputs), spider=spider
+        )
+        return outputs
+
+    @staticmethod
+    def _unconditional(request) -> Request:
+        """Тот же запрос без If-None-Match/If-Modified-Since."""
+        headers = request.headers.copy()
+        headers.pop('If-None-Match', None)
+        headers.pop('If-Modified-Since', None)
+        meta = dict(request.meta)
+        # ConditionalRequestMiddleware пропускает запросы с этим ключом
+        meta['conditional'] = False
+        statuses = [
+            status for status in meta.pop('handle_httpstatus_list', [])
+            if status != 304
+        ]
+        if statuses:
+            meta['handle_httpstatus_list'] = statuses
+        return request.replace(headers=headers, meta=meta, dont_filter=True)
+
+    def _save(
+            self,
+            response,
+            outputs: List,
+            body_hash: Optional[str] = None
+            ) -> None:
+        if response.status != 200:
+            return
+        self.store.save(
+            response.request.url,
+            outputs,
+            etag=self._header(response, b'ETag'),
+            last_modified=self._header(response, b'Last-Modified'),
+            body_hash=body_hash
+        )
+
+    @staticmethod
+    def _header(response, name: bytes) -> Optional[str]:
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+
+class ShardMiddleware:
+    """
+    Обход только своей доли категорий в шардированном режиме.
+
+    Запросы, которые отдает callback первого шага обхода (атрибут паука
+    shard_callback, по умолчанию parse - там собирается список
+    категорий), делятся между процессами по crc32(URL) % COUNT: процесс
+    INDEX оставляет только свои. Остальной выход паука проходит без
+    изменений. Настройка SHARD, ее задает run-parser --shards.
+    """
+
+    def __init__(self, crawler, index: int, count: int):
+        self.stats = crawler.stats
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('SHARD')
+        count = int(config.get('COUNT', 1))
+        if count <= 1:
+            raise NotConfigured
+        index = int(config.get('INDEX', 0))
+        if not 0 <= index < count:
+            raise NotConfigured(f'Неверный номер шарда {index} из {count}')
+        return cls(crawler, index, count)
+
+    def shard_of(self, url: str) -> int:
+        return zlib.crc32(url.encode('utf-8')) % self.count
+
+    def process_spider_output(self, response, result, spider):
+        if not self._is_first_step(response, spider):
+            yield from result
+            return
+        for output in result:
+            if self._keep(output, spider):
+                yield output
+
+    async def process_spider_output_async(self, response, result, spider):
+        if not self._is_first_step(response, spider):
+            async for output in result:
+                yield output
+            return
+        async for output in result:
+            if self._keep(output, spider):
+                yield output
+
+    def _is_first_step(self, response, spider) -> bool:
+        callback = response.request.callback or spider.parse
+        return getattr(callback, '__name__', None) == getattr(
+            spider, 'shard_callback', 'parse'
+        )
+
+    def _keep(self, output, spider) -> bool:
+        if not isinstance(output, Request):
+            return True
+        if self.shard_of(output.url) == self.index:
+            self.stats.inc_value('shard/kept', spider=spider)
+            return True
+        self.stats.inc_value('shard/skipped', spider=spider)
+        return False
+
+
+class FrontierSeedMiddleware:
+    """
+    Стартовые запросы общего фронтира отдает только один воркер.
+
+    Первый воркер обхода (FrontierStore.claim_seed) пропускает
+    стартовые запросы паука, остальные начинают сразу с общей очереди.
+    Работает, только если SCHEDULER - FrontierScheduler.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.store = frontier_store(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler_cls = load_object(crawler.settings['SCHEDULER'])
+        # issubclass не подходит: метакласс BaseScheduler считает
+        # подклассом любой планировщик с нужными методами
+        if FrontierScheduler not in scheduler_cls.__mro__:
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_start_requests(self, start_requests, spider):
+        self.store.open(spider.name)
+        if not self.store.claim_seed():
+            spider.logger.info(
+                'Обход уже начат другим воркером, стартовые запросы пропущены'
+                )
+            return
+        yield from start_requests
+
+
+class MetricsMiddleware:
+    """
+    Замер callback'ов паука для расширения Metrics.
+
+    Стоит ближе всех к пауку. Время callback'а - это время, за которое
+    генератор callback'а отдает все свои результаты; товары и запросы
+    считаются по выходу, объем ответа - по response.body. Если
+    PageReplayMiddleware отдает сохраненный результат, callback не
+    вызывается и не учитывается. Настройка METRICS.
+    """
+
+    def __init__(self, crawler):
+        self.metrics = crawler_metrics(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getdict('METRICS').get('ENABLED', False):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_spider_output(self, response, result, spider):
+        callback = self._callback_name(response, spider)
+        iterator = iter(result)
+        elapsed = 0.0
+        items = requests = 0
+        failed = False
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                if isinstance(output, Request):
+                    requests += 1
+                else:
+                    items += 1
+                yield output
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.observe_callback(
+                callback, elapsed, items, requests, len(response.body), failed
+            )
+
+    async def process_spider_output_async(self, response, result, spider):
+        callback = self._callback_name(response, spider)
+        iterator = result.__aiter__()
+        elapsed = 0.0
+        items = requests = 0
+        failed = False
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    output = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                if isinstance(output, Request):
+                    requests += 1
+                else:
+                    items += 1
+                yield output
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.metrics.observe_callback(
+                callback, elapsed, items, requests, len(response.body), failed
+            )
+
+    @staticmethod
+    def _callback_name(response, spider) -> str:
+        callback = response.request.callback or spider.parse
+        return getattr(callback, '__name__', 'parse')
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование callback'ов паука для расширения Profiling.
+
+    Стоит перед MetricsMiddleware, чтобы профилирование не попадало
+    в ее замеры. Пока профилирование выключено, результат callback'а
+    возвращается как есть. Во включенном состоянии каждый шаг генератора callback'а
+    выполняется как участок с меткой-именем callback'а; у async
+    callback'ов ожидание сети в профиль не входит. Настройка PROFILING.
+    """
+
+    def __init__(self, crawler):
+        self.profiler = crawler_profiler(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not profiling_configured(crawler.settings):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_spider_output(self, response, result, spider):
+        if not self.profiler.active:
+            return result
+        return self._profiled(self._label(response, spider), result)
+
+    async def process_spider_output_async(self, response, result, spider):
+        if not self.profiler.active:
+            async for output in result:
+                yield output
+            return
+        label = self._label(response, spider)
+        iterator = result.__aiter__()
+        while True:
+            try:
+                output = await self.profiler.call_async(
+                    label, iterator.__anext__()
+                )
+            except StopAsyncIteration:
+                return
+            yield output
+
+    def _profiled(self, label: str, result):
+        iterator = iter(result)
+        while True:
+            try:
+                output = self.profiler.call(label, next, iterator)
+            except StopIteration:
+                return
+            yield output
+
+    @staticmethod
+    def _label(response, spider) -> str:
+        callback = response.request.callback or spider.parse
+        return getattr(callback, '__name__', 'parse')
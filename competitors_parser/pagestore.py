@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import pickle
+import re
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from scrapy import Request, signals
+from scrapy.utils.request import request_from_dict
+
+from .items import ProductItem
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    spider TEXT NOT NULL,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT,
+    outputs BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (spider, url)
+) WITHOUT ROWID;
+'''
+
+TOUCH_PAGE = '''
+UPDATE pages SET stored_at = ? WHERE spider = ? AND url = ?
+'''
+
+PRUNE_PAGES = '''
+DELETE FROM pages WHERE spider = ? AND stored_at < ?
+'''
+
+UPSERT_PAGE = '''
+INSERT INTO pages (
+    spider, url, etag, last_modified, body_hash, outputs, stored_at
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (spider, url) DO UPDATE SET
+    etag = excluded.etag,
+    last_modified = excluded.last_modified,
+    body_hash = excluded.body_hash,
+    outputs = excluded.outputs,
+    stored_at = excluded.stored_at
+'''
+
+_stores: 'WeakKeyDictionary[Any, PageStore]' = WeakKeyDictionary()
+
+
+class StoredPage(NamedTuple):
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body_hash: Optional[str]
+    outputs: bytes
+
+
+class PageStore:
+    """
+    Результаты разбора страниц прошлых запусков по URL.
+
+    Для страницы хранятся валидаторы (ETag, Last-Modified), хеш тела и
+    все, что отдал callback: товары и последующие запросы (через
+    request_to_dict, callback сохраняется по имени). Если страница не
+    изменилась, middleware отдают сохраненный результат вместо разбора.
+    Один экземпляр на краулер (PageStore.from_crawler), база
+    открывается при старте паука, записи пишутся пакетами.
+    Повтор результата обновляет время записи страницы. После
+    завершенного обхода удаляются страницы, которые не обновлялись
+    дольше MAX_AGE_DAYS: так файл не растет из-за исчезнувших с сайта
+    страниц. Настройка PAGE_STORE.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            callbacks: Iterable[str] = ('parse_product',),
+            batch_size: int = 200,
+            max_age_days: Optional[float] = 30
+            ):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = Path(path)
+        self.callbacks = frozenset(callbacks)
+        self.batch_size = max(int(batch_size), 1)
+        self.max_age_days = max_age_days
+        self.conn: Optional[sqlite3.Connection] = None
+        self.spider_name: Optional[str] = None
+        self.buffer: List[Tuple] = []
+        self.touched: List[Tuple] = []
+
+    @classmethod
+    def from_crawler(cls, crawler) -> 'PageStore':
+        """Общий экземпляр для всех middleware краулера."""
+        store = _stores.get(crawler)
+        if store is None:
+            config = crawler.settings.getdict('PAGE_STORE')
+            store = cls(
+                path=config.get('PATH', 'data/pages.sqlite3'),
+                callbacks=config.get('CALLBACKS', ['parse_product']),
+                batch_size=config.get('BATCH_SIZE', 200),
+                max_age_days=config.get('MAX_AGE_DAYS', 30)
+            )
+            crawler.signals.connect(
+                store.spider_opened,
+                signal=signals.spider_opened
+            )
+            crawler.signals.connect(
+                store.spider_closed,
+                signal=signals.spider_closed
+            )
+            _stores[crawler] = store
+        return store
+
+    def spider_opened(self, spider):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.spider_name = spider.name
+        self.logger.info(f'Хранилище страниц: {self.path} ({spider.name})')
+
+    def spider_closed(self, spider, reason: str):
+        if self.conn is None:
+            return
+        self.flush()
+        if reason == 'finished' and self.max_age_days:
+            self.prune(time.time() - self.max_age_days * 86400)
+        self.conn.close()
+        self.conn = None
+
+    def prune(self, before: float) -> int:
+        """Удаление страниц паука, записанных раньше before."""
+        with self.conn:
+            deleted = self.conn.execute(
+                PRUNE_PAGES, (self.spider_name, before)
+            ).rowcount
+        if deleted:
+            self.logger.info(
+                f'Из хранилища страниц удалено устаревших: {deleted}'
+                )
+        return deleted
+
+    def tracks(self, request) -> bool:
+        """Сохраняются ли результаты разбора для этого запроса."""
+        callback = request.callback
+        return (
+            self.conn is not None
+            and callback is not None
+            and getattr(callback, '__name__', None) in self.callbacks
+        )
+
+    def get(self, url: str) -> Optional[StoredPage]:
+        if self.conn is None:
+            return None
+        row = self.conn.execute(
+            'SELECT url, etag, last_modified, body_hash, outputs FROM pages '
+            'WHERE spider = ? AND url = ?',
+            (self.spider_name, url)
+        ).fetchone()
+        return StoredPage(*row) if row is not None else None
+
+    def save(
+            self,
+            url: str,
+            outputs: List[Tuple[str, Any]],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None,
+            body_hash: Optional[str] = None
+            ) -> None:
+        """Добавление результата разбора страницы в пакет для записи."""
+        self.buffer.append((
+            self.spider_name, url, etag, last_modified, body_hash,
+            zlib.compress(pickle.dumps(outputs, pickle.HIGHEST_PROTOCOL)),
+            time.time(),
+        ))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def touch(self, url: str) -> None:
+        """Отметка, что страница еще есть на сайте (результат повторен)."""
+        self.touched.append((time.time(), self.spider_name, url))
+        if len(self.touched) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not (self.buffer or self.touched) or self.conn is None:
+            return
+        with self.conn:
+            self.conn.executemany(TOUCH_PAGE, self.touched)
+            self.conn.executemany(UPSERT_PAGE, self.buffer)
+        self.buffer = []
+        self.touched = []
+
+
+class BodyFingerprint:
+    """
+    Хеш тела ответа без изменчивых фрагментов.
+
+    Фрагменты, которые меняются при каждой загрузке (CSRF-токены,
+    идентификаторы сессий, метки времени), вырезаются одним регулярным
+    выражением из ignore, пробельные символы схлопываются. Одинаковый
+    хеш означает, что разбор страницы даст тот же результат.
+    """
+
+    WHITESPACE_RE = re.compile(rb'\s+')
+
+    def __init__(self, ignore: Iterable[str] = ()):
+        patterns = [pattern.encode('utf-8') for pattern in ignore]
+        self._ignore = (
+            re.compile(b'|'.join(b'(?:%s)' % p for p in patterns), re.I)
+            if patterns else None
+        )
+
+    def normalize(self, body: bytes) -> bytes:
+        if self._ignore is not None:
+            body = self._ignore.sub(b'', body)
+        return self.WHITESPACE_RE.sub(b' ', body).strip()
+
+    def hash(self, body: bytes) -> str:
+        return hashlib.blake2b(
+            self.normalize(body), digest_size=16
+        ).hexdigest()
+
+
+def dump_output(output, spider) -> Tuple[str, Any]:
+    """Снимок результата callback'а для сохранения."""
+    if isinstance(output, Request):
+        return 'request', output.to_dict(spider=spider)
+    if isinstance(output, ProductItem):
+        return 'product', output.to_dict()
+    return 'dict', dict(output)
+
+
+def load_outputs(outputs: bytes, spider) -> List[Any]:
+    """Восстановление товаров и запросов из сохраненного результата."""
+    result = []
+    for kind, data in pickle.loads(zlib.decompress(outputs)):
+        if kind == 'request':
+            result.append(request_from_dict(data, spider=spider))
+        elif kind == 'product':
+            result.append(ProductItem.from_dict(data))
+        else:
+            result.append(data)
+    return result
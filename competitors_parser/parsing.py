@@ -0,0 +1,289 @@
+"""
+Быстрый разбор цен, остатков и характеристик из текста страниц.
+
+Шаблоны компилируются один раз при импорте, ключевые слова цены по
+запросу ищутся одним проходом по тексту, а результаты для повторяющихся
+строк ("По запросу", "1 200 руб.") берутся из LRU-кеша.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Ключевые слова для цен по запросу
+PRICE_REQUEST_KEYWORDS = (
+    'по запросу', 'по заказу', 'звоните', 'уточняйте',
+    'договорная', 'нет в наличии', 'недоступно'
+)
+
+# Обозначения рубля на сайтах конкурентов
+RUB_ALIASES = frozenset(('р.', 'р', 'руб.', 'руб', '₽', 'rub', 'rur'))
+
+CACHE_SIZE = 4096
+
+# Пробелы, которыми сайты разделяют разряды
+_SPACES = '\xa0\u202f\u2009'
+_SPACES_TABLE = str.maketrans({char: ' ' for char in _SPACES})
+
+# Число с разрядами через пробел или апостроф ("1 234,50", "12'500"),
+# либо обычное число, возможно с точками и запятыми ("1.234,50", "99.9")
+_NUMBER_RE = re.compile(
+    r"\d{1,3}(?:[ '’]\d{3})+(?:[.,]\d+)?"
+    r'|\d+(?:[.,]\d+)*'
+)
+_GROUP_SEPARATORS_RE = re.compile(r"[ '’]")
+_CURRENCY_RE = re.compile(r'\s*([^\s\d/]+)')
+_UNIT_RE = re.compile(r'\s*([^\W\d_]+)')
+
+
+class KeywordMatcher:
+    """
+    Поиск любого из ключевых слов за один проход по тексту.
+
+    Ключевые слова собираются в одно регулярное выражение, поиск
+    выполняется без учета регистра. Результаты кешируются.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keywords)
+        # Длинные слова первыми, чтобы совпадение было максимальным
+        alternatives = sorted(self.keywords, key=len, reverse=True)
+        self._pattern = re.compile(
+            '|'.join(re.escape(keyword) for keyword in alternatives),
+            re.IGNORECASE
+        )
+        self.search = lru_cache(maxsize=CACHE_SIZE)(self.find)
+
+    def find(self, text: str) -> Optional[str]:
+        """Первое найденное ключевое слово или None, без кеша."""
+        match = self._pattern.search(text)
+        return match.group(0).lower() if match else None
+
+
+_price_request_matcher = KeywordMatcher(PRICE_REQUEST_KEYWORDS)
+
+
+def price_on_request(text: Optional[str]) -> Optional[str]:
+    """Ключевое слово цены по запросу, если оно есть в тексте."""
+    if not text:
+        return None
+    return _price_request_matcher.search(text)
+
+
+def _to_number(raw: str) -> float:
+    """Преобразование найденного числа с учетом разделителей."""
+    raw = _GROUP_SEPARATORS_RE.sub('', raw)
+    has_comma = ',' in raw
+    has_dot = '.' in raw
+
+    if has_comma and has_dot:
+        # Десятичный разделитель - последний из встретившихся
+        if raw.rfind(',') > raw.rfind('.'):
+            raw = raw.replace('.', '').replace(',', '.')
+        else:
+            raw = raw.replace(',', '')
+    elif has_comma or has_dot:
+        separator = ',' if has_comma else '.'
+        if raw.count(separator) > 1:
+            # Несколько одинаковых разделителей - это разряды
+            raw = raw.replace(separator, '')
+        else:
+            raw = raw.replace(',', '.')
+
+    return float(raw)
+
+
+def _find_number(text: str) -> Optional[re.Match]:
+    return _NUMBER_RE.search(text.translate(_SPACES_TABLE))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_price(text: str) -> float:
+    if _price_request_matcher.search(text):
+        return 0.0
+    match = _find_number(text)
+    if not match:
+        return 0.0
+    try:
+        return _to_number(match.group(0))
+    except ValueError:
+        return 0.0
+
+
+def parse_price(text: Optional[str]) -> float:
+    """
+    Извлечение цены из текста.
+
+    Берется первое число в тексте, разделители разрядов (пробел,
+    неразрывный пробел, апостроф, повторяющиеся точки или запятые)
+    отбрасываются. Для цены по запросу и текста без числа - 0.0.
+    """
+    if not text:
+        return 0.0
+    return _parse_price(text)
+
+
+def parse_prices(texts: Iterable[Optional[str]]) -> List[float]:
+    """Разбор списка цен, одинаковые строки разбираются один раз."""
+    texts = list(texts)
+    unique: Dict[Optional[str], float] = dict.fromkeys(texts)
+    for text in unique:
+        unique[text] = parse_price(text)
+    return [unique[text] for text in texts]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_quantity(text: str) -> int:
+    match = _find_number(text)
+    if not match:
+        return 0
+    try:
+        return int(_to_number(match.group(0)))
+    except ValueError:
+        return 0
+
+
+def parse_quantity(text: Optional[str]) -> int:
+    """Извлечение количества товара: первое число в тексте, иначе 0."""
+    if not text:
+        return 0
+    return _parse_quantity(text)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_price_and_currency(text: str) -> Tuple[float, str]:
+    if _price_request_matcher.search(text):
+        return 0.0, 'RUB'
+    normalized = text.translate(_SPACES_TABLE)
+    match = _NUMBER_RE.search(normalized)
+    if not match:
+        return 0.0, 'RUB'
+
+    currency = 'RUB'
+    currency_match = _CURRENCY_RE.match(normalized, match.end())
+    if currency_match:
+        token = currency_match.group(1)
+        if token.lower() not in RUB_ALIASES:
+            currency = token
+
+    try:
+        return _to_number(match.group(0)), currency
+    except ValueError:
+        return 0.0, currency
+
+
+def parse_price_and_currency(text: Optional[str]) -> Tuple[float, str]:
+    """
+    Извлечение цены и валюты из текста вида "1 234,50 руб.".
+
+    Обозначения рубля приводятся к RUB, валюта по умолчанию - RUB.
+    """
+    if not text:
+        return 0.0, 'RUB'
+    return _parse_price_and_currency(text)
+
+
+# Единицы измерения характеристик и множители к килограммам и метрам
+WEIGHT_UNITS = {'мг': 0.000001, 'г': 0.001, 'гр': 0.001, 'кг': 1.0, 'т': 1000.0}
+LENGTH_UNITS = {'мм': 0.001, 'см': 0.01, 'дм': 0.1, 'м': 1.0, 'км': 1000.0}
+MEASURE_UNITS = {
+    'weight': WEIGHT_UNITS,
+    'length': LENGTH_UNITS,
+    'width': LENGTH_UNITS,
+    'height': LENGTH_UNITS,
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_measure(text: str, field: str) -> Optional[float]:
+    normalized = text.translate(_SPACES_TABLE)
+    match = _NUMBER_RE.search(normalized)
+    if not match:
+        return None
+    try:
+        value = _to_number(match.group(0))
+    except ValueError:
+        return None
+    unit_match = _UNIT_RE.match(normalized, match.end())
+    if not unit_match:
+        return value
+    factor = MEASURE_UNITS[field].get(unit_match.group(1).lower())
+    return value * factor if factor is not None else None
+
+
+def parse_measure(text: Optional[str], field: str) -> Optional[float]:
+    """
+    Значение характеристики weight/length/width/height числом.
+
+    Вес приводится к килограммам, размеры к метрам: "1,2 кг" - 1.2,
+    "10 см" - 0.1. Число без единицы берется как есть, для текста
+    без числа или с неизвестной единицей - None.
+    """
+    if not text:
+        return None
+    return _parse_measure(text, field)
+
+
+# Названия характеристик товара и поля ProductItem для них
+CHARACTERISTIC_FIELDS = {
+    'вес': 'weight',
+    'длина': 'length',
+    'ширина': 'width',
+    'высота': 'height',
+}
+
+_characteristic_matcher = KeywordMatcher(CHARACTERISTIC_FIELDS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _characteristic_field(name: str, exact: bool) -> Optional[str]:
+    if exact:
+        return CHARACTERISTIC_FIELDS.get(' '.join(name.split()).lower())
+    keyword = _characteristic_matcher.find(name)
+    return CHARACTERISTIC_FIELDS[keyword] if keyword else None
+
+
+def characteristic_field(
+        name: Optional[str],
+        exact: bool = False
+        ) -> Optional[str]:
+    """
+    Поле ProductItem для названия характеристики или None.
+
+    По умолчанию название ищется по вхождению без учета регистра:
+    "Ширина рулона" и "Вес, кг" дают width и weight. При exact=True
+    название после схлопывания пробелов и приведения к нижнему
+    регистру должно совпасть целиком: "Вес упаковки" не дает weight.
+    """
+    if not name:
+        return None
+    return _characteristic_field(name, exact)
+
+
+def parse_characteristics(
+        pairs: Iterable[Tuple[Optional[str], Any]],
+        exact: bool = False,
+        last: bool = False
+        ) -> Dict[str, str]:
+    """
+    Характеристики из пар (название, значение) за один проход.
+
+    Возвращает словарь с ключами weight, length, width, height для
+    найденных характеристик. Пробелы в значениях схлопываются, пустые
+    значения пропускаются. Названия сопоставляются как в
+    characteristic_field. Из повторов берется первый, при last=True -
+    последний.
+    """
+    result: Dict[str, str] = {}
+    for name, value in pairs:
+        if not name or value is None:
+            continue
+        field = characteristic_field(name, exact)
+        if field is None or (field in result and not last):
+            continue
+        value = ' '.join(str(value).split())
+        if value:
+            result[field] = value
+            if not last and len(result) == len(CHARACTERISTIC_FIELDS):
+                break
+    return result
@@ -1,3 +1,4 @@
+from .history import PriceHistoryPipeline
 from .validation import ValidationPipeline
 
-__all__ = ['ValidationPipeline']
+__all__ = ['PriceHistoryPipeline', 'ValidationPipeline']
@@ -0,0 +1,278 @@
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, Optional
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from ..items import ProductItem
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    spider TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    reason TEXT,
+    items INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    spider TEXT NOT NULL,
+    product_code TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    category TEXT,
+    unit TEXT,
+    currency TEXT,
+    url TEXT,
+    weight TEXT,
+    length TEXT,
+    width TEXT,
+    height TEXT,
+    first_run_id INTEGER NOT NULL,
+    last_run_id INTEGER NOT NULL,
+    PRIMARY KEY (spider, product_code, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS stocks (
+    spider TEXT NOT NULL,
+    product_code TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL,
+    stock TEXT,
+    quantity INTEGER,
+    price REAL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (spider, product_code, name, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    spider TEXT NOT NULL,
+    product_code TEXT NOT NULL,
+    name TEXT,
+    stock TEXT,
+    quantity INTEGER,
+    price REAL,
+    observed_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_code
+    ON products (product_code);
+CREATE INDEX IF NOT EXISTS idx_observations_code_time
+    ON observations (product_code, observed_at);
+CREATE INDEX IF NOT EXISTS idx_observations_spider_time
+    ON observations (spider, observed_at);
+CREATE INDEX IF NOT EXISTS idx_observations_run
+    ON observations (run_id);
+'''
+
+UPSERT_PRODUCT = '''
+INSERT INTO products (
+    spider, product_code, name, category, unit, currency, url,
+    weight, length, width, height, first_run_id, last_run_id
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (spider, product_code, name) DO UPDATE SET
+    category = excluded.category,
+    unit = excluded.unit,
+    currency = excluded.currency,
+    url = excluded.url,
+    weight = excluded.weight,
+    length = excluded.length,
+    width = excluded.width,
+    height = excluded.height,
+    last_run_id = excluded.last_run_id
+'''
+
+UPSERT_STOCK = '''
+INSERT INTO stocks (
+    spider, product_code, name, position, stock, quantity, price, run_id
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (spider, product_code, name, position) DO UPDATE SET
+    stock = excluded.stock,
+    quantity = excluded.quantity,
+    price = excluded.price,
+    run_id = excluded.run_id
+'''
+
+DELETE_STALE_STOCKS = '''
+DELETE FROM stocks
+WHERE spider = ? AND product_code = ? AND name = ? AND position >= ?
+'''
+
+INSERT_OBSERVATION = '''
+INSERT INTO observations (
+    run_id, spider, product_code, name, stock, quantity, price, observed_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+class PriceHistoryPipeline:
+    """
+    Сохранение истории цен и остатков в локальную базу SQLite.
+
+    Работает после ValidationPipeline и пишет нормализованные товары в
+    таблицы products, stocks (последнее известное состояние) и
+    observations (история цен), привязывая их к запуску из runs.
+    Товар определяется ключом ProductItem.key (product_code и
+    название). Запись идет пакетами в одной транзакции, база
+    открывается в режиме WAL. Пакет, который не удалось записать,
+    остается в буфере и записывается со следующим. Настройка
+    HISTORY_DB.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = Path(path)
+        self.batch_size = max(int(batch_size), 1)
+        self.conn: Optional[sqlite3.Connection] = None
+        self.run_id: Optional[int] = None
+        self.items_count = 0
+        self.buffer: List[ProductItem] = []
+        # Размер буфера, при котором выполняется следующая запись
+        self.flush_at = self.batch_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        config = crawler.settings.getdict('HISTORY_DB')
+        if not config.get('ENABLED', False):
+            raise NotConfigured
+        pipeline = cls(
+            path=config.get('PATH', 'data/history.sqlite3'),
+            batch_size=config.get('BATCH_SIZE', 500)
+        )
+        crawler.signals.connect(
+            pipeline.spider_closed,
+            signal=signals.spider_closed
+        )
+        return pipeline
+
+    def open_spider(self, spider):
+        """Открытие базы и регистрация нового запуска."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (spider, started_at) VALUES (?, ?)',
+                (spider.name, self._now())
+            )
+        self.run_id = cursor.lastrowid
+        self.logger.info(
+            f'История цен: {self.path}, запуск {self.run_id} ({spider.name})'
+            )
+
+    def process_item(self, item: ProductItem, spider) -> ProductItem:
+        """Добавление товара в пакет для записи."""
+        self.buffer.append(item)
+        if len(self.buffer) >= self.flush_at:
+            self._flush(spider)
+        return item
+
+    def checkpoint(self, spider) -> None:
+        """
+        Запись пакета перед контрольной точкой (см. Checkpoint).
+
+        После контрольной точки FrontierScheduler подтверждает запросы,
+        поэтому товары из буфера должны быть в базе до нее. Если пакет
+        записать не удалось, контрольная точка пропускается.
+        """
+        self._flush(spider)
+        if self.buffer:
+            raise RuntimeError(
+                f'История цен: не записано {len(self.buffer)} товаров'
+            )
+
+    def close_spider(self, spider):
+        """Запись оставшегося пакета."""
+        self._flush(spider)
+        if self.buffer:
+            self.logger.error(
+                f'История цен: не записано {len(self.buffer)} товаров'
+                )
+
+    def spider_closed(self, spider, reason: str):
+        """Завершение запуска и закрытие базы."""
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute(
+                'UPDATE runs SET finished_at = ?, reason = ?, items = ? '
+                'WHERE id = ?',
+                (self._now(), reason, self.items_count, self.run_id)
+            )
+        self.conn.close()
+        self.conn = None
+        self.logger.info(
+            f'История цен сохранена: {self.items_count} товаров, '
+            f'запуск {self.run_id}'
+            )
+
+    def _flush(self, spider) -> None:
+        """
+        Пакетная запись накопленных товаров в одной транзакции.
+
+        Старые склады удаляются и новые записываются для каждого товара
+        по очереди, поэтому повтор товара в пакете дает то же, что и
+        отдельные запуски. При ошибке транзакция откатывается, а буфер
+        сохраняется до следующей попытки.
+        """
+        if not self.buffer or self.conn is None:
+            return
+
+        observed_at = self._now()
+        observations = []
+        try:
+            with self.conn:
+                for item in self.buffer:
+                    code, name = item.product_code, item.name
+                    self.conn.execute(UPSERT_PRODUCT, (
+                        spider.name, code, name, item.category,
+                        self._format_unit(item.unit), item.currency,
+                        item.url, item.weight, item.length,
+                        item.width, item.height,
+                        self.run_id, self.run_id,
+                    ))
+                    self.conn.execute(
+                        DELETE_STALE_STOCKS,
+                        (spider.name, code, name, len(item.stocks))
+                    )
+                    stocks = []
+                    for position, stock in enumerate(item.stocks):
+                        stocks.append((
+                            spider.name, code, name, position, stock.stock,
+                            stock.quantity, stock.price, self.run_id,
+                        ))
+                        observations.append((
+                            self.run_id, spider.name, code, name,
+                            stock.stock, stock.quantity, stock.price,
+                            observed_at,
+                        ))
+                    self.conn.executemany(UPSERT_STOCK, stocks)
+                self.conn.executemany(INSERT_OBSERVATION, observations)
+        except sqlite3.Error as e:
+            self.flush_at = len(self.buffer) + self.batch_size
+            self.logger.error(
+                f'Ошибка записи истории цен, {len(self.buffer)} товаров '
+                f'будут записаны со следующим пакетом: {str(e)}'
+                )
+            return
+
+        self.items_count += len(self.buffer)
+        self.buffer = []
+        self.flush_at = self.batch_size
+
+    def _format_unit(self, unit: Any) -> Optional[str]:
+        if isinstance(unit, list):
+            return '; '.join(unit)
+        return unit
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(sep=' ', timespec='seconds')
@@ -3,6 +3,8 @@ from typing import Any, Dict, List, Optional, Union
 
 from scrapy.exceptions import DropItem
 
+from ..items import ProductItem, StockItem
+
 
 class ValidationPipeline:
     """Валидация данных перед сохранением и приведение к единому формату."""
@@ -11,69 +13,97 @@ class ValidationPipeline:
         self.logger = logging.getLogger(self.__class__.__name__)
         self.required_fields = ['product_code', 'name']
 
-    def process_item(self, item: Dict[str, Any], spider) -> Dict[str, Any]:
-        """Валидация и стандартизация данных для всех пауков."""
+    def process_item(
+            self,
+            item: Union[ProductItem, Dict[str, Any]],
+            spider
+            ) -> ProductItem:
+        """
+        Валидация и стандартизация данных для всех пауков.
+
+        ProductItem нормализуется на месте, словари от сторонних
+        пауков сначала преобразуются в ProductItem. None в category,
+        product_code, name, currency и url заменяется значением по
+        умолчанию (пустая строка, RUB). Пустой список складов при
+        заданной цене заменяется складом по умолчанию.
+        """
+        if not isinstance(item, ProductItem):
+            item = self._from_dict(item)
+
         # Проверка обязательных полей
         for field in self.required_fields:
-            if not item.get(field):
+            if not getattr(item, field):
                 msg = f'Отсутствует обязательное поле: {field}'
                 self.logger.warning(msg)
                 raise DropItem(msg)
 
-        price = item.get('price')
-        stocks = item.get('stocks', [])
-
-        has_valid_price = price is not None
-        has_stocks_with_price = False
-
-        # Проверяем, есть ли цены в stocks
-        if stocks:
-            for stock in stocks:
-                if stock.get('price') is not None:
-                    has_stocks_with_price = True
-                    break
+        has_valid_price = item.price is not None
+        has_stocks_with_price = any(
+            stock.price is not None for stock in item.stocks
+        )
 
         if not has_valid_price and not has_stocks_with_price:
             msg = 'Отсутствует информация о цене (ни в поле price, ни в stocks)'
             self.logger.warning(msg)
             raise DropItem(msg)
 
-        normalized_item = {
-            'category': self._get_str_value(item, 'category', ''),
-            'product_code': self._get_str_value(item, 'product_code', ''),
-            'name': self._get_str_value(item, 'name', ''),
-            'stocks': self._normalize_stocks(item),
-            'unit': self._normalize_unit(item),
-            'currency': self._get_str_value(item, 'currency', 'RUB'),
-            'url': self._get_str_value(item, 'url', ''),
-            'weight': self._get_str_value(item, 'weight', None),
-            'length': self._get_str_value(item, 'length', None),
-            'width': self._get_str_value(item, 'width', None),
-            'height': self._get_str_value(item, 'height', None),
-        }
-
-        return normalized_item
-
-    def _get_str_value(
+        item.category = self._to_str(item.category, '')
+        item.product_code = self._to_str(item.product_code, '')
+        item.name = self._to_str(item.name, '')
+        item.stocks = self._normalize_stocks(item)
+        item.unit = self._normalize_unit(item.unit)
+        item.currency = self._to_str(item.currency, 'RUB')
+        item.url = self._to_str(item.url, '')
+        item.weight = self._to_str(item.weight, None)
+        item.length = self._to_str(item.length, None)
+        item.width = self._to_str(item.width, None)
+        item.height = self._to_str(item.height, None)
+
+        return item
+
+    def _from_dict(self, item: Dict[str, Any]) -> ProductItem:
+        """Преобразование словаря в ProductItem."""
+        product = ProductItem.from_dict(item)
+
+        # Если есть поля stock и city - преобразуем в формат stocks
+        if 'stocks' not in item and ('stock' in item or 'city' in item):
+            stock_name = item.get('city', 'Основной')
+            quantity = item.get('stock', 0)
+
+            # Если quantity это строка типа "По запросу", преобразуем в 0
+            if isinstance(quantity, str) and not quantity.isdigit():
+                quantity = 0
+
+            try:
+                quantity = int(quantity)
+            except (ValueError, TypeError):
+                quantity = 0
+
+            product.stocks = [StockItem(
+                stock=stock_name,
+                quantity=quantity,
+                price=self._to_float(item.get('price'), 'price', 0.0)
+            )]
+
+        return product
+
+    def _to_str(
             self,
-            item: Dict[str, Any],
-            key: str,
+            value: Any,
             default: Optional[str] = ''
             ) -> Optional[str]:
         """Получение строкового значения."""
-        value = item.get(key, default)
         if value is None:
-            return None
+            return default
         return str(value).strip()
 
-    def _get_float_value(
+    def _to_float(
             self,
-            item: Dict[str, Any],
+            value: Any,
             key: str,
             default: float = 0.0
             ) -> float:
         """Получение числового значения как float."""
-        value = item.get(key, default)
         if value is None:
             return default
         try:
@@ -87,64 +117,16 @@ class ValidationPipeline:
                 )
             return default
 
-    def _normalize_stocks(self, item: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Нормализация данных о наличии товара на складах."""
-        if 'stocks' in item and isinstance(item['stocks'], list):
-            return [
-                self._normalize_stock_item(stock) for stock in item['stocks']
-                ]
-
-        # Если есть поля stock и city - преобразуем в формат stocks
-        if 'stock' in item or 'city' in item:
-            stock_name = item.get('city', 'Основной')
-            quantity = item.get('stock', 0)
-
-            # Если quantity это строка типа "По запросу", преобразуем в 0
-            if isinstance(quantity, str) and not quantity.isdigit():
-                quantity = 0
-
-            try:
-                quantity = int(quantity)
-            except (ValueError, TypeError):
-                quantity = 0
-
-            price = self._get_float_value(item, 'price', 0.0)
-
-            return [{
-                'stock': stock_name,
-                'quantity': quantity,
-                'price': price
-            }]
-
-        # Если нет информации о складе, но есть цена, создаем склад по умолчанию
-        if 'price' in item and item['price'] is not None:
-            return [{
-                'stock': 'Основной',
-                'quantity': 0,
-                'price': self._get_float_value(item, 'price', 0.0)
-            }]
-
-        return []
-
-    def _normalize_stock_item(self, stock: Dict[str, Any]) -> Dict[str, Any]:
-        """Нормализация отдельной записи о складе."""
-        return {
-            'stock': self._get_str_value(stock, 'stock', 'Основной'),
-            'quantity': self._get_int_value(stock, 'quantity', 0),
-            'price': self._get_float_value(stock, 'price', 0.0)
-        }
-
-    def _get_int_value(
+    def _to_int(
             self,
-            item: Dict[str, Any],
+            value: Any,
             key: str,
             default: int = 0
             ) -> int:
         """Получение числового значения как int."""
+        if value is None:
+            return default
         try:
-            value = item.get(key, default)
-            if value is None:
-                return default
             return int(float(value))
         except (ValueError, TypeError):
             self.logger.warning(
@@ -152,10 +134,32 @@ class ValidationPipeline:
                 )
             return default
 
-    def _normalize_unit(self, item: Dict[str, Any]) -> Union[str, List[str]]:
-        """Нормализация единицы измерения."""
-        unit = item.get('unit')
+    def _normalize_stocks(self, item: ProductItem) -> List[StockItem]:
+        """Нормализация данных о наличии товара на складах."""
+        if item.stocks:
+            for stock in item.stocks:
+                self._normalize_stock_item(stock)
+            return item.stocks
+
+        # Если нет информации о складе, но есть цена, создаем склад по умолчанию
+        if item.price is not None:
+            return [StockItem(
+                stock='Основной',
+                quantity=0,
+                price=self._to_float(item.price, 'price', 0.0)
+            )]
 
+        return []
+
+    def _normalize_stock_item(self, stock: StockItem) -> StockItem:
+        """Нормализация отдельной записи о складе на месте."""
+        stock.stock = self._to_str(stock.stock, 'Основной') or ''
+        stock.quantity = self._to_int(stock.quantity, 'quantity', 0)
+        stock.price = self._to_float(stock.price, 'price', 0.0)
+        return stock
+
+    def _normalize_unit(self, unit: Any) -> Union[str, List[str]]:
+        """Нормализация единицы измерения."""
         # Если единицы измерения нет, возвращаем значение по умолчанию
         if not unit:
             return 'шт'
@@ -0,0 +1,361 @@
+import cProfile
+import logging
+import pstats
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary, WeakSet
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sampling', 'both')
+
+
+class StackSampler(threading.Thread):
+    """
+    Выборка стека потока реактора раз в interval секунд.
+
+    Учитываются только кадры внутри участка, который сейчас выполняет
+    Profiler.call: от кадра call до текущего. Стек записывается
+    с меткой участка в корне, как нужно для flamegraph.
+    """
+
+    def __init__(self, profiler: 'Profiler', thread_id: int, interval: float):
+        super().__init__(name='StackSampler', daemon=True)
+        self.profiler = profiler
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            section = self.profiler.section
+            if section is None:
+                continue
+            label, root = section
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not root:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            # Участок закончился, пока снимался стек
+            if frame is None or not stack:
+                continue
+            stack.append(label)
+            self.profiler.stacks[tuple(reversed(stack))] += 1
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        # co_qualname есть только с Python 3.11
+        name = getattr(code, 'co_qualname', code.co_name)
+        return (
+            f'{name} '
+            f'({Path(code.co_filename).name}:{code.co_firstlineno})'
+        )
+
+
+class Profiler:
+    """
+    Профилирование участков кода с метками (callback'и, process_item).
+
+    cprofile - детерминированный профиль отдельно для каждой метки,
+    sampling - выборка стека в отдельном потоке, both - оба сразу.
+    Пока профилирование выключено, call только вызывает функцию, но
+    обычно до него не доходит: обертки ставятся только на время
+    включения. Вложенные участки входят в профиль внешнего.
+    """
+
+    def __init__(self, mode: str = 'both', interval: float = 0.005):
+        if mode not in MODES:
+            raise NotConfigured(f'Неизвестный режим профилирования: {mode}')
+        self.mode = mode
+        self.interval = interval
+        self.active = False
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.totals: Dict[str, List] = {}
+        self.stacks: Counter = Counter()
+        self.section: Optional[Tuple[str, Any]] = None
+        self.sampler: Optional[StackSampler] = None
+
+    def start(self) -> None:
+        if self.active:
+            return
+        self.active = True
+        if self.mode != 'cprofile':
+            self.sampler = StackSampler(
+                self, threading.get_ident(), self.interval
+            )
+            self.sampler.start()
+
+    def stop(self) -> None:
+        if not self.active:
+            return
+        self.active = False
+        if self.sampler is not None:
+            self.sampler.stopped.set()
+            self.sampler.join()
+            self.sampler = None
+
+    def call(self, label: str, func: Callable, *args):
+        """Вызов func(*args) как участка с меткой label."""
+        if not self.active or self.section is not None:
+            return func(*args)
+        profile = None
+        if self.mode != 'sampling':
+            profile = self.profiles.get(label)
+            if profile is None:
+                profile = self.profiles[label] = cProfile.Profile()
+        self.section = (label, sys._getframe())
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            return func(*args)
+        finally:
+            if profile is not None:
+                profile.disable()
+            totals = self.totals.setdefault(label, [0, 0.0])
+            totals[0] += 1
+            totals[1] += time.perf_counter() - started
+            self.section = None
+
+    def wrap(self, label: str, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args):
+            return self.call(label, func, *args)
+        return wrapper
+
+    async def call_async(self, label: str, awaitable):
+        """
+        Ожидание awaitable, где участком считается каждый его шаг.
+
+        Время ожидания сети и браузера в профиль не попадает, только
+        работа между ожиданиями.
+        """
+        return await _ProfiledAwaitable(self, label, awaitable)
+
+    def write(self, prefix: Path) -> List[Path]:
+        """Запись pstats по меткам, общего pstats и collapsed-стеков."""
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for label, profile in self.profiles.items():
+            path = prefix.with_name(f'{prefix.name}_{_safe_name(label)}.pstats')
+            profile.dump_stats(path)
+            paths.append(path)
+        if self.profiles:
+            path = prefix.with_name(f'{prefix.name}.pstats')
+            pstats.Stats(*self.profiles.values()).dump_stats(path)
+            paths.append(path)
+        if self.stacks:
+            path = prefix.with_name(f'{prefix.name}.collapsed')
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f'{";".join(stack)} {count}\n')
+            paths.append(path)
+        return paths
+
+
+class _ProfiledAwaitable:
+    """Каждый шаг корутины выполняется через Profiler.call."""
+
+    def __init__(self, profiler: Profiler, label: str, awaitable):
+        self.profiler = profiler
+        self.label = label
+        self.awaitable = awaitable
+
+    def __await__(self):
+        iterator = self.awaitable.__await__()
+        step, value = iterator.send, None
+        while True:
+            try:
+                yielded = self.profiler.call(self.label, step, value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value = yield yielded
+                step = iterator.send
+            except GeneratorExit:
+                iterator.close()
+                raise
+            except BaseException as e:
+                step, value = iterator.throw, e
+
+
+def _safe_name(label: str) -> str:
+    return re.sub(r'[^\w.-]+', '_', label)
+
+
+_profilers: 'WeakKeyDictionary[Any, Profiler]' = WeakKeyDictionary()
+
+
+def crawler_profiler(crawler) -> Profiler:
+    """Общий профайлер краулера для ProfilingMiddleware и Profiling."""
+    profiler = _profilers.get(crawler)
+    if profiler is None:
+        config = crawler.settings.getdict('PROFILING')
+        profiler = Profiler(
+            mode=config.get('MODE', 'both'),
+            interval=float(config.get('INTERVAL', 0.005))
+        )
+        _profilers[crawler] = profiler
+    return profiler
+
+
+def profiling_configured(settings) -> bool:
+    config = settings.getdict('PROFILING')
+    return bool(config.get('ENABLED', False) or config.get('SIGNAL'))
+
+
+_extensions: 'WeakSet[Profiling]' = WeakSet()
+_signal_handlers = set()
+
+
+def _toggle_all(signum, frame):
+    from twisted.internet import reactor
+
+    # Обертки меняются в потоке реактора, между вызовами пайплайнов
+    reactor.callFromThread(
+        lambda: [extension.toggle() for extension in list(_extensions)]
+    )
+
+
+def install_signal_handler(name: str) -> None:
+    """Один обработчик сигнала на процесс переключает всех пауков."""
+    if name in _signal_handlers:
+        return
+    signum = getattr(signal, name, None)
+    if signum is None:
+        # На Windows нет SIGUSR1/SIGUSR2
+        logger.warning(f'Сигнал {name} недоступен, профилирование - по PROFILING')
+        return
+    signal.signal(signum, _toggle_all)
+    _signal_handlers.add(name)
+
+
+class Profiling:
+    """
+    Профилирование callback'ов пауков и process_item пайплайнов.
+
+    Включается сразу (PROFILING['ENABLED']) или сигналом
+    PROFILING['SIGNAL'] во время обхода, повторный сигнал выключает.
+    Callback'и оборачивает ProfilingMiddleware, process_item пайплайнов
+    обертываются только на время включения, поэтому выключенное
+    профилирование почти ничего не стоит. Результаты накапливаются по
+    меткам (имя callback'а, <Пайплайн>.process_item) и при закрытии
+    паука пишутся в PROFILING['DIR']: pstats для каждой метки и общий,
+    collapsed-стеки для flamegraph. Настройка PROFILING.
+    """
+
+    def __init__(
+            self,
+            crawler,
+            profiler: Profiler,
+            enabled: bool = False,
+            directory: str = 'logs/profiles'
+            ):
+        self.crawler = crawler
+        self.profiler = profiler
+        self.enabled = enabled
+        self.directory = Path(directory)
+        self.spider = None
+        self.pipelines: Optional[List[Callable]] = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not profiling_configured(crawler.settings):
+            raise NotConfigured
+        config = crawler.settings.getdict('PROFILING')
+        extension = cls(
+            crawler,
+            crawler_profiler(crawler),
+            enabled=config.get('ENABLED', False),
+            directory=config.get('DIR', 'logs/profiles')
+        )
+        if config.get('SIGNAL'):
+            install_signal_handler(config['SIGNAL'])
+        crawler.signals.connect(
+            extension.spider_opened,
+            signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed,
+            signal=signals.spider_closed
+        )
+        return extension
+
+    def spider_opened(self, spider):
+        self.spider = spider
+        _extensions.add(self)
+        if self.enabled:
+            self.start()
+
+    def spider_closed(self, spider):
+        _extensions.discard(self)
+        self.stop()
+        if not self.profiler.totals:
+            return
+        prefix = self.directory / f'{spider.name}_{datetime.now():%Y%m%d_%H%M%S}'
+        paths = self.profiler.write(prefix)
+        for label, (calls, seconds) in sorted(
+                self.profiler.totals.items(), key=lambda item: -item[1][1]):
+            logger.info(f'{label}: {seconds:.3f} с, замеров: {calls}')
+        logger.info(
+            f'Профили сохранены: {", ".join(str(path) for path in paths)}'
+            )
+
+    def toggle(self) -> None:
+        if self.spider is None:
+            return
+        if self.profiler.active:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self) -> None:
+        if self.profiler.active:
+            return
+        self.profiler.start()
+        self._wrap_pipelines()
+        logger.info(f'{self.spider.name}: профилирование включено')
+
+    def stop(self) -> None:
+        if not self.profiler.active:
+            return
+        self._unwrap_pipelines()
+        self.profiler.stop()
+        logger.info(f'{self.spider.name}: профилирование выключено')
+
+    def _wrap_pipelines(self) -> None:
+        engine = self.crawler.engine
+        if engine is None:
+            return
+        itemproc = engine.scraper.itemproc
+        methods = itemproc.methods['process_item']
+        self.pipelines = list(methods)
+        names = [
+            pipeline.__class__.__name__
+            for pipeline in itemproc.middlewares
+            if hasattr(pipeline, 'process_item')
+        ]
+        methods.clear()
+        for name, method in zip(names, self.pipelines):
+            methods.append(self.profiler.wrap(f'{name}.process_item', method))
+
+    def _unwrap_pipelines(self) -> None:
+        if self.pipelines is None:
+            return
+        methods = self.crawler.engine.scraper.itemproc.methods['process_item']
+        methods.clear()
+        methods.extend(self.pipelines)
+        self.pipelines = None
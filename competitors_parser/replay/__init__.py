@@ -0,0 +1,8 @@
+from .server import (FixtureSite, ReplayServer, parse_errors, replay_path,
+                     url_key)
+from .synthetic import SYNTHETIC_SITES, SyntheticSite
+
+__all__ = [
+    'FixtureSite', 'ReplayServer', 'SYNTHETIC_SITES', 'SyntheticSite',
+    'parse_errors', 'replay_path', 'url_key'
+]
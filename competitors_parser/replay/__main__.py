@@ -0,0 +1,125 @@
+"""
+Запуск сервера записанных ответов.
+
+    python -m competitors_parser.replay --latency 0.2 --jitter 0.1 \
+        --error 429=0.02 --error 503=0.01 --bandwidth 256
+
+Синтетический каталог заданного размера вместо записанных страниц:
+
+    python -m competitors_parser.replay --synthetic fabreex \
+        --categories 10 --depth 2 --per-page 50 --pages 20 --variants 10
+
+Паук направляется на сервер настройкой REPLAY_SERVER:
+
+    scrapy crawl zenon -s REPLAY_SERVER=http://127.0.0.1:8800 \
+        -s HTTPCACHE_ENABLED=False
+"""
+import argparse
+import logging
+
+from .server import FixtureSite, ReplayServer, parse_errors
+from .synthetic import SYNTHETIC_SITES
+
+
+def add_synthetic_arguments(parser):
+    """Параметры размера синтетического каталога."""
+    parser.add_argument(
+        '--categories', type=int, default=5,
+        help='разделов на каждом уровне'
+    )
+    parser.add_argument('--depth', type=int, default=2, help='уровней')
+    parser.add_argument(
+        '--per-page', type=int, default=20,
+        help='товаров на странице'
+    )
+    parser.add_argument(
+        '--pages', type=int, default=2,
+        help='страниц в листовой категории'
+    )
+    parser.add_argument(
+        '--variants', type=int, default=2,
+        help='вариантов у товара'
+    )
+
+
+def synthetic_sites(args):
+    return [
+        SYNTHETIC_SITES[name](
+            categories=args.categories,
+            depth=args.depth,
+            per_page=args.per_page,
+            pages=args.pages,
+            variants=args.variants
+        )
+        for name in args.synthetic
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Сервер записанных ответов сайтов конкурентов'
+    )
+    parser.add_argument(
+        '--fixtures', default='benchmarks/fixtures',
+        help='каталог с manifest.json (одного паука или всех)'
+    )
+    parser.add_argument(
+        '--synthetic', action='append', default=[],
+        choices=sorted(SYNTHETIC_SITES),
+        help='отдавать синтетический каталог в разметке сайта'
+    )
+    add_synthetic_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='задержка ответа, секунды'
+    )
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='разброс задержки, +- секунды'
+    )
+    parser.add_argument(
+        '--error', action='append', default=[], metavar='КОД=ДОЛЯ',
+        help='доля ответов с ошибкой, например 429=0.02'
+    )
+    parser.add_argument(
+        '--bandwidth', type=int, default=0,
+        help='скорость отдачи, КБ/с (0 - без ограничения)'
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(name)s] %(levelname)s: %(message)s'
+    )
+    sites = synthetic_sites(args) or [FixtureSite(args.fixtures)]
+    for site in sites:
+        if hasattr(site, 'describe'):
+            logging.info(f'Синтетический каталог {site.name}: {site.describe()}')
+    server = ReplayServer(
+        sites,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        errors=parse_errors(args.error),
+        bandwidth=args.bandwidth * 1024,
+        seed=args.seed
+    )
+    server.logger.info(
+        f'Сервер запущен: {server.url}. '
+        f'Паук: scrapy crawl <паук> -s REPLAY_SERVER={server.url} '
+        f'-s HTTPCACHE_ENABLED=False'
+        )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from w3lib.url import canonicalize_url
+
+
+# Ответ сайта: (Content-Type, тело)
+Page = Tuple[str, bytes]
+
+ERROR_BODIES = {
+    403: b'<html><body><h1>403 Forbidden</h1>captcha</body></html>',
+    429: b'<html><body><h1>429 Too Many Requests</h1></body></html>',
+}
+
+
+def url_key(url: str) -> str:
+    """Ключ страницы: канонический URL без схемы."""
+    return canonicalize_url(url).split('://', 1)[-1]
+
+
+class FixtureSite:
+    """
+    Сохраненные страницы из manifest.json бенчмарков.
+
+    Принимает каталог одного паука или каталог со всеми пауками
+    (benchmarks/fixtures). Страницы читаются в память при создании.
+    """
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.pages: Dict[str, Page] = {}
+        root = Path(path)
+        manifests = (
+            [root / 'manifest.json'] if (root / 'manifest.json').exists()
+            else sorted(root.glob('*/manifest.json'))
+        )
+        for manifest_path in manifests:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            for entry in manifest['pages']:
+                body = (manifest_path.parent / entry['file']).read_bytes()
+                self.pages[url_key(entry['url'])] = (
+                    entry['content_type'],
+                    body
+                )
+        self.logger.info(
+            f'Загружено страниц: {len(self.pages)} из {len(manifests)} '
+            f'манифестов ({root})'
+            )
+
+    def get(self, key: str) -> Optional[Page]:
+        return self.pages.get(key)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Отдача страницы по пути /<хост><путь>?<запрос>."""
+
+    protocol_version = 'HTTP/1.1'
+    server: 'ReplayServer'
+
+    def do_GET(self):
+        self.server.count('requests')
+        self.server.sleep_latency()
+
+        status = self.server.pick_error()
+        if status is not None:
+            self._send(
+                status,
+                'text/html; charset=utf-8',
+                ERROR_BODIES.get(status, b'<html><body>Server error</body></html>')
+            )
+            return
+
+        page = self.server.resolve(self.path)
+        if page is None:
+            self._send(404, 'text/html; charset=utf-8', b'Not found')
+            return
+
+        # ETag по содержимому, чтобы проверять условные запросы
+        content_type, body = page
+        etag = f'"{hashlib.md5(body).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, content_type, b'', etag)
+            return
+        self._send(200, content_type, body, etag)
+
+    def _send(
+            self,
+            status: int,
+            content_type: str,
+            body: bytes,
+            etag: Optional[str] = None
+            ) -> None:
+        self.server.count(status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        if status == 429:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.server.write_body(self.wfile, body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Локальный HTTP-сервер, отдающий записанные ответы сайтов.
+
+    Запрос к https://www.remex.ru/price приходит как
+    GET /www.remex.ru/price (его переписывает ReplayMiddleware).
+    Поддерживаются задержка ответа с разбросом, доля ответов с ошибками
+    (errors: {код: доля}, например {429: 0.02, 503: 0.01}) и
+    ограничение скорости отдачи в байтах в секунду. Ответы отдаются с
+    ETag по содержимому, на совпавший If-None-Match приходит 304.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+            self,
+            sites: Iterable,
+            host: str = '127.0.0.1',
+            port: int = 8800,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            errors: Optional[Dict[int, float]] = None,
+            bandwidth: Optional[int] = None,
+            retry_after: int = 1,
+            seed: Optional[int] = None
+            ):
+        super().__init__((host, port), ReplayHandler)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.sites: List = list(sites)
+        self.latency = max(float(latency), 0.0)
+        self.jitter = max(float(jitter), 0.0)
+        self.errors = errors or {}
+        self.bandwidth = int(bandwidth) if bandwidth else None
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'ReplayServer':
+        """Запуск сервера в фоновом потоке."""
+        self._thread = threading.Thread(
+            target=self.serve_forever,
+            name='replay-server',
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def resolve(self, path: str) -> Optional[Page]:
+        key = url_key(f'http:/{path}')
+        for site in self.sites:
+            page = site.get(key)
+            if page is not None:
+                return page
+        self.logger.warning(f'Нет записанного ответа для {path}')
+        return None
+
+    def count(self, key) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def sleep_latency(self) -> None:
+        if not self.latency and not self.jitter:
+            return
+        with self._lock:
+            offset = self.random.uniform(-self.jitter, self.jitter)
+        delay = self.latency + offset
+        if delay > 0:
+            time.sleep(delay)
+
+    def pick_error(self) -> Optional[int]:
+        """Код ошибки для текущего ответа или None."""
+        if not self.errors:
+            return None
+        with self._lock:
+            roll = self.random.random()
+        for status, rate in self.errors.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    def write_body(self, wfile, body: bytes) -> None:
+        """Отдача тела с ограничением скорости, если оно задано."""
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        chunk_size = max(self.bandwidth // 20, 512)
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            wfile.write(chunk)
+            wfile.flush()
+            time.sleep(len(chunk) / self.bandwidth)
+
+
+def parse_errors(values: Iterable[str]) -> Dict[int, float]:
+    """Разбор аргументов вида 429=0.02 в словарь {код: доля}."""
+    errors = {}
+    for value in values:
+        status, _, rate = value.partition('=')
+        errors[int(status)] = float(rate)
+    return errors
+
+
+def replay_path(url: str) -> str:
+    """Путь на сервере записанных ответов для исходного URL."""
+    parts = urlsplit(url)
+    path = f'/{parts.netloc}{parts.path or "/"}'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    return path
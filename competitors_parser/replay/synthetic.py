@@ -0,0 +1,436 @@
+import json
+import re
+import zlib
+from itertools import product as cartesian
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .server import Page
+
+
+HTML = 'text/html; charset=utf-8'
+JSON = 'application/json'
+
+Path = Tuple[int, ...]
+
+
+def html_page(title: str, body: str) -> Page:
+    return HTML, (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>{title}</title></head><body><main>{body}</main>'
+        '</body></html>'
+    ).encode('utf-8')
+
+
+def json_page(data) -> Page:
+    return JSON, json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class SyntheticSite:
+    """
+    Синтетический каталог в разметке одного из сайтов конкурентов.
+
+    Дерево категорий: categories разделов на каждом из depth уровней,
+    товары лежат в листовых категориях по per_page на странице, pages
+    страниц на категорию, у каждого товара variants вариантов (цвета,
+    строки прайса или предложения - в зависимости от сайта). Страницы
+    генерируются при запросе и не хранятся, поэтому каталог может быть
+    сколь угодно большим. Подклассы задают host и разметку.
+    """
+
+    host = ''
+    start_url = ''
+    name = ''
+
+    def __init__(
+            self,
+            categories: int = 5,
+            depth: int = 2,
+            per_page: int = 20,
+            pages: int = 2,
+            variants: int = 2
+            ):
+        self.categories = max(int(categories), 1)
+        self.depth = max(int(depth), 1)
+        self.per_page = max(int(per_page), 1)
+        self.pages = max(int(pages), 1)
+        self.variants = max(int(variants), 1)
+
+    @property
+    def leaves(self) -> int:
+        return self.categories ** self.depth
+
+    @property
+    def products(self) -> int:
+        return self.leaves * self.pages * self.per_page
+
+    @property
+    def expected_items(self) -> int:
+        """Сколько товаров должен собрать паук с этого каталога."""
+        return self.products * self.variants
+
+    def describe(self) -> Dict[str, int]:
+        return {
+            'categories': self.categories,
+            'depth': self.depth,
+            'per_page': self.per_page,
+            'pages': self.pages,
+            'variants': self.variants,
+            'leaf_categories': self.leaves,
+            'products': self.products,
+            'expected_items': self.expected_items,
+        }
+
+    def get(self, key: str) -> Optional[Page]:
+        """Страница по ключу из url_key или None."""
+        host, _, rest = key.partition('/')
+        if host != self.host:
+            return None
+        parts = urlsplit(f'//{host}/{rest}')
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        try:
+            return self.route(parts.path, query)
+        except (KeyError, ValueError, IndexError):
+            return None
+
+    def route(self, path: str, query: Dict[str, str]) -> Optional[Page]:
+        raise NotImplementedError
+
+    # Дерево категорий
+
+    def slug(self, path: Path) -> str:
+        return 'c' + '-'.join(str(i) for i in path)
+
+    def title(self, path: Path) -> str:
+        return 'Категория ' + '.'.join(str(i + 1) for i in path)
+
+    def parse_slug(self, slug: str) -> Path:
+        """Разбор slug категории с проверкой границ дерева."""
+        if not slug.startswith('c'):
+            raise ValueError(slug)
+        path = tuple(int(part) for part in slug[1:].split('-'))
+        if not 1 <= len(path) <= self.depth:
+            raise ValueError(slug)
+        if any(not 0 <= i < self.categories for i in path):
+            raise ValueError(slug)
+        return path
+
+    def children(self, path: Path) -> List[Path]:
+        if len(path) >= self.depth:
+            return []
+        return [path + (i,) for i in range(self.categories)]
+
+    def leaves_under(self, path: Path) -> Iterator[Path]:
+        rest = self.depth - len(path)
+        for suffix in cartesian(range(self.categories), repeat=rest):
+            yield path + suffix
+
+    def leaf_index(self, path: Path) -> int:
+        index = 0
+        for i in path:
+            index = index * self.categories + i
+        return index
+
+    def page_products(self, leaf: Path, page: int) -> range:
+        """Номера товаров на странице page (с 1) листовой категории."""
+        if len(leaf) != self.depth or not 1 <= page <= self.pages:
+            raise ValueError(page)
+        start = (self.leaf_index(leaf) * self.pages + page - 1) * self.per_page
+        return range(start, start + self.per_page)
+
+    def check_product(self, pid: int) -> int:
+        if not 0 <= pid < self.products:
+            raise ValueError(pid)
+        return pid
+
+    # Значения товаров
+
+    def price(self, pid: int, variant: int = 0) -> float:
+        value = zlib.crc32(f'{pid}:{variant}'.encode()) % 500000
+        return round(100 + value / 100, 2)
+
+    def quantity(self, pid: int, variant: int = 0) -> int:
+        return zlib.crc32(f'q{pid}:{variant}'.encode()) % 200
+
+    def price_text(self, value: float) -> str:
+        rub, kop = divmod(round(value * 100), 100)
+        return f'{rub:,}'.replace(',', '\xa0') + f',{kop:02d}'
+
+
+class RemexSite(SyntheticSite):
+    """Прайс remex: категории -> таблица товаров -> строки прайса."""
+
+    name = 'remex'
+    host = 'www.remex.ru'
+    start_url = 'https://www.remex.ru/price'
+
+    PRODUCT_RE = re.compile(r'^/price/(c[\d-]+)/p(\d+)/$')
+    CATEGORY_RE = re.compile(r'^/price/(c[\d-]+)/$')
+
+    def route(self, path, query):
+        if path == '/price':
+            links = ''.join(
+                f'<li><a href="/price/{self.slug(leaf)}/">'
+                f'<span>{self.title(leaf)}</span></a></li>'
+                for leaf in self.leaves_under(())
+            )
+            return html_page('Прайс-лист', f'<ul>{links}</ul>')
+
+        match = self.CATEGORY_RE.match(path)
+        if match:
+            slug = match.group(1)
+            leaf = self.parse_slug(slug)
+            rows = ''.join(
+                f'<tr><td><a href="/price/{slug}/p{pid}/">Товар {pid}</a>'
+                f'</td></tr>'
+                for page in range(1, self.pages + 1)
+                for pid in self.page_products(leaf, page)
+            )
+            return html_page(
+                self.title(leaf),
+                f'<table class="price-table price-table-images">{rows}</table>'
+            )
+
+        match = self.PRODUCT_RE.match(path)
+        if match:
+            self.parse_slug(match.group(1))
+            pid = self.check_product(int(match.group(2)))
+            rows = ''.join(
+                f'<tr><td>Товар {pid}, вариант {v + 1}</td><td>шт</td>'
+                f'<td>{self.price_text(self.price(pid, v))}</td></tr>'
+                for v in range(self.variants)
+            )
+            return html_page(
+                f'Товар {pid}',
+                f'<table class="price-table pprtbl">{rows}</table>'
+            )
+        return None
+
+
+class ZenonSite(SyntheticSite):
+    """
+    Каталог zenonline: разделы -> подкатегории -> списки с пагинацией.
+
+    В карточке zenon одна цена, поэтому variants не используется.
+    """
+
+    name = 'zenon'
+    host = 'zenonline.ru'
+    start_url = 'https://zenonline.ru/cat/'
+
+    LIST_RE = re.compile(r'^/cat/(c[\d-]+)/(?:(c[\d-]+)/)?$')
+    PRODUCT_RE = re.compile(r'^/product/p(\d+)/$')
+
+    @property
+    def expected_items(self) -> int:
+        return self.products
+
+    def route(self, path, query):
+        if path == '/cat/':
+            boxes = ''.join(
+                f'<div class="box"><a href="/cat/{self.slug(top)}/">'
+                f'{self.title(top)}</a></div>'
+                for top in self.children(())
+            )
+            return html_page('Каталог', f'<div id="catalog">{boxes}</div>')
+
+        match = self.LIST_RE.match(path)
+        if match:
+            top = self.parse_slug(match.group(1))
+            if len(top) != 1:
+                return None
+            if match.group(2) is None and self.depth > 1:
+                links = ''.join(
+                    f'<li class="dropdown"><a href="/cat/{self.slug(top)}/'
+                    f'{self.slug(leaf)}/">{self.title(leaf)}</a></li>'
+                    for leaf in self.leaves_under(top)
+                )
+                return html_page(
+                    self.title(top),
+                    f'<div class="filter_b filter_b_catalog"><ul>{links}'
+                    f'</ul></div>'
+                )
+            leaf = self.parse_slug(match.group(2)) if match.group(2) else top
+            return self._listing(path, leaf, int(query.get('PAGEN_1', 1)))
+
+        match = self.PRODUCT_RE.match(path)
+        if match:
+            pid = self.check_product(int(match.group(1)))
+            price = self.price_text(self.price(pid))
+            rub, kop = price.split(',')
+            body = (
+                f'<div class="cont_page"><div id="product" '
+                f'data-articul="ZN-{pid:07d}"></div>'
+                f'<h1 class="js_c1name">Товар {pid}</h1>'
+                f'<span class="rub">{rub}</span><span class="kop">,{kop}</span>'
+                f'<div class="buy_wrapper-minimum"><span class="nobr">шт'
+                f'</span></div><div class="tovar_amount"><span class="amount" '
+                f'data-initial_amount="{self.quantity(pid)}"></span></div>'
+                f'<div id="tab-1"><table class="tables"><tr><td><strong>Вес'
+                f'</strong></td><td>{pid % 9 + 1} кг</td></tr></table></div>'
+                f'</div>'
+            )
+            return html_page(f'Товар {pid}', body)
+        return None
+
+    def _listing(self, path: str, leaf: Path, page: int) -> Page:
+        boxes = ''.join(
+            f'<div class="box"><a href="/product/p{pid}/">Товар {pid}</a></div>'
+            for pid in self.page_products(leaf, page)
+        )
+        paginator = ''
+        if page < self.pages:
+            paginator = (
+                f'<div class="paginator"><a class="next" '
+                f'href="{path}?PAGEN_1={page + 1}">Далее</a></div>'
+            )
+        return html_page(
+            self.title(leaf),
+            f'<div class="breadcrumbs"><a href="/">Главная</a>'
+            f'<a href="/cat/">{self.title(leaf)}</a></div>'
+            f'<div class="content">{boxes}</div>{paginator}'
+        )
+
+
+class FabreexSite(SyntheticSite):
+    """Каталог fabreex: категории с пагинацией, у товара цвета-варианты."""
+
+    name = 'fabreex'
+    host = 'fabreex.ru'
+    start_url = 'https://fabreex.ru/catalog/'
+
+    CATEGORY_RE = re.compile(r'^/catalog/(c[\d-]+)/$')
+    PRODUCT_RE = re.compile(r'^/product/(\d+)-(\d+)/$')
+
+    def route(self, path, query):
+        if path == '/catalog/':
+            buttons = ''.join(
+                f'<div class="uk-button"><a href="/catalog/{self.slug(leaf)}/">'
+                f'{self.title(leaf)}</a></div>'
+                for leaf in self.leaves_under(())
+            )
+            return html_page('Каталог', buttons)
+
+        match = self.CATEGORY_RE.match(path)
+        if match:
+            leaf = self.parse_slug(match.group(1))
+            page = int(query.get('PAGEN_1', 1))
+            cards = ''.join(
+                f'<div class="sz-cards-bottom sz-cards-bottom-new">'
+                f'<a href="/product/{pid}-0/">Товар {pid}</a></div>'
+                for pid in self.page_products(leaf, page)
+            )
+            items = ''.join(
+                f'<li{" class=" + chr(34) + "uk-active" + chr(34) if n == page else ""}>'
+                f'<a href="{path}?PAGEN_1={n}">{n}</a></li>'
+                for n in range(max(page - 1, 1), min(page + 1, self.pages) + 1)
+            )
+            return html_page(
+                self.title(leaf),
+                f'{cards}<ul class="uk-pagination">{items}</ul>'
+            )
+
+        match = self.PRODUCT_RE.match(path)
+        if match:
+            pid = self.check_product(int(match.group(1)))
+            variant = int(match.group(2))
+            if variant >= self.variants:
+                return None
+            colors = ''.join(
+                f'<div class="sz-color-block sz-color-block-active">'
+                f'<a uk-tooltip="Цвет {v + 1}"></a></div>' if v == variant else
+                f'<div class="sz-color-block"><a class="desc-color-element" '
+                f'href="/product/{pid}-{v}/" uk-tooltip="Цвет {v + 1}"></a></div>'
+                for v in range(self.variants)
+            )
+            price = self.price(pid, variant)
+            body = (
+                f'<h1>Ткань {pid}</h1>'
+                f'<div class="sz-full-price-prod" priceid="1" price="{price}">'
+                f'{self.price_text(price)} руб.</div>'
+                f'<span class="uk-position-relative uk-position-z-index">'
+                f'За шт.</span>'
+                f'<input type="number" max="{self.quantity(pid, variant)}">'
+                f'<div class="sz-text-large">Ширина</div><div>1,5 м</div>'
+                f'{colors}'
+            )
+            return html_page(f'Ткань {pid}', body)
+        return None
+
+
+class OracalSite(SyntheticSite):
+    """API oracal-online: дерево категорий, списки товаров, предложения."""
+
+    name = 'oracal'
+    host = 'api.oracal-online.ru'
+    start_url = (
+        'https://api.oracal-online.ru/api/geo/select-city?city=%D0%9C%D0%BE'
+        '%D1%81%D0%BA%D0%B2%D0%B0&region_iso_code=RU-MOW'
+    )
+
+    def route(self, path, query):
+        if path == '/api/geo/select-city':
+            return json_page({'data': {'city': query.get('city')}})
+
+        if path == '/api/category/list/':
+            data = []
+            for top in self.children(()):
+                subs = self.children(top) or [top]
+                data.append({
+                    'slug': self.slug(top),
+                    'title': self.title(top),
+                    'subCategory': [
+                        {'slug': self.slug(sub), 'title': self.title(sub)}
+                        for sub in subs
+                    ],
+                })
+            return json_page({'data': data})
+
+        if path == '/api/category':
+            node = self.parse_slug(query['slug'])
+            return json_page({'data': {
+                'slug': query['slug'],
+                'subCategories': [
+                    {'slug': self.slug(child), 'title': self.title(child)}
+                    for child in self.children(node)
+                ],
+            }})
+
+        if path == '/api/product/category':
+            leaf = self.parse_slug(query['slug'])
+            page = int(query.get('page', 1))
+            return json_page({
+                'data': [
+                    {'slug': f'p{pid}', 'title': f'Пленка {pid}'}
+                    for pid in self.page_products(leaf, page)
+                ],
+                'meta': {'current_page': page, 'last_page': self.pages},
+            })
+
+        if path == '/api/product-offer/list':
+            pid = self.check_product(int(query['slug'].lstrip('p')))
+            offers = []
+            for v in range(self.variants):
+                price = self.price(pid, v)
+                offers.append({
+                    'id': pid * self.variants + v,
+                    'id_1s': f'ЦБ-{pid:07d}-{v}',
+                    'title': f'Пленка {pid} цвет {v + 1}',
+                    'unit': 'пог. м',
+                    'prices': [{'unit': 'пог. м', 'price': price}],
+                    'restsAvailable': [
+                        {'title': 'пог. м', 'amount': self.quantity(pid, v)}
+                    ],
+                    'restsAllStore': [],
+                    'properties': [{'name': 'Ширина', 'value': '1,26 м'}],
+                })
+            return json_page({'data': {'offers': {
+                'data': offers, 'last_page': 1
+            }}})
+        return None
+
+
+SYNTHETIC_SITES = {
+    site.name: site
+    for site in (RemexSite, ZenonSite, FabreexSite, OracalSite)
+}
@@ -0,0 +1,515 @@
+"""
+Запуск пауков проекта одним процессом или с разбиением по категориям.
+
+Все выбранные пауки (по умолчанию все из competitors_parser.spiders)
+работают в одном CrawlerProcess с общим реактором: интерпретатор,
+импорты и DNS-кеш Scrapy общие, а пайплайны и экспортеры у каждого
+паука свои. Общее время обхода близко ко времени самого медленного
+паука, а не к сумме.
+
+С --shards N категории первого шага обхода каждого паука делятся
+между N процессами (ShardMiddleware). Процессы пишут товары во
+временные каталоги, затем основной процесс убирает дубли по
+ProductItem.key (product_code и name) и прогоняет товары через
+ITEM_PIPELINES паука, поэтому экспорт в data/processed/<паук>/ и
+история цен такие же, как у обычного обхода.
+
+    run-parser                                  # все пауки
+    run-parser zenon fabreex --concurrency 48 --per-domain 8
+    run-parser zenon --shards 16
+    run-parser zenon --shards 4 --frontier
+    run-parser zenon --resume
+
+С --frontier процессы не делят категории заранее, а берут запросы из
+общей очереди FrontierScheduler по мере освобождения. С --resume
+обход пишет контрольные точки в data/jobs/<паук>/ и после сбоя
+продолжается с последней из них при повторном запуске с --resume.
+"""
+import argparse
+import json
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from scrapy import signals
+from scrapy.crawler import Crawler, CrawlerProcess
+from scrapy.exceptions import DropItem
+from scrapy.pipelines import ItemPipelineManager
+from scrapy.settings import SETTINGS_PRIORITIES
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.log import configure_logging
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+from ..items import ProductItem
+
+logger = logging.getLogger(__name__)
+
+FRONTIER_SCHEDULER = 'competitors_parser.frontier.FrontierScheduler'
+JOBS_DIR = Path('data/jobs')
+
+# В процессах-шардах товары только проверяются и пишутся в JSON Lines,
+# история и остальные экспортеры работают при слиянии
+SHARD_PIPELINES = {
+    'competitors_parser.pipelines.validation.ValidationPipeline': 300,
+    'competitors_parser.exporters.json_exporter.JSONExporter': 500,
+}
+
+
+class ConcurrencyBudget:
+    """
+    Общий лимит одновременных запросов для краулеров одного процесса.
+
+    Лимит делится поровну между работающими краулерами, но не выше
+    CONCURRENT_REQUESTS самого паука. Когда паук завершается, его доля
+    перераспределяется между оставшимися.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.limits: Dict[Crawler, int] = {}
+
+    def share(self, count: int) -> int:
+        return max(self.total // max(count, 1), 1)
+
+    def add(self, crawler: Crawler, own_limit: int) -> None:
+        self.limits[crawler] = own_limit
+        crawler.signals.connect(
+            self.spider_closed,
+            signal=signals.spider_closed
+        )
+
+    def initial(self, own_limit: int, count: int) -> int:
+        return min(own_limit, self.share(count))
+
+    def spider_closed(self, spider):
+        self.limits.pop(spider.crawler, None)
+        share = self.share(len(self.limits))
+        for crawler, own_limit in self.limits.items():
+            if crawler.engine is None:
+                continue
+            limit = min(own_limit, share)
+            crawler.engine.downloader.total_concurrency = limit
+            logger.info(
+                f'{crawler.spider.name}: лимит запросов {limit} '
+                f'после завершения {spider.name}'
+                )
+
+
+def spider_setting(settings, spidercls, name: str):
+    """Значение настройки с учетом custom_settings паука."""
+    custom = getattr(spidercls, 'custom_settings', None) or {}
+    # -s из командной строки важнее custom_settings
+    if name in custom and settings.getpriority(name) < (
+            SETTINGS_PRIORITIES['spider']):
+        return custom[name]
+    return settings.get(name)
+
+
+def parse_overrides(values: Iterable[str]) -> Dict[str, str]:
+    overrides = {}
+    for value in values:
+        key, _, setting = value.partition('=')
+        overrides[key] = setting
+    return overrides
+
+
+def resolve_spiders(settings, names: List[str]) -> List[str]:
+    available = SpiderLoader.from_settings(settings).list()
+    unknown = sorted(set(names) - set(available))
+    if unknown:
+        raise SystemExit(
+            f'Неизвестные пауки: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(sorted(available))}'
+        )
+    return names or sorted(available)
+
+
+def budget_settings(
+        settings,
+        spidercls,
+        concurrency: Optional[int],
+        per_domain: Optional[int]
+        ) -> Dict:
+    """Лимиты параллельности паука в рамках общих бюджетов."""
+    overrides = {}
+    if concurrency:
+        overrides['CONCURRENT_REQUESTS'] = concurrency
+    if per_domain:
+        own = int(spider_setting(
+            settings, spidercls, 'CONCURRENT_REQUESTS_PER_DOMAIN'
+        ))
+        overrides['CONCURRENT_REQUESTS_PER_DOMAIN'] = min(own, per_domain)
+        adaptive = settings.getdict('ADAPTIVE_CONCURRENCY')
+        adaptive['MAX_CONCURRENCY'] = min(
+            int(adaptive.get('MAX_CONCURRENCY', per_domain)), per_domain
+        )
+        overrides['ADAPTIVE_CONCURRENCY'] = adaptive
+    return overrides
+
+
+def resume_settings(settings, name: str) -> Dict:
+    """Каталог задания и очередь, которые переживают сбой процесса."""
+    jobdir = JOBS_DIR / name
+    return {
+        'JOBDIR': str(jobdir),
+        'SCHEDULER': FRONTIER_SCHEDULER,
+        'FRONTIER': {
+            **settings.getdict('FRONTIER'),
+            'PATH': str(jobdir / 'frontier.sqlite3'),
+        },
+    }
+
+
+def run_spiders(settings, names: List[str], args) -> int:
+    """Все пауки в одном CrawlerProcess, возвращает код завершения."""
+    process = CrawlerProcess(settings)
+    loader = process.spider_loader
+    budget = ConcurrencyBudget(args.concurrency) if args.concurrency else None
+    crawlers = []
+    for name in names:
+        spidercls = loader.load(name)
+        concurrency = None
+        if budget is not None:
+            own_limit = int(spider_setting(
+                settings, spidercls, 'CONCURRENT_REQUESTS'
+            ))
+            concurrency = budget.initial(own_limit, len(names))
+        crawler_settings = settings.copy()
+        crawler_settings.setdict(
+            budget_settings(settings, spidercls, concurrency, args.per_domain),
+            priority='cmdline'
+        )
+        if args.resume:
+            crawler_settings.setdict(
+                resume_settings(settings, name), priority='cmdline'
+            )
+        # Реактор устанавливает первый краулер, как в CrawlerProcess
+        crawler = Crawler(
+            spidercls, crawler_settings, init_reactor=not crawlers
+        )
+        if budget is not None:
+            budget.add(crawler, own_limit)
+        process.crawl(crawler)
+        crawlers.append((name, crawler))
+
+    started = time.perf_counter()
+    process.start()
+    wall = time.perf_counter() - started
+
+    failed = 0
+    for name, crawler in crawlers:
+        stats = crawler.stats.get_stats()
+        reason = stats.get('finish_reason')
+        failed += reason != 'finished'
+        print(
+            f'{name:>10}: {stats.get("item_scraped_count", 0)} товаров за '
+            f'{stats.get("elapsed_time_seconds", 0):.1f} с ({reason})'
+        )
+    print(f'Общее время: {wall:.1f} с')
+    return 1 if failed else 0
+
+
+def shard_settings(
+        settings,
+        spidercls,
+        index: int,
+        count: int,
+        export_dir,
+        worker: Optional[int] = None
+        ):
+    """
+    Настройки процесса, обходящего долю index из count категорий.
+
+    worker - номер процесса среди шардов всех пауков запуска, по нему
+    выбирается порт метрик (по умолчанию index).
+    """
+    json_export = settings.getdict('JSON_EXPORT')
+    json_export['FORMAT'] = 'jsonl'
+    # Шарды пишут в общую базу кеша паука: блокировка записи SQLite
+    # не должна удерживаться между ответами
+    httpcache = settings.getdict('HTTPCACHE_SQLITE')
+    httpcache.update({'COMMIT_EVERY': 1, 'EVICT_ON_CLOSE': False})
+
+    rate_limits = spider_setting(settings, spidercls, 'RATE_LIMITS') or {}
+    if isinstance(rate_limits, str):
+        rate_limits = json.loads(rate_limits)
+    # Темп эндпоинта общий для всех шардов
+    rate_limits = {
+        pattern: {
+            **limit,
+            'RATE': float(limit['RATE']) / count,
+            'BURST': max(float(limit.get('BURST', 1)) / count, 1.0),
+        }
+        for pattern, limit in rate_limits.items()
+    }
+    # Свой порт и файл метрик у каждого процесса-шарда
+    metrics = settings.getdict('METRICS')
+    if metrics.get('PORT') is not None:
+        worker = index if worker is None else worker
+        metrics['PORT'] = int(metrics['PORT']) + 1 + worker
+    if metrics.get('SNAPSHOT'):
+        snapshot = Path(metrics['SNAPSHOT'])
+        metrics['SNAPSHOT'] = str(snapshot.with_name(
+            f'{snapshot.stem}_shard{index}{snapshot.suffix}'
+        ))
+    return {
+        'SHARD': {'INDEX': index, 'COUNT': count},
+        'METRICS': metrics,
+        'EXPORT_DIR': str(export_dir),
+        'ITEM_PIPELINES': SHARD_PIPELINES,
+        'JSON_EXPORT': json_export,
+        'HTTPCACHE_SQLITE': httpcache,
+        'RATE_LIMITS': rate_limits,
+    }
+
+
+def run_shard(settings, name: str, args) -> int:
+    """Обход одной доли категорий паука (процесс, запущенный из run_sharded)."""
+    index, _, count = args.shard.partition('/')
+    index, count = int(index), int(count)
+    process = CrawlerProcess(settings)
+    spidercls = process.spider_loader.load(name)
+    overrides = {
+        **budget_settings(
+            settings, spidercls, args.concurrency, args.per_domain
+        ),
+        **shard_settings(
+            settings, spidercls, index, count, args.export_dir,
+            worker=args.worker
+        ),
+    }
+    if args.frontier_crawl:
+        # Работа делится общей очередью, а не категориями
+        overrides['SHARD'] = {'COUNT': 1}
+        overrides['SCHEDULER'] = FRONTIER_SCHEDULER
+        overrides['FRONTIER'] = {
+            **settings.getdict('FRONTIER'), 'CRAWL': args.frontier_crawl
+        }
+    crawler_settings = settings.copy()
+    crawler_settings.setdict(overrides, priority='cmdline')
+    crawler = Crawler(spidercls, crawler_settings, init_reactor=True)
+    process.crawl(crawler)
+    process.start()
+    reason = crawler.stats.get_value('finish_reason')
+    return 0 if reason == 'finished' else 1
+
+
+def shard_command(
+        name: str,
+        index: int,
+        count: int,
+        export_dir,
+        args,
+        crawl: Optional[str] = None,
+        worker: Optional[int] = None
+        ):
+    command = [
+        sys.executable, '-m', 'competitors_parser.scripts.start_parser',
+        name, '--shard', f'{index}/{count}', '--export-dir', str(export_dir),
+    ]
+    if worker is not None:
+        command += ['--worker', str(worker)]
+    if crawl:
+        command += ['--frontier-crawl', crawl]
+    # Бюджеты делятся между шардами
+    if args.concurrency:
+        command += ['--concurrency', str(max(args.concurrency // count, 1))]
+    if args.per_domain:
+        command += ['--per-domain', str(max(args.per_domain // count, 1))]
+    for setting in args.settings:
+        command += ['-s', setting]
+    return command
+
+
+def read_shard_items(export_dir: Path, name: str) -> Iterator[ProductItem]:
+    for path in sorted((export_dir / name).glob(f'{name}_*.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield ProductItem.from_dict(json.loads(line))
+
+
+def merge_items(
+        shard_dirs: List[Path],
+        name: str,
+        counts: Counter
+        ) -> Iterator[ProductItem]:
+    """
+    Товары всех шардов без дублей по ProductItem.key.
+
+    Товары отдаются по одному, в памяти остаются только ключи. Число
+    дублей считается в counts['duplicates'].
+    """
+    seen = set()
+    for export_dir in shard_dirs:
+        for item in read_shard_items(export_dir, name):
+            key = item.key
+            if key in seen:
+                counts['duplicates'] += 1
+                continue
+            seen.add(key)
+            yield item
+
+
+def export_items(
+        settings,
+        name: str,
+        items: Iterable[ProductItem],
+        reason: str
+        ) -> int:
+    """
+    Прогон товаров через ITEM_PIPELINES паука без обхода.
+
+    Пайплайны и экспортеры получают те же open_spider, process_item,
+    close_spider и сигналы spider_opened/spider_closed, что и при
+    обычном запуске.
+    """
+    spidercls = SpiderLoader.from_settings(settings).load(name)
+    settings = settings.copy()
+    # Метрики обхода собрали процессы-шарды
+    settings.set(
+        'METRICS',
+        {**settings.getdict('METRICS'), 'ENABLED': False},
+        priority='cmdline'
+    )
+    crawler = Crawler(spidercls, settings)
+    crawler.stats = load_object(crawler.settings['STATS_CLASS'])(crawler)
+    spider = spidercls.from_crawler(crawler)
+    crawler.spider = spider
+    itemproc = ItemPipelineManager.from_crawler(crawler)
+
+    processed = 0
+    dropped = []
+
+    def item_failed(failure):
+        if not failure.check(DropItem):
+            logger.error(f'{name}: ошибка пайплайна: {failure.value}')
+        dropped.append(failure)
+
+    crawler.stats.open_spider(spider)
+    crawler.signals.send_catch_log(signals.spider_opened, spider=spider)
+    itemproc.open_spider(spider)
+    for item in items:
+        processed += 1
+        itemproc.process_item(item, spider).addErrback(item_failed)
+    itemproc.close_spider(spider)
+    crawler.signals.send_catch_log(
+        signals.spider_closed, spider=spider, reason=reason
+    )
+    crawler.stats.close_spider(spider, reason=reason)
+    return processed - len(dropped)
+
+
+def run_sharded(settings, names: List[str], args) -> int:
+    """Каждый паук на args.shards процессах со слиянием экспорта."""
+    workdir = Path(tempfile.mkdtemp(prefix='shards_'))
+    started = time.perf_counter()
+    workers = []
+    for name in names:
+        # Новое имя обхода, чтобы не продолжить чужую общую очередь
+        crawl = (
+            f'{name}_{datetime.now():%Y%m%d_%H%M%S}' if args.frontier else None
+        )
+        for index in range(args.shards):
+            export_dir = workdir / f'{name}_{index}'
+            # Сквозной номер процесса: у шардов разных пауков разные порты
+            command = shard_command(
+                name, index, args.shards, export_dir, args, crawl,
+                worker=len(workers)
+            )
+            workers.append((name, export_dir, subprocess.Popen(command)))
+
+    failed = set()
+    for name, export_dir, worker in workers:
+        if worker.wait() != 0:
+            failed.add(name)
+            logger.error(
+                f'{name}: шард {export_dir.name} завершился '
+                f'с кодом {worker.returncode}'
+                )
+
+    for name in names:
+        shard_dirs = [
+            export_dir for spider, export_dir, _ in workers if spider == name
+        ]
+        counts = Counter()
+        # Незавершенный обход не должен помечать товары удаленными
+        reason = 'shard_failed' if name in failed else 'finished'
+        exported = export_items(
+            settings, name, merge_items(shard_dirs, name, counts), reason
+        )
+        print(
+            f'{name:>10}: {exported} товаров из {args.shards} шардов, '
+            f'дублей {counts["duplicates"]} ({reason})'
+        )
+    print(f'Общее время: {time.perf_counter() - started:.1f} с')
+
+    if failed:
+        print(f'Экспорт шардов сохранен в {workdir}')
+        return 1
+    shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument(
+        'spiders', nargs='*', metavar='паук',
+        help='пауки для запуска (по умолчанию все)'
+    )
+    parser.add_argument(
+        '--concurrency', type=int, default=None, metavar='N',
+        help='общий лимит одновременных запросов всех пауков'
+    )
+    parser.add_argument(
+        '--per-domain', type=int, default=None, metavar='N',
+        help='лимит одновременных запросов к одному хосту'
+    )
+    parser.add_argument(
+        '--shards', type=int, default=1, metavar='N',
+        help='разбить категории каждого паука на N процессов'
+    )
+    parser.add_argument(
+        '-s', dest='settings', action='append', default=[],
+        metavar='НАСТРОЙКА=ЗНАЧЕНИЕ'
+    )
+    parser.add_argument(
+        '--frontier', action='store_true',
+        help='с --shards: процессы берут запросы из общей очереди '
+             '(FrontierScheduler), а не делят категории'
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='контрольные точки в data/jobs/<паук>/: прерванный обход '
+             'продолжается при следующем запуске с --resume'
+    )
+    parser.add_argument('--shard', help=argparse.SUPPRESS)
+    parser.add_argument('--frontier-crawl', help=argparse.SUPPRESS)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--export-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.resume and args.shards > 1:
+        parser.error('--resume работает только без --shards')
+
+    settings = get_project_settings()
+    settings.setdict(parse_overrides(args.settings), priority='cmdline')
+    names = resolve_spiders(settings, args.spiders)
+
+    if args.shard:
+        sys.exit(run_shard(settings, names[0], args))
+    if args.shards > 1:
+        configure_logging(settings)
+        sys.exit(run_sharded(settings, names, args))
+    sys.exit(run_spiders(settings, names, args))
+
+
+if __name__ == '__main__':
+    main()
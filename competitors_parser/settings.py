@@ -2,6 +2,7 @@ BOT_NAME = 'competitors_parser'
 
 SPIDER_MODULES = ['competitors_parser.spiders']
 NEWSPIDER_MODULE = 'competitors_parser.spiders'
+COMMANDS_MODULE = 'competitors_parser.commands'
 
 USER_AGENT = (
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
@@ -10,6 +11,9 @@ USER_AGENT = (
 
 ROBOTSTXT_OBEY = False
 
+# asyncio reactor нужен для async callback'ов и пула Playwright
+TWISTED_REACTOR = 'twisted.internet.asyncioreactor.AsyncioSelectorReactor'
+
 CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 8
 
@@ -19,16 +23,52 @@ COOKIES_ENABLED = False
 
 ITEM_PIPELINES = {
     'competitors_parser.pipelines.validation.ValidationPipeline': 300,
+    'competitors_parser.pipelines.history.PriceHistoryPipeline': 350,
     'competitors_parser.exporters.csv_exporter.CSVExporter': 400,
     'competitors_parser.exporters.json_exporter.JSONExporter': 500,
+    'competitors_parser.exporters.parquet_exporter.ParquetExporter': 600,
+    'competitors_parser.exporters.delta_exporter.DeltaExporter': 700,
 }
 
-AUTOTHROTTLE_ENABLED = True
+# Темп задает AdaptiveConcurrency (ADAPTIVE_CONCURRENCY) отдельно для
+# каждого хоста. Если включить AutoThrottle, он будет отключен
+# расширением при старте паука
+AUTOTHROTTLE_ENABLED = False
 AUTOTHROTTLE_START_DELAY = 5
 AUTOTHROTTLE_MAX_DELAY = 60
 AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
 AUTOTHROTTLE_DEBUG = False
 
+EXTENSIONS = {
+    'competitors_parser.extensions.AdaptiveConcurrency': 600,
+    'competitors_parser.checkpoint.Checkpoint': 650,
+    'competitors_parser.metrics.Metrics': 700,
+    'competitors_parser.profiling.Profiling': 710,
+}
+
+# AIMD по хостам: при 429, Retry-After, доле ошибок выше MAX_ERROR_RATE
+# или росте p90 задержки (выше TARGET_LATENCY и LATENCY_FACTOR x
+# минимальной p50) параллельность умножается на BACKOFF, а задержка
+# удваивается. Иначе раз в INTERVAL секунд (не реже чем по MIN_SAMPLES
+# ответов) темп растет на RATE_STEP запросов в секунду, а когда
+# задержка дошла до MIN_DELAY, параллельность растет на 1. Стартовые
+# значения - DOWNLOAD_DELAY и CONCURRENT_REQUESTS_PER_DOMAIN паука
+ADAPTIVE_CONCURRENCY = {
+    'ENABLED': True,
+    'MIN_CONCURRENCY': 1,
+    'MAX_CONCURRENCY': 16,
+    'MIN_DELAY': 0,
+    'MAX_DELAY': 60,
+    'RATE_STEP': 1.0,
+    'BACKOFF': 0.5,
+    'TARGET_LATENCY': 2.0,
+    'LATENCY_FACTOR': 3.0,
+    'MAX_ERROR_RATE': 0.05,
+    'WINDOW': 50,
+    'MIN_SAMPLES': 3,
+    'INTERVAL': 2,
+}
+
 LOG_LEVEL = 'INFO'
 LOG_FORMAT = '%(asctime)s [%(name)s] %(levelname)s: %(message)s'
 LOG_FILE = 'logs/parser.log'
@@ -40,14 +80,192 @@ RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': 550,
     'competitors_parser.middlewares.ErrorHandlerMiddleware': 560,
+    'competitors_parser.middlewares.ConditionalRequestMiddleware': 580,
+    'competitors_parser.middlewares.ReplayMiddleware': 950,
+}
+
+SPIDER_MIDDLEWARES = {
+    'competitors_parser.middlewares.EndpointRateLimitMiddleware': 30,
+    'competitors_parser.middlewares.FrontierSeedMiddleware': 40,
+    'competitors_parser.middlewares.ShardMiddleware': 50,
+    'competitors_parser.middlewares.PageReplayMiddleware': 990,
+    'competitors_parser.middlewares.ProfilingMiddleware': 995,
+    'competitors_parser.middlewares.MetricsMiddleware': 1000,
+}
+
+# Доля категорий процесса в шардированном режиме (run-parser --shards):
+# запросы первого шага обхода делятся по crc32(URL) % COUNT
+SHARD = {
+    'INDEX': 0,
+    'COUNT': 1,
 }
 
+# Общая очередь запросов для обхода несколькими процессами, включается
+# SCHEDULER = 'competitors_parser.frontier.FrontierScheduler'.
+# CRAWL - имя обхода (по умолчанию имя паука): воркеры с одинаковым
+# CRAWL и PATH делят очередь и отпечатки. WORKER_TIMEOUT - через
+# сколько секунд без сигнала воркер считается упавшим. BATCH_SIZE -
+# сколько запросов забирается из очереди и записывается в нее за раз
+FRONTIER = {
+    'STORE': 'competitors_parser.frontier.SQLiteFrontierStore',
+    'PATH': 'data/frontier/{spider}.sqlite3',
+    'CRAWL': None,
+    'HEARTBEAT': 5,
+    'WORKER_TIMEOUT': 60,
+    'BUSY_TIMEOUT': 30,
+    'BATCH_SIZE': 50,
+}
+
+# Метрики по паукам, callback'ам и хостам: формат Prometheus на
+# http://HOST:PORT/metrics (сводка - /metrics.json, PORT None - без HTTP;
+# если порт занят, берется следующий, всего PORT_TRIES попыток)
+# и JSON-снимок в SNAPSHOT раз в SNAPSHOT_INTERVAL секунд (None - без
+# файла). BUCKETS - границы гистограмм в секундах, по умолчанию от 1 мс
+# до 30 с
+METRICS = {
+    'ENABLED': True,
+    'HOST': '127.0.0.1',
+    'PORT': 9410,
+    'PORT_TRIES': 10,
+    'SNAPSHOT': 'logs/metrics_{spider}.json',
+    'SNAPSHOT_INTERVAL': 30,
+}
+
+# Профилирование callback'ов и process_item пайплайнов: сразу при
+# ENABLED или по сигналу SIGNAL (kill -USR1 <pid>, повторный сигнал
+# выключает). MODE: cprofile - pstats по callback'ам, sampling - выборка
+# стека раз в INTERVAL секунд (collapsed для flamegraph), both - оба.
+# Результаты пишутся в DIR при закрытии паука
+PROFILING = {
+    'ENABLED': False,
+    'SIGNAL': 'SIGUSR1',
+    'MODE': 'both',
+    'INTERVAL': 0.005,
+    'DIR': 'logs/profiles',
+}
+
+# Контрольные точки для продолжения обхода после сбоя, пишутся только
+# при заданном JOBDIR (run-parser --resume): раз в INTERVAL секунд
+# сохраняются позиции экспортеров и checkpoint_attributes паука.
+# Без потерь очередь переживает сбой только с FrontierScheduler
+CHECKPOINT = {
+    'ENABLED': True,
+    'INTERVAL': 60,
+}
+
+# Результаты разбора страниц прошлых запусков (товары и запросы,
+# которые отдал callback) по URL. CALLBACKS - какие страницы сохранять,
+# MAX_AGE_DAYS - через сколько дней без обновления страница удаляется
+PAGE_STORE = {
+    'PATH': 'data/pages.sqlite3',
+    'CALLBACKS': ['parse_product'],
+    'BATCH_SIZE': 200,
+    'MAX_AGE_DAYS': 30,
+}
+
+# Условные запросы (If-None-Match/If-Modified-Since) к страницам из
+# PAGE_STORE, по 304 товары берутся из прошлого запуска. Включается
+# в custom_settings пауков со статичными каталогами
+CONDITIONAL_REQUESTS_ENABLED = False
+
+# Повтор результата разбора, если тело ответа не изменилось с прошлого
+# запуска. Перед хешированием из тела вырезаются изменчивые фрагменты
+# (регулярные выражения BODY_FINGERPRINT_IGNORE)
+BODY_FINGERPRINT_ENABLED = False
+BODY_FINGERPRINT_IGNORE = [
+    # CSRF-токены и сессии
+    r'<meta[^>]+name="csrf-[^"]*"[^>]*>',
+    r'<input[^>]+name="(?:csrf[^"]*|_token|sessid)"[^>]*>',
+    r'bitrix_sessid[\'"]?\s*[:=,]\s*[\'"][0-9a-f]+[\'"]',
+    r'nonce="[^"]*"',
+    # Метки времени и параметры сброса кеша статики
+    r'(?:time|timestamp|ts)[\'"]?\s*[:=]\s*[\'"]?1[0-9]{9,12}',
+    r'\b\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}(?::\d{2})?\b',
+    r'\?(?:v|_|ver|t)=[\w.]+',
+    # Счетчики и комментарии с временем генерации страницы, в том числе
+    # многострочные. Флаги только локальные, (?s:...): выражения
+    # объединяются в одно
+    r'(?s:<!--.*?-->)',
+]
+
+# Ограничения частоты запросов по эндпоинтам:
+# {'подстрока URL': {'RATE': запросов в секунду, 'BURST': запас}}
+RATE_LIMITS = {}
+
+# Адрес локального сервера записанных ответов (python -m
+# competitors_parser.replay). Если задан, все запросы идут на него
+REPLAY_SERVER = None
+
 HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 0
 HTTPCACHE_DIR = '.scrapy/httpcache'
+# 304 на условный запрос не должен заменять в кеше полный ответ
+HTTPCACHE_IGNORE_HTTP_CODES = [304]
+
+# Кеш в одном файле SQLite на паука со сжатыми телами (zstd, если
+# установлен zstandard, иначе gzip). Просроченные записи удаляются при
+# закрытии паука и командой scrapy compactcache, MAX_SIZE_MB - предел
+# размера базы паука (0 - без ограничения)
+HTTPCACHE_STORAGE = 'competitors_parser.httpcache.SQLiteCacheStorage'
+HTTPCACHE_SQLITE = {
+    'COMPRESSION': 'zstd',
+    'LEVEL': 3,
+    'COMMIT_EVERY': 100,
+    'EVICT_ON_CLOSE': True,
+    'MAX_SIZE_MB': 2048,
+}
+
+# Время жизни ответов по классам URL, секунды: первое совпавшее
+# регулярное выражение, иначе HTTPCACHE_EXPIRATION_SECS (0 - бессрочно)
+HTTPCACHE_TTL = [
+    # Остатки и предложения
+    (r'forda\.ru/get_offers', 60 * 60),
+    (r'oracal-online\.ru/api/product-offer/list', 60 * 60),
+    # Карточки товаров
+    (r'remex\.ru/price/[^/?]+/[^/?]+', 24 * 60 * 60),
+    (r'(zenonline|fabreex)\.ru/product/', 24 * 60 * 60),
+    (r'forda\.ru/katalog/[^/?]+/[^/?]+', 24 * 60 * 60),
+    (r'tdppl\.ru/catalog/[^/?]+/[^/?]+', 24 * 60 * 60),
+]
+
+# Экспортеры пишут файлы в EXPORT_DIR/<паук>/
+EXPORT_DIR = 'data/processed'
 
+# Строки CSV пишутся пакетами: по BATCH_SIZE строк или раз в
+# FLUSH_INTERVAL секунд. Прогресс логируется каждые LOG_EVERY товаров
 CSV_EXPORT = {
     'ENCODING': 'utf-8',
     'DELIMITER': ';',
-    'DIRECTORY': 'data/processed'
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 5,
+    'LOG_EVERY': 1000,
+}
+
+# История цен и остатков в SQLite, товары пишутся пакетами по BATCH_SIZE
+HISTORY_DB = {
+    'ENABLED': True,
+    'PATH': 'data/history.sqlite3',
+    'BATCH_SIZE': 500,
+}
+
+# Группы строк Parquet записываются по мере накопления ROW_GROUP_SIZE товаров
+PARQUET_EXPORT = {
+    'ROW_GROUP_SIZE': 5000,
+    'COMPRESSION': 'zstd',
+}
+
+# Экспорт только изменений относительно прошлого запуска.
+# SNAPSHOT - дополнительно сохранить полный сжатый снимок
+DELTA_EXPORT = {
+    'ENABLED': False,
+    'SNAPSHOT': False,
+}
+
+# FORMAT: json (JSON-массив) или jsonl (JSON Lines).
+# Прогресс логируется каждые LOG_EVERY товаров
+JSON_EXPORT = {
+    'FORMAT': 'json',
+    'FLUSH_EVERY': 100,
+    'FLUSH_INTERVAL': 5,
+    'LOG_EVERY': 1000,
 }
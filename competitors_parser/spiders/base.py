@@ -1,7 +1,13 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
 from scrapy import Spider
+from scrapy.selector import Selector, SelectorList
+
+from ..parsing import (
+    PRICE_REQUEST_KEYWORDS, parse_characteristics, parse_price,
+    parse_quantity, price_on_request
+)
 
 
 class BaseCompetitorSpider(Spider):
@@ -19,10 +25,7 @@ class BaseCompetitorSpider(Spider):
     }
 
     # Ключевые слова для цен по запросу
-    PRICE_REQUEST_KEYWORDS = [
-        'по запросу', 'по заказу', 'звоните', 'уточняйте',
-        'договорная', 'нет в наличии', 'недоступно'
-    ]
+    PRICE_REQUEST_KEYWORDS = PRICE_REQUEST_KEYWORDS
 
     def __init__(self, *args, **kwargs):
         """Инициализация паука."""
@@ -36,40 +39,80 @@ class BaseCompetitorSpider(Spider):
             return 0.0
 
         # Проверяем наличие ключевых слов для цены по запросу
-        price_text_lower = price_text.lower()
-        for keyword in self.PRICE_REQUEST_KEYWORDS:
-            if keyword in price_text_lower:
-                self.logger.info(f'Price on request: {price_text}')
-                return 0.0
-
-        try:
-            # Очищаем от всего кроме цифр, точки и запятой
-            clean_price = ''.join(
-                c for c in price_text if c.isdigit() or c in '.,'
-            )
-            # Заменяем запятую на точку
-            clean_price = clean_price.replace(',', '.')
-            # Проверяем не пустая ли строка
-            if not clean_price:
-                return 0.0
-            return float(clean_price)
-        except (ValueError, TypeError):
-            self.logger.warning(f'Could not parse price: {price_text}')
+        if price_on_request(price_text):
+            self.logger.info(f'Price on request: {price_text}')
             return 0.0
 
+        return parse_price(price_text)
+
     def extract_stock(self, value: Optional[str]) -> int:
         """Извлечение количества товара на складе."""
-        if not value:
-            return 0
-        try:
-            # Извлекаем только числа
-            clean_value = ''.join(c for c in value if c.isdigit())
-            return int(clean_value) if clean_value else 0
-        except (ValueError, TypeError):
-            self.logger.warning(
-                f'Не удалось преобразовать количество: {value}'
+        return parse_quantity(value)
+
+    def extract_characteristics(
+            self,
+            pairs: Iterable[Tuple[Optional[str], Any]],
+            exact: bool = False,
+            last: bool = False
+            ) -> Dict[str, str]:
+        """
+        Характеристики товара из пар (название, значение).
+
+        Ключи - поля ProductItem: weight, length, width, height.
+        Названия сопоставляются по вхождению, при exact=True - целиком.
+        Из повторов берется первый, при last=True - последний.
+        """
+        return parse_characteristics(pairs, exact=exact, last=last)
+
+    def extract_table_characteristics(
+            self,
+            table: SelectorList
+            ) -> Dict[str, str]:
+        """
+        Характеристики из таблицы: первая ячейка строки - название,
+        вторая - значение. Название должно совпасть целиком:
+        строка "Вес упаковки" не дает weight.
+
+        Строки обходятся один раз по дереву lxml, без XPath-запросов
+        на каждую характеристику.
+        """
+        return parse_characteristics(self._table_pairs(table), exact=True)
+
+    def extract_label_characteristics(
+            self,
+            labels: SelectorList,
+            sibling: str = 'div'
+            ) -> Dict[str, str]:
+        """
+        Характеристики из подписей: значение - текст ближайшего
+        следующего за подписью элемента sibling. Подписи сопоставляются
+        по вхождению ("Ширина рулона" дает width).
+        """
+        return parse_characteristics(self._label_pairs(labels, sibling))
+
+    @staticmethod
+    def _table_pairs(table: SelectorList) -> Iterator[Tuple[str, str]]:
+        for selector in _as_list(table):
+            for row in selector.root.iter('tr'):
+                cells = [cell for cell in row if cell.tag in ('td', 'th')]
+                if len(cells) >= 2:
+                    yield (
+                        ''.join(cells[0].itertext()),
+                        ''.join(cells[1].itertext())
+                    )
+
+    @staticmethod
+    def _label_pairs(
+            labels: SelectorList,
+            sibling: str
+            ) -> Iterator[Tuple[str, Optional[str]]]:
+        for selector in _as_list(labels):
+            label = selector.root
+            value = next(label.itersiblings(sibling), None)
+            yield (
+                ''.join(label.itertext()),
+                ''.join(value.itertext()) if value is not None else None
             )
-            return 0
 
     def clean_text(self, text: Optional[str]) -> str:
         """Очистка текста от лишних пробелов и переносов строк."""
@@ -97,3 +140,10 @@ class BaseCompetitorSpider(Spider):
             f'Паук {self.name} завершил работу. '
             f'Причина: {reason}. Время работы: {duration}'
         )
+
+
+def _as_list(selectors) -> Iterable[Selector]:
+    """Selector или SelectorList как список селекторов."""
+    if isinstance(selectors, Selector):
+        return [selectors]
+    return selectors
@@ -1,8 +1,10 @@
-from typing import Any, Dict, Iterator
+from typing import Dict, Iterator
 
 from scrapy import Request
 from scrapy.http import Response
 
+from ..items import ProductItem, StockItem
+from ..parsing import parse_prices, price_on_request
 from .base import BaseCompetitorSpider
 
 
@@ -11,6 +13,13 @@ class FabreexSpider(BaseCompetitorSpider):
     allowed_domains = ['fabreex.ru']
     start_urls = ['https://fabreex.ru/catalog/']
 
+    custom_settings = {
+        **BaseCompetitorSpider.custom_settings,
+        # Карточки с вариантами цветов разбираются дольше всего:
+        # неизмененные берутся из прошлого запуска по хешу тела
+        'BODY_FINGERPRINT_ENABLED': True,
+    }
+
     def parse(self, response: Response) -> Iterator[Request]:
         """Парсинг главной страницы каталога."""
         all_categories = response.css('.uk-button')
@@ -62,7 +71,7 @@ class FabreexSpider(BaseCompetitorSpider):
             self,
             response: Response,
             category: str
-            ) -> Iterator[Dict[str, Any]]:
+            ) -> Iterator[ProductItem]:
         """Парсинг страницы товара."""
         try:
             name = response.css('h1::text').get()
@@ -73,27 +82,21 @@ class FabreexSpider(BaseCompetitorSpider):
             price_text = response.css('.sz-full-price-prod::text').get()
 
             # Проверяем, является ли цена "По запросу"
-            is_price_on_request = False
-            if price_text:
-                price_text_lower = price_text.lower()
-                for keyword in self.PRICE_REQUEST_KEYWORDS:
-                    if keyword in price_text_lower:
-                        is_price_on_request = True
-                        break
-
-            # Получаем цены с priceid
-            price_elements = response.css('.sz-full-price-prod')
-            prices = {}
-            for element in price_elements:
-                priceid = element.attrib.get('priceid')
-                price_value = element.attrib.get('price')
-                if priceid and price_value:
-                    try:
-                        prices[priceid] = float(price_value)
-                    except (ValueError, TypeError):
-                        self.logger.warning(
-                            f'Не удалось преобразовать цену: {price_value}'
-                            )
+            is_price_on_request = price_on_request(price_text) is not None
+
+            # Получаем цены с priceid, разбирая их одним пакетом
+            price_attrs = [
+                (element.attrib.get('priceid'), element.attrib.get('price'))
+                for element in response.css('.sz-full-price-prod')
+            ]
+            price_attrs = [
+                (priceid, value) for priceid, value in price_attrs
+                if priceid and value
+            ]
+            prices = dict(zip(
+                (priceid for priceid, _ in price_attrs),
+                parse_prices(value for _, value in price_attrs)
+            ))
 
             price = self.extract_price(price_text) if price_text else 0.0
             if not price and prices:
@@ -102,17 +105,10 @@ class FabreexSpider(BaseCompetitorSpider):
             if is_price_on_request:
                 name = f'{name} (Цена: По запросу)'
 
-            char_keys = response.xpath(
-                '//*[@class="sz-text-large"]/text()').getall()
-            char_values = response.xpath(
-                '//*[@class="sz-text-large"]/following-sibling::div[1]/text()'
-            ).getall()
-
-            width_value = None
-            for key, value in zip(char_keys, char_values):
-                if 'ширина' in key.lower():
-                    width_value = value.strip()
-                    break
+            characteristics = self.extract_label_characteristics(
+                response.xpath('//*[@class="sz-text-large"]')
+            )
+            width_value = characteristics.get('width')
 
             color = response.xpath(
                 '//*[@class="sz-color-block sz-color-block-active"]')
@@ -156,7 +152,7 @@ class FabreexSpider(BaseCompetitorSpider):
             current_color: str,
             width_value: str = None,
             prices: Dict[str, float] = None
-            ) -> Dict[str, Any]:
+            ) -> ProductItem:
         """Создание item'а с общими параметрами."""
         units = response.xpath(
             '//*[@class="uk-position-relative uk-position-z-index"]/text()'
@@ -180,33 +176,30 @@ class FabreexSpider(BaseCompetitorSpider):
         stocks = []
 
         if prices and '1' in prices and '2' in prices and len(units) >= 2:
-            stocks.append({
-                'stock': 'Москва',
-                'quantity': quantity,
-                'price': prices['1']
-            })
-            stocks.append({
-                'stock': 'Москва',
-                'quantity': quantity,
-                'price': prices['2']
-            })
+            stocks.append(StockItem(
+                stock='Москва',
+                quantity=quantity,
+                price=prices['1']
+            ))
+            stocks.append(StockItem(
+                stock='Москва',
+                quantity=quantity,
+                price=prices['2']
+            ))
         else:
-            stocks.append({
-                'stock': 'Москва',
-                'quantity': quantity,
-                'price': price
-            })
-
-        return {
-            'category': category,
-            'product_code': self.clean_text(full_name),
-            'name': full_name,
-            'stocks': stocks,
-            'unit': unit,
-            'currency': 'RUB',
-            'weight': None,
-            'length': None,
-            'width': width,
-            'height': None,
-            'url': response.url
-        }
+            stocks.append(StockItem(
+                stock='Москва',
+                quantity=quantity,
+                price=price
+            ))
+
+        return ProductItem(
+            category=category,
+            product_code=self.clean_text(full_name),
+            name=full_name,
+            stocks=stocks,
+            unit=unit,
+            currency='RUB',
+            width=width,
+            url=response.url
+        )
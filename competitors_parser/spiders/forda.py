@@ -1,10 +1,11 @@
 import json
+from collections import defaultdict
 from typing import Any, Dict, Iterator, List, Optional
 
-import requests
 from scrapy import Request
 from scrapy.http import Response
 
+from ..items import ProductItem, StockItem
 from .base import BaseCompetitorSpider
 
 
@@ -15,9 +16,20 @@ class FordaSpider(BaseCompetitorSpider):
     start_urls = ['https://www.forda.ru/katalog/']
     local_warehouses = ['Подольск', 'Подольск-транзит', 'Москва']
 
+    # API с информацией об остатках на складах
+    OFFERS_API_URL = 'https://www.forda.ru/get_offers?id={api_id}'
+
     # Исключаем категории из парсинга
     excluded_categories = ['Новинки', 'Распродажа']
 
+    # Сохраняются в контрольной точке (см. Checkpoint)
+    checkpoint_attributes = ('processed_urls',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Уже найденные ссылки на товары по категориям
+        self.processed_urls: Dict[str, set] = defaultdict(set)
+
     def parse(self, response: Response) -> Iterator[Request]:
         """Парсинг главной страницы каталога."""
         all_categories = response.css('a.card-header')
@@ -38,17 +50,13 @@ class FordaSpider(BaseCompetitorSpider):
                 yield Request(
                     url=response.urljoin(category_url),
                     callback=self.parse_category,
-                    cb_kwargs={
-                        'category': category_name,
-                        'processed_urls': set()
-                        }
+                    cb_kwargs={'category': category_name}
                 )
 
     def parse_category(
             self,
             response: Response,
-            category: str,
-            processed_urls: set
+            category: str
             ) -> Iterator[Request]:
         """Парсинг страницы категории или товара."""
         self.logger.info(f'Обработка URL: {response.url}')
@@ -72,6 +80,7 @@ class FordaSpider(BaseCompetitorSpider):
         # Ищем ссылки на другие товары
         products_table = response.xpath('//*[@class="catalog-section card"]')
         products = products_table.css('a::attr(href)').getall()
+        processed_urls = self.processed_urls[category]
 
         for product_url in products:
             full_url = response.urljoin(product_url)
@@ -84,10 +93,7 @@ class FordaSpider(BaseCompetitorSpider):
                 yield Request(
                     url=full_url,
                     callback=self.parse_category,
-                    cb_kwargs={
-                        'category': category,
-                        'processed_urls': processed_urls
-                        }
+                    cb_kwargs={'category': category}
                 )
 
     def _process_product(
@@ -96,18 +102,41 @@ class FordaSpider(BaseCompetitorSpider):
             category: str,
             api_id: str,
             offer_id: str
-            ) -> Iterator[Dict[str, Any]]:
-        """Обработка страницы товара."""
+            ) -> Iterator[Request]:
+        """Обработка страницы товара: запрос остатков через API."""
+        # Получаем название продукта
+        product_name = response.css('h1::text').get()
+        if not product_name:
+            return
+
+        # Информация о складах запрашивается через обычный планировщик
+        # Scrapy, чтобы не блокировать reactor синхронным запросом
+        yield Request(
+            url=self.OFFERS_API_URL.format(api_id=api_id),
+            callback=self.parse_offers,
+            cb_kwargs={
+                'category': category,
+                'api_id': api_id,
+                'offer_id': offer_id,
+                'product_name': self.clean_text(product_name),
+                'product_url': response.url
+                },
+            headers={'Accept': 'application/json'}
+        )
+
+    def parse_offers(
+            self,
+            response: Response,
+            category: str,
+            api_id: str,
+            offer_id: str,
+            product_name: str,
+            product_url: str
+            ) -> Iterator[ProductItem]:
+        """Парсинг ответа API с остатками и формирование товаров."""
         try:
-            # Получаем название продукта
-            product_name = response.css('h1::text').get()
-            if not product_name:
-                return
-
-            product_name = self.clean_text(product_name)
-
-            # Получаем информацию о складах через API
-            stocks_data = self._get_stocks_data(api_id)
+            # Получаем информацию о складах из ответа API
+            stocks_data = self._get_stocks_data(response, api_id)
 
             if not stocks_data:
                 self.logger.warning(
@@ -129,21 +158,21 @@ class FordaSpider(BaseCompetitorSpider):
 
                 # Проверка наличия складов
                 if not stocks:
-                    stocks = [{
-                        'stock': 'Основной',
-                        'quantity': 0,
-                        'price': price
-                    }]
-
-                item = {
-                    'category': category,
-                    'product_code': f'{offer_id} / {api_id}',
-                    'name': full_name,
-                    'stocks': stocks,
-                    'unit': 'шт',
-                    'currency': 'RUB',
-                    'url': response.url
-                }
+                    stocks = [StockItem(
+                        stock='Основной',
+                        quantity=0,
+                        price=price
+                    )]
+
+                item = ProductItem(
+                    category=category,
+                    product_code=f'{offer_id} / {api_id}',
+                    name=full_name,
+                    stocks=stocks,
+                    unit='шт',
+                    currency='RUB',
+                    url=product_url
+                )
 
                 self.logger.info(
                     f'Обработан товар: {full_name} с {len(stocks)} складами'
@@ -152,7 +181,7 @@ class FordaSpider(BaseCompetitorSpider):
 
         except Exception as e:
             self.logger.error(
-                f'Ошибка обработки товара {response.url}: {str(e)}'
+                f'Ошибка обработки товара {product_url}: {str(e)}'
                 )
 
     def _get_api_id(self, response: Response) -> Optional[str]:
@@ -192,15 +221,14 @@ class FordaSpider(BaseCompetitorSpider):
 
         return None
 
-    def _get_stocks_data(self, api_id: str) -> List[Dict[str, Any]]:
-        """Получение данных о наличии товара через API."""
-        url = f'https://www.forda.ru/get_offers?id={api_id}'
-
+    def _get_stocks_data(
+            self,
+            response: Response,
+            api_id: str
+            ) -> List[Dict[str, Any]]:
+        """Получение данных о наличии товара из ответа API."""
         try:
-            # Делаем запрос к API
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = json.loads(response.body)
 
             # Проверяем, что данные не пустые
             if not data:
@@ -222,11 +250,11 @@ class FordaSpider(BaseCompetitorSpider):
                     rest_qty = warehouse.get('rest', 0)
 
                     # Добавляем информацию о местном складе
-                    stocks.append({
-                        'stock': store_name,
-                        'quantity': rest_qty,
-                        'price': product_price
-                    })
+                    stocks.append(StockItem(
+                        stock=store_name,
+                        quantity=rest_qty,
+                        price=product_price
+                    ))
 
                 for rest in product.get('rests', []):
                     store_info = rest.get('store', {})
@@ -235,11 +263,11 @@ class FordaSpider(BaseCompetitorSpider):
 
                     # Добавляем информацию о других складах
                     if store_name not in self.local_warehouses:
-                        stocks.append({
-                            'stock': store_name,
-                            'quantity': rest_qty,
-                            'price': product_price
-                        })
+                        stocks.append(StockItem(
+                            stock=store_name,
+                            quantity=rest_qty,
+                            price=product_price
+                        ))
 
                 # Логируем информацию о найденных складах
                 self.logger.info(
@@ -255,8 +283,6 @@ class FordaSpider(BaseCompetitorSpider):
 
             return result
 
-        except requests.RequestException as e:
-            self.logger.error(f'Ошибка запроса API для {api_id}: {str(e)}')
         except (ValueError, json.JSONDecodeError) as e:
             self.logger.error(f'Ошибка парсинга JSON для {api_id}: {str(e)}')
         except Exception as e:
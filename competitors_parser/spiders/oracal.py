@@ -1,10 +1,10 @@
 import json
-import time
 from typing import Any, Dict, Iterator, List
 
 from scrapy import Request
 from scrapy.http import Response
 
+from ..items import ProductItem, StockItem
 from .base import BaseCompetitorSpider
 
 
@@ -19,25 +19,45 @@ class OracalSpider(BaseCompetitorSpider):
 
     # API URL шаблоны
     BASE_PROD_LIST_URL = (
-        'https://api.oracal-online.ru/api/product/category?page=1&slug='
+        'https://api.oracal-online.ru/api/product/category'
+        '?page={page}&slug={slug}'
     )
-    BASE_PROD_URL_BEGIN = (
-        'https://api.oracal-online.ru/api/product-offer/list?slug='
+    BASE_PROD_URL = (
+        'https://api.oracal-online.ru/api/product-offer/list'
+        '?slug={slug}&page={page}&isAvailable=false'
     )
-    BASE_PROD_URL_END = '&page=1&isAvailable=false'
     BASE_SUBCAT_URL = 'https://api.oracal-online.ru/api/category?slug='
     CATEGORY_LIST_URL = 'https://api.oracal-online.ru/api/category/list/'
 
+    # Ключи метаданных пагинации с количеством страниц
+    LAST_PAGE_KEYS = ('last_page', 'lastPage', 'pageCount', 'total_pages')
+
+    # Список категорий приходит вторым шагом, после выбора города
+    shard_callback = 'parse_categories'
+
     # Настройки для API запросов
     custom_settings = {
-        'DOWNLOAD_DELAY': 0.5,
+        'DOWNLOAD_DELAY': 0,
         'CONCURRENT_REQUESTS': 8,
         'RETRY_ENABLED': True,
         'RETRY_TIMES': 3,
         'DUPEFILTER_CLASS': 'scrapy.dupefilters.RFPDupeFilter',
-        'DUPEFILTER_DEBUG': True
+        'DUPEFILTER_DEBUG': True,
+        # Темп запросов задается отдельно для каждого эндпоинта API
+        'RATE_LIMITS': {
+            'api.oracal-online.ru/api/category': {'RATE': 10, 'BURST': 5},
+            'api.oracal-online.ru/api/product/category': {
+                'RATE': 3, 'BURST': 3
+            },
+            'api.oracal-online.ru/api/product-offer/list': {
+                'RATE': 2, 'BURST': 2
+            },
+        },
     }
 
+    # Сохраняются в контрольной точке (см. Checkpoint)
+    checkpoint_attributes = ('processed_slugs', 'processed_ids')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Множество для отслеживания обработанных товаров
@@ -86,7 +106,6 @@ class OracalSpider(BaseCompetitorSpider):
                         },
                         dont_filter=False
                     )
-                    time.sleep(0.1)
 
         except json.JSONDecodeError as e:
             self.logger.error(f'Ошибка декодирования JSON: {str(e)}')
@@ -124,17 +143,8 @@ class OracalSpider(BaseCompetitorSpider):
                         },
                         dont_filter=False
                     )
-                    time.sleep(0.3)
             else:
-                url = f'{self.BASE_PROD_LIST_URL}{sub}'
-
-                yield Request(
-                    url=url,
-                    callback=self.parse_product_list,
-                    cb_kwargs={'cat': cat},
-                    dont_filter=False
-                )
-                time.sleep(0.3)
+                yield self._product_list_request(cat, sub, page=1)
 
         except json.JSONDecodeError as e:
             self.logger.error(f'Ошибка декодирования JSON: {str(e)}')
@@ -144,14 +154,24 @@ class OracalSpider(BaseCompetitorSpider):
     def parse_product_list(
             self,
             response: Response,
-            cat: str
+            cat: str,
+            sub: str = '',
+            page: int = 1
             ) -> Iterator[Request]:
         """Парсинг списка товаров в категории."""
         try:
             result = json.loads(response.body)
             products = result.get('data', [])
 
-            self.logger.info(f'Найдено {len(products)} товаров в {cat}')
+            self.logger.info(
+                f'Найдено {len(products)} товаров в {cat} (стр. {page})'
+                )
+
+            # С первой страницы сразу запрашиваем все остальные
+            if page == 1 and sub:
+                last_page = self._get_last_page(result)
+                for next_page in range(2, last_page + 1):
+                    yield self._product_list_request(cat, sub, next_page)
 
             for product in products:
                 product_slug = product.get('slug', '')
@@ -170,15 +190,11 @@ class OracalSpider(BaseCompetitorSpider):
                 # Добавляем slug в множество обработанных товаров
                 self.processed_slugs.add(product_slug)
 
-                url = f'{self.BASE_PROD_URL_BEGIN}{product_slug}{self.BASE_PROD_URL_END}'
-
-                yield Request(
-                    url=url,
-                    callback=self.parse_product,
-                    cb_kwargs={'cat': f'{cat} --- {product_title}'},
-                    dont_filter=False
+                yield self._product_request(
+                    f'{cat} --- {product_title}',
+                    product_slug,
+                    page=1
                 )
-                time.sleep(0.3)
 
         except json.JSONDecodeError as e:
             self.logger.error(f'Ошибка декодирования JSON: {str(e)}')
@@ -188,12 +204,21 @@ class OracalSpider(BaseCompetitorSpider):
     def parse_product(
             self,
             response: Response,
-            cat: str
-            ) -> Iterator[Dict[str, Any]]:
+            cat: str,
+            slug: str = '',
+            page: int = 1
+            ) -> Iterator[Any]:
         """Парсинг данных о товаре."""
         try:
             result = json.loads(response.body)
-            data = result.get('data', {}).get('offers', {}).get('data', [])
+            offers = result.get('data', {}).get('offers', {})
+            data = offers.get('data', [])
+
+            # С первой страницы сразу запрашиваем все остальные
+            if page == 1 and slug:
+                last_page = self._get_last_page(result, offers)
+                for next_page in range(2, last_page + 1):
+                    yield self._product_request(cat, slug, next_page)
 
             for product in data:
                 product_id = product.get('id', '')
@@ -220,40 +245,85 @@ class OracalSpider(BaseCompetitorSpider):
                 stocks = self._get_normalized_stocks(product)
 
                 # Получаем характеристики
-                properties = product.get('properties', [])
-                weight = width = length = None
-
-                for prop in properties:
-                    prop_name = prop.get('name', '').lower()
-                    prop_value = prop.get('value', '')
-
-                    if 'вес' in prop_name:
-                        weight = prop_value
-                    elif 'ширина' in prop_name:
-                        width = prop_value
-                    elif 'длина' in prop_name:
-                        length = prop_value
-
-                yield {
-                    'category': cat,
-                    'product_code': f'{product_id_1s}/{product_id}',
-                    'name': product_title,
-                    'stocks': stocks,
-                    'unit': main_unit,
-                    'currency': 'RUB',
-                    'weight': weight,
-                    'length': length,
-                    'width': width,
-                    'height': None,
-                    'url': product_url,
-                }
-                time.sleep(0.5)
+                # Из повторяющихся свойств берется последнее
+                characteristics = self.extract_characteristics(
+                    (
+                        (prop.get('name'), prop.get('value'))
+                        for prop in product.get('properties', [])
+                    ),
+                    last=True
+                )
+
+                yield ProductItem(
+                    category=cat,
+                    product_code=f'{product_id_1s}/{product_id}',
+                    name=product_title,
+                    stocks=stocks,
+                    unit=main_unit,
+                    currency='RUB',
+                    weight=characteristics.get('weight'),
+                    length=characteristics.get('length'),
+                    width=characteristics.get('width'),
+                    height=characteristics.get('height'),
+                    url=product_url
+                )
 
         except json.JSONDecodeError as e:
             self.logger.error(f'Ошибка декодирования JSON: {str(e)}')
         except Exception as e:
             self.logger.error(f'Ошибка при обработке товара: {str(e)}')
 
+    def _product_list_request(
+            self,
+            cat: str,
+            sub: str,
+            page: int
+            ) -> Request:
+        """Запрос страницы списка товаров категории."""
+        return Request(
+            url=self.BASE_PROD_LIST_URL.format(page=page, slug=sub),
+            callback=self.parse_product_list,
+            cb_kwargs={'cat': cat, 'sub': sub, 'page': page},
+            dont_filter=False
+        )
+
+    def _product_request(self, cat: str, slug: str, page: int) -> Request:
+        """Запрос страницы списка предложений товара."""
+        return Request(
+            url=self.BASE_PROD_URL.format(page=page, slug=slug),
+            callback=self.parse_product,
+            cb_kwargs={'cat': cat, 'slug': slug, 'page': page},
+            dont_filter=False
+        )
+
+    def _get_last_page(self, *containers: Dict[str, Any]) -> int:
+        """
+        Получение количества страниц из метаданных пагинации API.
+
+        Метаданные ищутся в переданных объектах и в их разделах
+        meta/pagination. Если они не найдены, считается, что страница одна.
+        """
+        for container in containers:
+            if not isinstance(container, dict):
+                continue
+            candidates = [container]
+            for key in ('meta', 'pagination'):
+                if isinstance(container.get(key), dict):
+                    candidates.append(container[key])
+
+            for candidate in candidates:
+                for key in self.LAST_PAGE_KEYS:
+                    value = candidate.get(key)
+                    if value is None:
+                        continue
+                    try:
+                        return max(int(value), 1)
+                    except (ValueError, TypeError):
+                        self.logger.warning(
+                            f'Неверное количество страниц: {value}'
+                            )
+        return 1
+
     def _get_price_for_unit(self, product: Dict[str, Any], unit: str) -> float:
         """Получение цены товара для конкретной единицы измерения."""
         prices = product.get('prices', [])
@@ -282,7 +352,7 @@ class OracalSpider(BaseCompetitorSpider):
     def _get_normalized_stocks(
             self,
             product: Dict[str, Any]
-            ) -> List[Dict[str, Any]]:
+            ) -> List[StockItem]:
         """
         Нормализация данных о складах с разделением по единицам измерения.
         """
@@ -298,11 +368,11 @@ class OracalSpider(BaseCompetitorSpider):
             unit_price = self._get_price_for_unit(product, unit_title)
 
             # Добавляем запись для Москвы
-            result.append({
-                'stock': f"Москва ({unit_title})",
-                'quantity': amount,
-                'price': unit_price
-            })
+            result.append(StockItem(
+                stock=f"Москва ({unit_title})",
+                quantity=amount,
+                price=unit_price
+            ))
 
         # Обрабатываем все доступные склады (restsAllStore)
         all_stores = product.get('restsAllStore', [])
@@ -314,21 +384,21 @@ class OracalSpider(BaseCompetitorSpider):
             unit_price = self._get_price_for_unit(product, unit_title)
 
             # Добавляем запись для всех складов
-            result.append({
-                'stock': f"Все склады ({unit_title})",
-                'quantity': amount,
-                'price': unit_price
-            })
+            result.append(StockItem(
+                stock=f"Все склады ({unit_title})",
+                quantity=amount,
+                price=unit_price
+            ))
 
         # Если результат пустой, добавляем запись "Нет в наличии"
         if not result:
-            result.append({
-                'stock': 'Нет в наличии',
-                'quantity': 0,
-                'price': self._get_price_for_unit(
+            result.append(StockItem(
+                stock='Нет в наличии',
+                quantity=0,
+                price=self._get_price_for_unit(
                     product,
                     product.get('unit', 'шт')
                     )
-            })
+            ))
 
         return result
@@ -1,8 +1,9 @@
-from typing import Any, Dict, Iterator
+from typing import Iterator
 
 from scrapy import Request
 from scrapy.http import Response
 
+from ..items import ProductItem, StockItem
 from .base import BaseCompetitorSpider
 
 
@@ -12,6 +13,13 @@ class RemexSpider(BaseCompetitorSpider):
     allowed_domains = ['remex.ru']
     start_urls = ['https://www.remex.ru/price']
 
+    custom_settings = {
+        **BaseCompetitorSpider.custom_settings,
+        # Прайс меняется редко: неизмененные карточки берутся из
+        # прошлого запуска по 304
+        'CONDITIONAL_REQUESTS_ENABLED': True,
+    }
+
     category_mapping = {
         'мобильные': 'мобильные стенды',
         'стенды': 'Инструменты, крепёж'
@@ -74,7 +82,7 @@ class RemexSpider(BaseCompetitorSpider):
             self,
             response: Response,
             category: str
-            ) -> Iterator[Dict[str, Any]]:
+            ) -> Iterator[ProductItem]:
         """Парсинг карточки товара."""
         product_table = response.xpath('//*[@class="price-table pprtbl"]')
         rows = product_table.css('tr')
@@ -99,20 +107,12 @@ class RemexSpider(BaseCompetitorSpider):
                 )
                 continue
 
-            yield {
-                'category': category,
-                'product_code': name,
-                'name': name,
-                'stocks': [{
-                    'stock': 'Москва',
-                    'quantity': 0,
-                    'price': price
-                }],
-                'unit': unit,
-                'currency': 'RUB',
-                'weight': None,
-                'length': None,
-                'width': None,
-                'height': None,
-                'url': response.url,
-            }
+            yield ProductItem(
+                category=category,
+                product_code=name,
+                name=name,
+                stocks=[StockItem(stock='Москва', quantity=0, price=price)],
+                unit=unit,
+                currency='RUB',
+                url=response.url
+            )
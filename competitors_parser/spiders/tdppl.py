@@ -1,11 +1,14 @@
 import logging
 import re
-from typing import Any, Dict, Iterator, List
+from typing import AsyncIterator, Dict, Iterator, List
 
-from playwright.sync_api import sync_playwright
 from scrapy import Request
 from scrapy.http import Response
+from scrapy.utils.defer import deferred_from_coro
 
+from ..browser_pool import BrowserPool
+from ..items import ProductItem, StockItem
+from ..parsing import parse_price_and_currency
 from .base import BaseCompetitorSpider
 
 
@@ -23,27 +26,20 @@ class PappilonsCategoryParse:
         self.url = url
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def parse(self) -> List[str]:
+    async def parse(self, pool: BrowserPool) -> List[str]:
         """
         Получает все ссылки на товары в категории с использованием Playwright
 
+        Args:
+            pool: Пул браузеров, из которого берется страница
+
         Returns:
             List[str]: Список ссылок на товары
         """
         links = []
         try:
-            with sync_playwright() as playwright:
-                self.logger.info(f'Запуск Playwright для URL: {self.url}')
-                browser = playwright.chromium.launch(headless=True)
-                context = browser.new_context()
-
-                # Очищаем куки для нового контекста
-                context.clear_cookies()
-                self.logger.info(
-                    'Куки очищены для нового контекста Playwright'
-                    )
-
-                page = context.new_page()
+            async with pool.page() as page:
+                self.logger.info(f'Обработка Playwright для URL: {self.url}')
                 i = 1
 
                 while True:
@@ -51,14 +47,14 @@ class PappilonsCategoryParse:
                     self.logger.info(
                         f'Обработка страницы пагинации: {pagination_url}'
                         )
-                    page.goto(pagination_url)
+                    await page.goto(pagination_url)
 
                     # Очищаем куки после перехода на страницу
-                    context.clear_cookies()
+                    await page.context.clear_cookies()
 
                     # Получаем ссылки на товары с текущей страницы
                     stickers = page.locator('.product-card-inner__stickers')
-                    new_links = stickers.evaluate_all(
+                    new_links = await stickers.evaluate_all(
                         'elements => elements.map(element => element.href)'
                         )
 
@@ -81,14 +77,10 @@ class PappilonsCategoryParse:
                         links.extend(new_links)
                         i += 1
 
-                page.close()
-                context.close()
-                browser.close()
-
-                self.logger.info(
-                    f'Всего собрано {len(links)} ссылок на товары'
-                    )
-                return links
+            self.logger.info(
+                f'Всего собрано {len(links)} ссылок на товары'
+                )
+            return links
         except Exception as e:
             self.logger.error(
                 f'Ошибка при парсинге категории {self.url}: {str(e)}'
@@ -105,17 +97,48 @@ class TdpplSpider(BaseCompetitorSpider):
     custom_settings = {
         'ITEM_PIPELINES': {
             'competitors_parser.pipelines.validation.ValidationPipeline': 300,
+            'competitors_parser.pipelines.history.PriceHistoryPipeline': 350,
             'competitors_parser.exporters.playwright_csv_exporter.PlaywrightCSVExporter': 400,
             'competitors_parser.exporters.playwright_json_exporter.PlaywrightJSONExporter': 500,
+            'competitors_parser.exporters.parquet_exporter.ParquetExporter': 600,
+            'competitors_parser.exporters.delta_exporter.DeltaExporter': 700,
         },
         'COOKIES_ENABLED': True,
         'COOKIES_DEBUG': True,
         'DOWNLOADER_MIDDLEWARES': {
             'scrapy.downloadermiddlewares.cookies.CookiesMiddleware': 700,
             'competitors_parser.middlewares.ErrorHandlerMiddleware': 750,
-        }
+            'competitors_parser.middlewares.ReplayMiddleware': 950,
+        },
+        # Сначала загружать AJAX-страницы категорий без браузера
+        'TDPPL_AJAX_FAST_PATH': True,
+        # Пул браузеров для обхода пагинации категорий
+        'PLAYWRIGHT_POOL': {
+            'BROWSERS': 2,
+            'PAGES_PER_BROWSER': 3,
+            'HEADLESS': True,
+        },
     }
 
+    # Признаки блокировки в ответе на AJAX-запрос
+    BLOCKED_STATUSES = [403, 429, 503]
+    BLOCKED_MARKERS = ('captcha', 'recaptcha', 'доступ запрещен')
+    BLOCKED_SCAN_SIZE = 4096
+
+    # Сохраняются в контрольной точке (см. Checkpoint)
+    checkpoint_attributes = ('_category_links',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Ссылки на товары, найденные на AJAX-страницах категорий
+        self._category_links: Dict[str, set] = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.browser_pool = BrowserPool.from_settings(crawler.settings)
+        return spider
+
     def start_requests(self):
         """Переопределяем метод start_requests для очистки кук перед началом парсинга."""
         self.logger.info(
@@ -156,36 +179,177 @@ class TdpplSpider(BaseCompetitorSpider):
                 meta={'cookiejar': 1}  # Используем тот же ID для cookie jar
             )
 
-    def parse_category(
+    async def parse_category(
             self,
             response: Response,
-            category: str
-            ) -> Iterator[Request]:
+            category: str,
+            use_browser: bool = False
+            ) -> AsyncIterator[Request]:
         """Парсинг страницы категории."""
         self.logger.info(f'Обработка категории: {category} ({response.url})')
 
-        # Используем Playwright для получения ссылок на товары
-        product_links = PappilonsCategoryParse(response.url).parse()
+        # Сначала пробуем получить AJAX-страницы обычными запросами
+        if not use_browser and self.settings.getbool('TDPPL_AJAX_FAST_PATH'):
+            self.crawler.stats.inc_value('tdppl/categories')
+            yield self._ajax_page_request(response.url, category, page=1)
+            return
 
-        # Обрабатываем каждую ссылку на товар
-        for product_url in product_links:
+        async for request in self._parse_category_with_browser(
+                response.url,
+                category
+                ):
+            yield request
+
+    async def parse_category_page(
+            self,
+            response: Response,
+            category: str,
+            category_url: str,
+            page: int
+            ) -> AsyncIterator[Request]:
+        """Парсинг AJAX-страницы пагинации категории без браузера."""
+        stats = self.crawler.stats
+        seen_links = self._category_links.setdefault(category_url, set())
+
+        new_links = [
+            response.urljoin(link) for link in response.css(
+                '.product-card-inner__stickers::attr(href)'
+                ).getall()
+        ]
+
+        # Если ответ похож на блокировку или первая страница пустая,
+        # переходим на Playwright
+        reason = None
+        if self._looks_blocked(response):
+            reason = 'blocked'
+        elif not new_links and page == 1:
+            reason = 'empty'
+
+        if reason:
+            self.logger.info(
+                f'AJAX-страница {response.url} не подошла ({reason}), '
+                f'используем Playwright для категории {category}'
+                )
+            stats.inc_value(f'tdppl/fallback/{reason}')
+            self._category_links.pop(category_url, None)
+            async for request in self._parse_category_with_browser(
+                    category_url,
+                    category
+                    ):
+                yield request
+            return
+
+        # Проверяем, не дошли ли мы до конца пагинации
+        if not new_links or new_links[0] in seen_links:
             self.logger.info(
-                f'Обнаружен товар в категории {category}: {product_url}'
+                f'Достигнут конец пагинации категории {category} '
+                f'на странице {page}'
                 )
+            stats.inc_value('tdppl/category_path/ajax')
+            self._category_links.pop(category_url, None)
+            return
 
-            yield Request(
-                url=product_url,
-                callback=self.parse_product,
-                cb_kwargs={'category': category},
-                cookies={},  # Очищаем куки для каждого запроса
-                meta={'cookiejar': 1}  # Используем тот же ID для cookie jar
+        self.logger.info(
+            f'Найдено {len(new_links)} товаров на странице {page} '
+            f'категории {category}'
             )
+        seen_links.update(new_links)
+        stats.inc_value('tdppl/ajax_pages')
+
+        for product_url in new_links:
+            yield self._product_request(product_url, category)
+
+        yield self._ajax_page_request(category_url, category, page + 1)
+
+    def ajax_page_failed(self, failure):
+        """Ошибка загрузки AJAX-страницы: повторяем категорию в браузере."""
+        request = failure.request
+        self.logger.warning(
+            f'Не удалось загрузить {request.url}: {failure.value}. '
+            f'Используем Playwright'
+            )
+        self.crawler.stats.inc_value('tdppl/fallback/error')
+        category_url = request.cb_kwargs['category_url']
+        self._category_links.pop(category_url, None)
+
+        yield Request(
+            url=category_url,
+            callback=self.parse_category,
+            cb_kwargs={
+                'category': request.cb_kwargs['category'],
+                'use_browser': True
+                },
+            cookies={},
+            meta={'cookiejar': 1},
+            dont_filter=True
+        )
+
+    async def _parse_category_with_browser(
+            self,
+            category_url: str,
+            category: str
+            ) -> AsyncIterator[Request]:
+        """Получение ссылок на товары категории через пул Playwright."""
+        self.crawler.stats.inc_value('tdppl/category_path/browser')
+
+        product_links = await PappilonsCategoryParse(
+            category_url
+            ).parse(self.browser_pool)
+
+        for product_url in product_links:
+            yield self._product_request(product_url, category)
+
+    def _ajax_page_request(
+            self,
+            category_url: str,
+            category: str,
+            page: int
+            ) -> Request:
+        """Запрос AJAX-страницы пагинации категории."""
+        return Request(
+            url=f'{category_url}?PAGEN_1={page}&AJAX=Y',
+            callback=self.parse_category_page,
+            errback=self.ajax_page_failed,
+            cb_kwargs={
+                'category': category,
+                'category_url': category_url,
+                'page': page
+                },
+            cookies={},
+            meta={
+                'cookiejar': 1,
+                'handle_httpstatus_list': self.BLOCKED_STATUSES
+                }
+        )
+
+    def _product_request(self, product_url: str, category: str) -> Request:
+        """Запрос страницы товара."""
+        self.logger.info(
+            f'Обнаружен товар в категории {category}: {product_url}'
+            )
+        return Request(
+            url=product_url,
+            callback=self.parse_product,
+            cb_kwargs={'category': category},
+            cookies={},  # Очищаем куки для каждого запроса
+            meta={'cookiejar': 1}  # Используем тот же ID для cookie jar
+        )
+
+    def _looks_blocked(self, response: Response) -> bool:
+        """Проверка, похож ли ответ на блокировку или капчу."""
+        if response.status in self.BLOCKED_STATUSES:
+            return True
+        text = response.body[:self.BLOCKED_SCAN_SIZE].decode(
+            'utf-8',
+            errors='ignore'
+            ).lower()
+        return any(marker in text for marker in self.BLOCKED_MARKERS)
 
     def parse_product(
             self,
             response: Response,
             category: str
-            ) -> Iterator[Dict[str, Any]]:
+            ) -> Iterator[ProductItem]:
         """Парсинг страницы товара."""
         try:
             self.logger.info(f'Обработка товара: {response.url}')
@@ -221,25 +385,25 @@ class TdpplSpider(BaseCompetitorSpider):
 
             # Устанавливаем цену для всех складов
             for stock in stocks:
-                stock['price'] = price
+                stock.price = price
 
             # Формируем и возвращаем item
-            yield {
-                'category': category,
-                'product_code': product_code,
-                'name': name,
-                'stocks': stocks,
-                'unit': unit,
-                'currency': currency,
-                'url': response.url
-            }
+            yield ProductItem(
+                category=category,
+                product_code=product_code,
+                name=name,
+                stocks=stocks,
+                unit=unit,
+                currency=currency,
+                url=response.url
+            )
 
         except Exception as e:
             self.logger.error(
                 f'Ошибка при обработке товара {response.url}: {str(e)}'
                 )
 
-    def _extract_stocks(self, script_content: str) -> List[Dict[str, Any]]:
+    def _extract_stocks(self, script_content: str) -> List[StockItem]:
         """
         Извлекает информацию о наличии товара на складах из скрипта.
 
@@ -247,7 +411,7 @@ class TdpplSpider(BaseCompetitorSpider):
             script_content: Содержимое скрипта с информацией о складах.
 
         Returns:
-            List[Dict[str, Any]]: Список с информацией о складах.
+            List[StockItem]: Список с информацией о складах.
         """
         stocks = []
 
@@ -276,11 +440,11 @@ class TdpplSpider(BaseCompetitorSpider):
 
             # Формируем список складов в нужном формате
             for city, quantity in zip(match_city, match_stock_corrected):
-                stocks.append({
-                    'stock': city,
-                    'quantity': quantity,
-                    'price': 0.0  # Цена будет установлена позже
-                })
+                stocks.append(StockItem(
+                    stock=city,
+                    quantity=quantity,
+                    price=0.0  # Цена будет установлена позже
+                ))
 
         except Exception as e:
             self.logger.error(
@@ -299,34 +463,17 @@ class TdpplSpider(BaseCompetitorSpider):
         Returns:
             tuple: (цена(float), валюта(str)).
         """
-        if not price_text:
-            return 0.0, 'RUB'
-
-        try:
-            # Очищаем текст от неразрывных пробелов
-            price_text = price_text.replace('\xa0', '').strip()
-
-            # Разделяем на цену и валюту
-            parts = price_text.split()
-            if len(parts) >= 2:
-                price_str = parts[0]
-                currency = parts[1]
-
-                # Преобразуем цену в число
-                price = self.extract_price(price_str)
+        return parse_price_and_currency(price_text)
 
-                # Стандартизируем валюту
-                if currency in ['р.', 'руб.', 'руб', 'р']:
-                    currency = 'RUB'
+    def closed(self, reason: str):
+        """Закрытие пула браузеров при завершении работы паука."""
+        super().closed(reason)
 
-                return price, currency
-            else:
-                # Если не удалось разделить, пробуем извлечь только цену
-                price = self.extract_price(price_text)
-                return price, 'RUB'
-
-        except Exception as e:
-            self.logger.error(
-                f"Ошибка при извлечении цены и валюты из '{price_text}': {str(e)}"
-                )
-            return 0.0, 'RUB'
+        stats = self.crawler.stats
+        self.logger.info(
+            f'Категорий без браузера: '
+            f'{stats.get_value("tdppl/category_path/ajax", 0)}, '
+            f'через Playwright: '
+            f'{stats.get_value("tdppl/category_path/browser", 0)}'
+            )
+        return deferred_from_coro(self.browser_pool.close())
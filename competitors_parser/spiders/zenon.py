@@ -1,8 +1,9 @@
-from typing import Any, Dict, Iterator
+from typing import Iterator
 
 from scrapy import Request
 from scrapy.http import Response
 
+from ..items import ProductItem, StockItem
 from .base import BaseCompetitorSpider
 
 
@@ -18,6 +19,8 @@ class ZenonSpider(BaseCompetitorSpider):
         'CONCURRENT_REQUESTS': 8,
         'RETRY_ENABLED': True,
         'RETRY_TIMES': 2,
+        'CONDITIONAL_REQUESTS_ENABLED': True,
+        'BODY_FINGERPRINT_ENABLED': True,
     }
 
     def parse(self, response: Response) -> Iterator[Request]:
@@ -127,7 +130,7 @@ class ZenonSpider(BaseCompetitorSpider):
             self,
             response: Response,
             category: str = ''
-            ) -> Iterator[Dict[str, Any]]:
+            ) -> Iterator[ProductItem]:
         """Парсим карточку товара."""
         self.logger.info(f'Парсим карточку товара: {response.url}')
 
@@ -162,27 +165,10 @@ class ZenonSpider(BaseCompetitorSpider):
             ).css('span.nobr::text').get() or 'шт'
             unit = self.clean_text(unit)
 
-            # Получаем характеристики товара
-            charact = response.css('div#tab-1 table.tables')
-            weight = charact.xpath(
-                '//td[strong[text()="Вес"]]/following-sibling::td/text()'
-            ).get() or None
-            weight = self.clean_text(weight) if weight else None
-
-            length = charact.xpath(
-                '//td[strong[text()="Длина"]]/following-sibling::td/text()'
-            ).get() or None
-            length = self.clean_text(length) if length else None
-
-            width = charact.xpath(
-                '//td[strong[text()="Ширина"]]/following-sibling::td/text()'
-            ).get() or None
-            width = self.clean_text(width) if width else None
-
-            height = charact.xpath(
-                '//td[strong[text()="Высота"]]/following-sibling::td/text()'
-            ).get() or None
-            height = self.clean_text(height) if height else None
+            # Получаем характеристики товара за один проход по таблице
+            charact = self.extract_table_characteristics(
+                response.css('div#tab-1 table.tables')
+            )
 
             # Получаем информацию о складах
             stocks = []
@@ -201,25 +187,25 @@ class ZenonSpider(BaseCompetitorSpider):
             except (ValueError, TypeError):
                 price_float = 0.0
 
-            stocks.append({
-                'stock': current_stock,
-                'quantity': current_amount,
-                'price': price_float
-            })
-
-            yield {
-                'category': category,
-                'product_code': product_code,
-                'name': name,
-                'stocks': stocks,
-                'unit': unit,
-                'currency': currency if currency else 'RUB',
-                'weight': weight,
-                'length': length,
-                'width': width,
-                'height': height,
-                'url': response.url
-            }
+            stocks.append(StockItem(
+                stock=current_stock,
+                quantity=current_amount,
+                price=price_float
+            ))
+
+            yield ProductItem(
+                category=category,
+                product_code=product_code,
+                name=name,
+                stocks=stocks,
+                unit=unit,
+                currency=currency if currency else 'RUB',
+                weight=charact.get('weight'),
+                length=charact.get('length'),
+                width=charact.get('width'),
+                height=charact.get('height'),
+                url=response.url
+            )
 
         except Exception as e:
             self.logger.error(
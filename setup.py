@@ -41,7 +41,7 @@ setup(
         'Programming Language :: Python :: 3.10',
         'Programming Language :: Python :: 3.11',
     ],
-    python_requires='>=3.8',
+    python_requires='>=3.10',
     install_requires=requirements,
     entry_points={
         'console_scripts': [